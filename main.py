@@ -1,202 +1,493 @@
 from utils.HeyGenClient import HeyGenClient
 import os
 from utils.script_generator.script_generator import ScriptGenerator
-from utils.uploadToYoutube.uploadToYoutube import upload_video
+from utils.uploadToYoutube.uploadToYoutube import upload_video, get_authenticated_service
 from utils.video_metadata import VideoMetadata
+from utils.render_webhook import RenderWebhookServer
+from utils.avatar_catalog import AvatarCatalog
+from utils.scene_planner import MAX_SCENE_CHARS
+from utils.stream_handoff import stream_video_to_youtube, load_stream_state
+from utils.upload_queue import UploadQueue
+from utils.pipeline import Pipeline, PipelineError, Stage, new_job_dir, resolve_resume, run_batch
+from utils.job_store import get_default_job_store, QUEUED, SCRIPTED, RENDERED, UPLOADED
+from utils.script_buffer import ScriptPrefetcher, buffered_script, make_payload, validate_script, DEFAULT_TTL
+from utils.fleet import FleetWorker, Route, get_shared_store, parse_capabilities, SCRIPT, HEYGEN, UPLOAD
 from dotenv import load_dotenv
-import uuid
+import argparse
 import time
 import json
-import random
 
 load_dotenv()
 # Load environment variables
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# Stream the rendered video straight into the YouTube upload instead of
+# downloading it first; RETAIN_LOCAL_COPY=1 also keeps a copy in outputs/
+STREAM_UPLOAD = os.getenv("STREAM_UPLOAD", "0") == "1"
+RETAIN_LOCAL_COPY = os.getenv("RETAIN_LOCAL_COPY", "0") == "1"
+# Hand finished videos to the upload queue (python -m utils.upload_queue)
+# instead of uploading them inline
+USE_UPLOAD_QUEUE = os.getenv("UPLOAD_QUEUE", "0") == "1"
+# Research this many topics at once when picking one (see generate_script_for_topic);
+# KEEP_SPECULATIVE_SCRIPTS buffers the scripts of the losing topics instead of
+# cancelling their research
+SPECULATIVE_TOPICS = max(1, int(os.getenv("SPECULATIVE_TOPICS", "1")))
+KEEP_SPECULATIVE_SCRIPTS = os.getenv("KEEP_SPECULATIVE_SCRIPTS", "1") == "1"
+# Keep this many researched scripts buffered ahead of rendering (see utils/script_buffer.py)
+SCRIPT_PREFETCH = int(os.getenv("SCRIPT_PREFETCH", "0"))
+# Put this on shared storage (with PIPELINE_JOBS_ROOT) when running a fleet
+OUTPUT_FOLDER = os.getenv("OUTPUT_DIR", "outputs")
 
-client = HeyGenClient()
+def make_heygen_client():
+    """
+    Create the HeyGen client. When RENDER_CALLBACK_URL is set (the public
+    address of this host), a local webhook server is started so renders are
+    checked as soon as HeyGen's signed callback arrives instead of at the next poll.
+    """
+    if os.getenv("RENDER_CALLBACK_URL"):
+        webhook_server = RenderWebhookServer(port=int(os.getenv("RENDER_WEBHOOK_PORT", "8765"))).start()
+        return HeyGenClient(callback_url=webhook_server.heygen_callback_url)
+    return HeyGenClient()
+
+client = make_heygen_client()
 script_generator = ScriptGenerator()
 script_generator.set_debug(True)
 video_metadata = VideoMetadata()
+avatar_catalog = AvatarCatalog.load()
+# Topics and the state of the videos made from them
+job_store = get_default_job_store()
 
-def get_script(topic):
+def get_random_avatar(gender=None):
     """
-    Generate a script based on the provided topic.
+    Select a random avatar with a known voice from the avatar catalog.
     
     Args:
-        topic (str): The topic for which to generate the script.
+        gender (str): Optional "female"/"male" restriction.
         
     Returns:
-        str: Generated script content.
+        tuple: Name of the selected avatar and its catalog record.
     """
-    # Generate a script based on the topic
-    response = script_generator.process_query(topic)
-    if response:
-        return response.text
-    return "Could not generate a response for your query."
+    record = avatar_catalog.select(gender=gender, requires_voice=True)
+    if record is None:
+        raise ValueError(f"No avatar with a voice available for gender={gender!r}")
+    return record["curated_name"] or record["name"], record
 
-def load_avatars():
+def park_script(job, response):
     """
-    Load avatars from the JSON file.
-    
-    Returns:
-        dict: Dictionary containing avatar information.
+    Handle a speculative topic that did not win: keep its script in the job
+    store for a later run if it would pass the prefetcher's checks, or
+    retire the topic otherwise.
     """
-    with open('data/HeyGenAvaters.json', 'r') as file:
-        return json.load(file)
+    problem = validate_script(response.text if response else None)
+    if problem:
+        print(f"Not keeping the script for topic '{job['topic']}': {problem}. Marking it failed.")
+        job_store.fail(job["id"], f"Speculative script rejected: {problem}", retry=False)
+        return
+    job_store.advance(job["id"], QUEUED, release=True, payload=make_payload(response.text))
+    print(f"Kept the script for topic '{job['topic']}' for a later run")
 
-def get_random_avatar(avatars):
+def generate_script_for_topic(topic=None, job_dir=None):
     """
-    Select a random avatar from the available avatars.
+    Claim topics from the job store until one yields a script that passes
+    validate_script. Topics that fail are marked failed so they are not
+    picked again.
+    
+    A fresh script buffered ahead of time (by the prefetcher or an earlier
+    speculative attempt) is used right away, with its metadata. Otherwise
+    SPECULATIVE_TOPICS topics are researched at once and the first script
+    wins; the other attempts are cancelled or, with KEEP_SPECULATIVE_SCRIPTS,
+    finish in the background and are buffered for the next run.
     
     Args:
-        avatars (dict): Dictionary containing avatar information.
-        
+        topic (dict): Topic job already claimed for this video (batch mode); only it is tried.
+        job_dir (str): Pipeline job directory, recorded on the topic.
+    
     Returns:
-        tuple: Name of the selected avatar and its data.
+        dict: The chosen topic, its job store ID and its script.
     """
-    avatar_name = random.choice(list(avatars.keys()))
-    return avatar_name, avatars[avatar_name]
+    if topic is None:
+        job_store.expire_payloads(DEFAULT_TTL)
+    ready = topic if topic is not None else job_store.claim(ready=True)
+    payload = buffered_script(ready)
+    if payload:
+        print(f"Using the buffered script for topic: '{ready['topic']}'")
+        job_store.advance(ready["id"], SCRIPTED, job_dir=job_dir, backend=HEYGEN)
+        return {"topic": ready["topic"], "topic_id": ready["id"], "script": payload["script"],
+                "video_info": payload.get("video_info")}
+    if topic is None and ready is not None:
+        job_store.release(ready["id"], attempted=False)
+    
+    # Try to generate a script with a valid topic
+    max_attempts = 1 if topic is not None else 3
+    attempts = 0
+    
+    while attempts < max_attempts:
+        # Claim random topics, several at once in speculative mode
+        jobs = [topic] if topic is not None else draw_topics(min(SPECULATIVE_TOPICS, max_attempts - attempts))
+        if not jobs:
+            print("No more topics available in the topic store.")
+            break
+        for number, job in enumerate(jobs, start=attempts + 1):
+            print(f"Attempt {number}: Selected topic: {job['topic']}")
+        
+        # Generate scripts for the selected topics; the first one to succeed is used
+        reported = set()
+        
+        def on_result(index, response, jobs=jobs):
+            reported.add(index)
+            park_script(jobs[index], response)
+        
+        index, response = script_generator.process_first(
+            [job["topic"] for job in jobs], on_result=on_result, keep_running=KEEP_SPECULATIVE_SCRIPTS
+        )
+        if index is None:
+            attempts += len(jobs)
+            continue
+        if not KEEP_SPECULATIVE_SCRIPTS:
+            # Cancelled attempts go back to the queue untouched
+            for other, job in enumerate(jobs):
+                if other != index and other not in reported:
+                    job_store.release(job["id"], attempted=False)
+        
+        job = jobs[index]
+        # The first answer is not necessarily a renderable one
+        problem = validate_script(response.text)
+        if problem:
+            print(f"Script for topic '{job['topic']}' rejected: {problem}. Marking it failed and trying another topic.")
+            job_store.fail(job["id"], f"Script rejected: {problem}", retry=False)
+            attempts += len(jobs)
+            continue
+        print(f"Successfully generated script for topic: '{job['topic']}'")
+        job_store.advance(job["id"], SCRIPTED, job_dir=job_dir, backend=HEYGEN)
+        return {"topic": job["topic"], "topic_id": job["id"], "script": response.text}
+    
+    raise Exception("Failed to generate a script after multiple attempts.")
+
+def pick_avatar():
+    """Pipeline stage: choose the presenter"""
+    avatar_name, avatar_data = get_random_avatar()
+    print(f"Selected avatar: {avatar_name}")
+    return {"name": avatar_name, "avatar_id": avatar_data["avatar_id"], "voice_id": avatar_data["voice_id"]}
 
-def load_topics():
+def describe(script):
+    """Pipeline stage: title, description and tags, unless they were computed with a buffered script"""
+    return script.get("video_info") or video_metadata.generate_all(script["script"])
+
+def render(script, avatar, output_file):
     """
-    Load topics from the JSON file.
-    
-    Returns:
-        list: List containing topics.
+    Pipeline stage: render the video. Long scripts are split into scenes that
+    render in parallel and are joined locally; with STREAM_UPLOAD only the
+    URL of the finished video is kept and the upload streams from it.
     """
-    topics_file = 'data/video_topics.json'
-    if os.path.exists(topics_file):
-        with open(topics_file, 'r') as file:
-            return json.load(file)
+    script_content = script["script"]
+    render_kwargs = dict(
+        input_text=script_content,
+        avatar_id=avatar["avatar_id"],
+        voice_id=avatar["voice_id"],
+        width=720,
+        height=1280
+    )
+    if STREAM_UPLOAD and not USE_UPLOAD_QUEUE and len(script_content) <= MAX_SCENE_CHARS:
+        video_url = client.render_video(**render_kwargs)
+        print(f"Video rendered at {video_url}")
+        job_store.advance(script["topic_id"], RENDERED)
+        return {"video_url": video_url, "output_file": None}
+    
+    if len(script_content) > MAX_SCENE_CHARS:
+        client.generate_and_download_scenes(output_path=output_file, **render_kwargs)
     else:
-        print(f"Warning: Topics file not found at {topics_file}")
-        return {"topics": ["Debate of GoAT of football"]}  # Default topic as fallback
+        client.generate_and_download_video(output_path=output_file, **render_kwargs)
+    print(f"Video downloaded successfully to {output_file}")
+    job_store.advance(script["topic_id"], RENDERED)
+    return {"video_url": None, "output_file": output_file}
+
+def render_is_available(result):
+    """A checkpointed render is reusable while its file exists (or it is streamed from a URL)"""
+    return bool(result["video_url"]) or os.path.exists(result["output_file"])
+
+def save_metadata(script, avatar, render, metadata_file):
+    """Pipeline stage: save metadata about the generation"""
+    metadata = {
+        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "topic": script["topic"],
+        "avatar_used": avatar["name"],
+        "output_file": render["output_file"] if not render["video_url"] or RETAIN_LOCAL_COPY else None
+    }
+    with open(metadata_file, 'w') as f:
+        json.dump(metadata, f, indent=4)
+    return metadata_file
 
-def get_random_topic(topics_data):
+def upload(script, render, video_info, output_file, youtube=None):
     """
-    Select a random topic from the available topics.
+    Pipeline stage: upload the video to YouTube, stream it from the render
+    URL, or hand it to the upload queue.
     
-    Args:
-        topics_data (dict): Dictionary containing topics list.
-        
     Returns:
-        str: Selected topic.
+        dict: The YouTube video ID or the upload queue job ID.
     """
-    topics = topics_data.get("topics", [])
-    if not topics:
-        print("No topics available in the topics file.")
-        return "Debate of GoAT of football"  # Default topic as fallback
+    if USE_UPLOAD_QUEUE:
+        job_id = UploadQueue().enqueue(
+            render["output_file"],
+            title=video_info["title"],
+            description=video_info["description"],
+            tags=video_info["tags"],
+            privacy="unlisted",
+            topic_id=script["topic_id"]
+        )
+        print(f"Queued upload job {job_id} for {render['output_file']}")
+        # The upload worker marks the topic uploaded once YouTube has the video
+        job_store.release(script["topic_id"])
+        return {"upload_job_id": job_id}
     
-    return random.choice(topics)
+    # Inline uploads spend the same channel quota the upload queue tracks
+    upload_queue = UploadQueue()
+    if render["video_url"]:
+        # Lets a resumed job continue the upload where YouTube stopped receiving it
+        state_path = output_file + ".stream.json"
+        if not load_stream_state(state_path, render["video_url"]):
+            upload_queue.record_insert()
+        video_id = stream_video_to_youtube(
+            render["video_url"],
+            title=video_info["title"],
+            description=video_info["description"],
+            tags=video_info["tags"],
+            privacy="unlisted",
+            retain_path=output_file if RETAIN_LOCAL_COPY else None,
+            state_path=state_path,
+            youtube=youtube
+        )
+    else:
+        upload_queue.record_insert(file_path=render["output_file"])
+        video_id = upload_video(
+            file_path=render["output_file"],
+            title=video_info["title"], 
+            description=video_info["description"],  
+            tags=video_info["tags"], 
+            privacy="unlisted",
+            youtube=youtube
+        )
+    job_store.advance(script["topic_id"], UPLOADED, release=True)
+    return {"video_id": video_id}
+
+def build_pipeline(job_dir):
+    """
+    The video job as a stage graph: topic/script and avatar selection are
+    independent, and metadata generation and YouTube authentication run
+    while the video renders.
+    """
+    upload_inputs = ["script", "render", "video_info", "output_file"]
+    stages = [
+        Stage("script", generate_script_for_topic, inputs=["topic", "job_dir"]),
+        Stage("avatar", pick_avatar),
+        Stage("render", render, inputs=["script", "avatar", "output_file"], validate=render_is_available),
+        Stage("video_info", describe, inputs=["script"]),
+        Stage("metadata_file", save_metadata, inputs=["script", "avatar", "render", "metadata_file"]),
+    ]
+    if not USE_UPLOAD_QUEUE:
+        stages.append(Stage("youtube", get_authenticated_service, checkpoint=False))
+        upload_inputs.append("youtube")
+    stages.append(Stage("upload", upload, inputs=upload_inputs))
+    return Pipeline(stages, job_dir)
 
-def remove_used_topic(topic, topics_data):
+def new_job(output_folder, topic=None):
+    """
+    Returns:
+        tuple: (job directory, job parameters) of a fresh job.
     """
-    Remove a topic from the topics list after it has been used.
+    # The job ID doubles as the unique output file name
+    unique_id, job_dir = new_job_dir()
+    params = {
+        "topic": topic,
+        "job_dir": job_dir,
+        "output_file": os.path.join(output_folder, f"output_{unique_id}.mp4"),
+        "metadata_file": os.path.join(output_folder, f"metadata_{unique_id}.json"),
+    }
+    return job_dir, params
+
+def draw_topics(count):
+    """
+    Claim up to `count` distinct random topics from the job store.
     
-    Args:
-        topic (str): The topic to remove.
-        topics_data (dict): Dictionary containing topics list.
-        
     Returns:
-        dict: Updated topics data.
+        list: The claimed topic jobs.
     """
-    if "topics" in topics_data and topic in topics_data["topics"]:
-        topics_data["topics"].remove(topic)
-        # Save the updated topics list back to the file
-        with open('data/video_topics.json', 'w') as file:
-            json.dump(topics_data, file, indent=4)
-        print(f"Topic '{topic}' has been removed from the topics list.")
-    return topics_data
+    topics = []
+    for _ in range(count):
+        # Topics with a buffered script first
+        job = job_store.claim(ready=True) or job_store.claim()
+        if job is None:
+            break
+        topics.append({"id": job["id"], "topic": job["topic"], "payload": job["payload"]})
+    return topics
+
+def record_failure(pipeline, error):
+    """Release the topic of a failed job so it can be retried"""
+    script = pipeline.result("script")
+    if script:
+        job_store.fail(script["topic_id"], error)
 
-def main():
+def run_batch_jobs(count, output_folder, script_concurrency=2, render_concurrency=3, upload_concurrency=1):
+    """
+    Produce `count` videos as a producer/consumer pipeline.
     
-    print(f"Current UTC time: {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    Script generation (with metadata), rendering and uploading each get
+    their own worker pool, connected by bounded queues: when renders fall
+    behind, script workers wait instead of researching topics far ahead.
+    Every job is still checkpointed and can be resumed on its own.
+    """
+    topics = draw_topics(count)
+    if len(topics) < count:
+        print(f"Only {len(topics)} topic(s) available; running a batch of {len(topics)}.")
+    jobs = [new_job(output_folder, topic) for topic in topics]
     
-    # Load topics data
-    topics_data = load_topics()
+    def run_phase(job_dir, targets, params=None):
+        pipeline = build_pipeline(job_dir)
+        try:
+            pipeline.run(params, targets=targets)
+        except PipelineError as e:
+            record_failure(pipeline, e)
+            raise
+        return job_dir
     
-    # Try to generate a script with a valid topic
-    max_attempts = 3
-    attempts = 0
-    script_content = None
-    topic = None
+    phases = [
+        ("script", lambda job: run_phase(job[0], ["script", "avatar", "video_info"], params=job[1]),
+         script_concurrency),
+        ("render", lambda job_dir: run_phase(job_dir, ["render", "metadata_file"]), render_concurrency),
+        ("upload", lambda job_dir: run_phase(job_dir, ["upload"]), upload_concurrency),
+    ]
+    started = time.time()
+    finished, failed = run_batch(jobs, phases)
+    print(f"Batch finished in {time.time() - started:.0f}s: {len(finished)} video(s) done, {len(failed)} failed.")
+    for job, phase, error in failed:
+        job_dir = job[0] if isinstance(job, tuple) else job
+        print(f"  {os.path.basename(job_dir)} failed in {phase}: {str(error)} (rerun with --resume {os.path.basename(job_dir)})")
+
+def run_worker(capabilities, output_folder, script_concurrency=2, render_concurrency=3, upload_concurrency=1):
+    """
+    Serve the shared job store as one host of a worker fleet.
     
-    while attempts < max_attempts and script_content is None:
-        # Select a random topic
-        if not topics_data.get("topics", []):
-            print("No more topics available in the topics list.")
-            break
-            
-        topic = get_random_topic(topics_data)
-        print(f"Attempt {attempts+1}: Selected topic: {topic}")
-        
-        # Generate a script based on the selected topic
-        script_content = get_script(topic)
-        
-        # Check if script generation was successful
-        if script_content == "Could not generate a response for your query.":
-            print(f"Failed to generate script for topic: '{topic}'. Removing it and trying another topic.")
-            remove_used_topic(topic, topics_data)
-            script_content = None
-            attempts += 1
-        else:
-            print(f"Successfully generated script for topic: '{topic}'")
-            remove_used_topic(topic, topics_data)
+    Topics move through the store: a "script" host researches queued topics
+    and pins them to HeyGen, a "heygen" host renders scripted ones and an
+    "upload" host uploads rendered ones. Job directories and outputs must
+    be on storage every host can reach.
     
-    # If all attempts failed, exit the program
-    if script_content is None or script_content == "Could not generate a response for your query.":
-        print("Failed to generate a script after multiple attempts. Exiting program.")
-        return
+    Args:
+        capabilities (list): Work this host takes, out of script, heygen and upload.
+        output_folder (str): Folder for videos and metadata files.
+        script_concurrency (int): Scripts generated at the same time.
+        render_concurrency (int): Concurrent renders.
+        upload_concurrency (int): Concurrent uploads.
+    """
+    global job_store
+    job_store = get_shared_store()
     
-    # Create an output folder if it doesn't exist
-    output_folder = "outputs"
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+    def script_job(job):
+        job_dir, params = job["job_dir"], None
+        if not job_dir or not os.path.isdir(job_dir):
+            job_dir, params = new_job(output_folder, {"id": job["id"], "topic": job["topic"], "payload": job["payload"]})
+        build_pipeline(job_dir).run(params, targets=["script", "avatar", "video_info"])
+        job_store.advance(job["id"], SCRIPTED, release=True, job_dir=job_dir, backend=HEYGEN)
     
-    # Generate a unique file name using UUID and save it in the output folder
-    unique_id = str(uuid.uuid4())
-    output_file = os.path.join(output_folder, f"output_{unique_id}.mp4")
+    def render_job(job):
+        build_pipeline(job["job_dir"]).run(targets=["render", "metadata_file"])
+        job_store.advance(job["id"], RENDERED, release=True)
     
-    # Select a random avatar
-    avatars = load_avatars()
-    avatar_name, avatar_data = get_random_avatar(avatars)
+    def upload_job(job):
+        build_pipeline(job["job_dir"]).run(targets=["upload"])
+        job_store.advance(job["id"], UPLOADED, release=True)
     
-    print(f"Selected avatar: {avatar_name}")
-    print("Starting video generation process...")
+    routes = [
+        Route(QUEUED, SCRIPT, script_job),
+        Route(SCRIPTED, HEYGEN, render_job, backend=HEYGEN),
+        Route(RENDERED, UPLOAD, upload_job, backend=HEYGEN),
+    ]
+    concurrency = {SCRIPT: script_concurrency, HEYGEN: render_concurrency, UPLOAD: upload_concurrency}
+    FleetWorker(job_store, capabilities, routes, concurrency=concurrency).run()
+
+def main(resume=None, batch=None, script_concurrency=2, render_concurrency=3, upload_concurrency=1,
+         worker=None, prefetch=SCRIPT_PREFETCH):
+    """
+    Run one video job, a batch of jobs, continue an earlier job, or serve
+    as a fleet worker.
     
-    # Download the generated video using the selected avatar
-    client.generate_and_download_video(
-        input_text=script_content,
-        output_path=output_file,
-        avatar_id=avatar_data["avater_id"],
-        voice_id=avatar_data["voide_id"],
-        width=720,
-        height=1280
-    )
-    print(f"Video downloaded successfully to {output_file}")
+    Args:
+        resume (str): Job ID or directory to resume, or "latest" for the most
+            recent unfinished job. Completed stages are not run again.
+        batch (int): Number of videos to produce in one pipelined run.
+        script_concurrency (int): Script generation workers in batch mode.
+        render_concurrency (int): Concurrent renders in batch mode.
+        upload_concurrency (int): Concurrent uploads in batch mode.
+        worker (list): Capabilities to serve the shared job store with (see run_worker).
+        prefetch (int): Scripts to research in the background ahead of rendering.
+    """
+    print(f"Current UTC time: {time.strftime('%Y-%m-%d %H:%M:%S')}")
     
-    # Save metadata about the generation
-    metadata_file = os.path.join(output_folder, f"metadata_{unique_id}.json")
-    metadata = {
-        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
-        "topic": topic,
-        "avatar_used": avatar_name,
-        "output_file": output_file
-    }
-    with open(metadata_file, 'w') as f:
-        json.dump(metadata, f, indent=4)
+    # Create an output folder if it doesn't exist
+    output_folder = OUTPUT_FOLDER
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
     
-    # Upload the video to YouTube
-    title = video_metadata.generate_video_title(script_content)
-    description = video_metadata.generate_video_description(script_content)
-    tags = video_metadata.generate_video_tags(script_content)
-    upload_video(
-        file_path=output_file,
-        title=title, 
-        description=description,  
-        tags=tags, 
-        privacy="unlisted"
-    )
+    prefetcher = None
+    if prefetch:
+        store = get_shared_store() if worker else job_store
+        prefetcher = ScriptPrefetcher(script_generator, video_metadata, store, size=prefetch).start()
+    try:
+        if worker:
+            run_worker(worker, output_folder, script_concurrency, render_concurrency, upload_concurrency)
+            return
+        
+        if batch:
+            run_batch_jobs(batch, output_folder, script_concurrency, render_concurrency, upload_concurrency)
+            return
+        
+        if resume:
+            job_dir = resolve_resume(resume)
+            params = None
+            print(f"Resuming job {job_dir}")
+        else:
+            job_dir, params = new_job(output_folder)
+            print(f"Starting job {job_dir}")
+        
+        pipeline = build_pipeline(job_dir)
+        script = pipeline.result("script") if resume else None
+        if script:
+            # The worker that held this topic is gone
+            job_store.take_over(script["topic_id"])
+        try:
+            pipeline.run(params)
+        except PipelineError as e:
+            record_failure(pipeline, e)
+            print(f"{str(e)}. Rerun with --resume {os.path.basename(job_dir)} to continue from the failed stage.")
+            return
+    finally:
+        if prefetcher is not None:
+            prefetcher.stop(wait=False)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate videos and upload them to YouTube.")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None, metavar="JOB_ID",
+                        help="Continue an unfinished job (the most recent one if no ID is given).")
+    parser.add_argument("--batch", type=int, default=None, metavar="N",
+                        help="Produce N videos in one pipelined run.")
+    parser.add_argument("--script-concurrency", type=int, default=2, metavar="S",
+                        help="Scripts generated at the same time in batch mode.")
+    parser.add_argument("--render-concurrency", type=int, default=3, metavar="K",
+                        help="Videos rendered at the same time in batch mode.")
+    parser.add_argument("--upload-concurrency", type=int, default=1, metavar="U",
+                        help="Videos uploaded at the same time in batch mode.")
+    parser.add_argument("--speculative", type=int, default=None, metavar="K",
+                        help="Research K topics at once and use the first script (default SPECULATIVE_TOPICS).")
+    parser.add_argument("--prefetch", type=int, default=SCRIPT_PREFETCH, metavar="N",
+                        help="Keep N researched scripts buffered in the background (default SCRIPT_PREFETCH).")
+    parser.add_argument("--worker", type=parse_capabilities, default=None, metavar="CAPABILITIES",
+                        help="Serve the shared job store (FLEET_STORE) as a fleet worker doing the comma "
+                             "separated work, out of script, heygen and upload.")
+    args = parser.parse_args()
+    if args.speculative:
+        SPECULATIVE_TOPICS = max(1, args.speculative)
+    if sum(bool(mode) for mode in (args.batch, args.resume, args.worker)) > 1:
+        parser.error("--resume, --batch and --worker cannot be combined")
+    if args.worker and USE_UPLOAD_QUEUE:
+        parser.error("fleet workers upload through the job store; unset UPLOAD_QUEUE")
+    main(resume=args.resume, batch=args.batch, script_concurrency=args.script_concurrency,
+         render_concurrency=args.render_concurrency, upload_concurrency=args.upload_concurrency,
+         worker=args.worker, prefetch=args.prefetch)
@@ -1,10 +1,13 @@
 #!/bin/bash
-# filepath: /ext_disk/videoGAN/Script_to_video/run_main.sh
+# Run from the repository root, wherever it is checked out. Extra arguments
+# are passed to run_musetalk.py, e.g. ./run_Musetalk.sh --worker musetalk,upload
+
+cd "$(dirname "$0")"
 
 # Activate the virtual environment
-source /ext_disk/videoGAN/Script_to_video/.venv/bin/activate
+source "${VENV:-.venv}/bin/activate"
 
 # Run the Python script
-python /ext_disk/videoGAN/Script_to_video/run_musetalk.py --upload >> /ext_disk/videoGAN/Script_to_video/cron.log 2>&1
+python run_musetalk.py --upload "$@" >> cron.log 2>&1
 
-echo  -e "\n\n\n" >> cron.log
\ No newline at end of file
+echo  -e "\n\n\n" >> cron.log
@@ -1,20 +1,24 @@
 from utils.script_generator.script_generator import ScriptGenerator
-from utils.Musetalk import MuseTalk
+from utils.musetalk_pool import MuseTalkPool
 import os
 import time
-from utils.uploadToYoutube.uploadToYoutube import upload_video
-import uuid
+from utils.uploadToYoutube.uploadToYoutube import upload_video, get_authenticated_service
+from utils.upload_queue import UploadQueue
 import random
 import json
 from utils.video_metadata import VideoMetadata
+from utils.pipeline import Pipeline, PipelineError, Stage, new_job_dir, resolve_resume
+from utils.job_store import get_default_job_store, QUEUED, SCRIPTED, RENDERED, UPLOADED
+from utils.script_buffer import buffered_script, DEFAULT_TTL
+from utils.fleet import FleetWorker, Route, get_shared_store, parse_capabilities, SCRIPT, MUSETALK, UPLOAD
 import argparse
 
 script_generator = ScriptGenerator()
-# Initialize the MuseTalk client
-musetalk_client = MuseTalk(
-    base_url="http://localhost:7860",
-)
 video_metadata = VideoMetadata()
+# Topics and the state of the videos made from them (shared with main.py)
+job_store = get_default_job_store()
+# Put this on shared storage (with PIPELINE_JOBS_ROOT) when running a fleet
+OUTPUT_FOLDER = os.getenv("OUTPUT_DIR", "outputs")
 
 
 def get_script(topic):
@@ -34,145 +38,235 @@ def get_script(topic):
     return "Could not generate a response for your query."
 
 
-def load_topics():
+def generate_script_for_topic(topic=None, job_dir=None):
     """
-    Load topics from the JSON file.
-    
-    Returns:
-        list: List containing topics.
-    """
-    topics_file = 'utils/video_topics.json'
-    if os.path.exists(topics_file):
-        with open(topics_file, 'r') as file:
-            return json.load(file)
-    else:
-        print(f"Warning: Topics file not found at {topics_file}")
-        return {"topics": ["Debate of GoAT of football"]}  # Default topic as fallback
-
-def get_random_topic(topics_data):
-    """
-    Select a random topic from the available topics.
+    Claim topics from the job store until one yields a script. A fresh
+    script buffered ahead of time (see utils/script_buffer.py) is used first.
     
     Args:
-        topics_data (dict): Dictionary containing topics list.
-        
-    Returns:
-        str: Selected topic.
-    """
-    topics = topics_data.get("topics", [])
-    if not topics:
-        print("No topics available in the topics file.")
-        return "Debate of GoAT of football"  # Default topic as fallback
+        topic (dict): Topic job already claimed for this video (worker mode); only it is tried.
+        job_dir (str): Pipeline job directory, recorded on the topic.
     
-    return random.choice(topics)
-
-def remove_used_topic(topic, topics_data):
-    """
-    Remove a topic from the topics list after it has been used.
-    
-    Args:
-        topic (str): The topic to remove.
-        topics_data (dict): Dictionary containing topics list.
-        
     Returns:
-        dict: Updated topics data.
+        dict: The chosen topic, its job store ID and its script.
     """
-    if "topics" in topics_data and topic in topics_data["topics"]:
-        topics_data["topics"].remove(topic)
-        # Save the updated topics list back to the file
-        with open('utils/video_topics.json', 'w') as file:
-            json.dump(topics_data, file, indent=4)
-        print(f"Topic '{topic}' has been removed from the topics list.")
-    return topics_data
-
-if __name__ == "__main__":
-    # Parse command-line arguments
-    parser = argparse.ArgumentParser(description="Generate and optionally upload a video.")
-    parser.add_argument("--upload", action="store_true", help="Upload the generated video to YouTube.")
-    args = parser.parse_args()
-
-    # Load topics data
-    topics_data = load_topics()
+    if topic is None:
+        job_store.expire_payloads(DEFAULT_TTL)
+    ready = topic if topic is not None else job_store.claim(ready=True)
+    payload = buffered_script(ready)
+    if payload:
+        print(f"Using the buffered script for topic: '{ready['topic']}'")
+        job_store.advance(ready["id"], SCRIPTED, job_dir=job_dir, backend=MUSETALK)
+        return {"topic": ready["topic"], "topic_id": ready["id"], "script": payload["script"],
+                "video_info": payload.get("video_info")}
+    if topic is None and ready is not None:
+        job_store.release(ready["id"], attempted=False)
     
     # Try to generate a script with a valid topic
-    max_attempts = 3
+    max_attempts = 1 if topic is not None else 3
     attempts = 0
-    script_content = None
-    topic = None
     
-    while attempts < max_attempts and script_content is None:
-        # Select a random topic
-        if not topics_data.get("topics", []):
-            print("No more topics available in the topics list.")
+    while attempts < max_attempts:
+        # Claim a random topic
+        job = topic or job_store.claim()
+        if job is None:
+            print("No more topics available in the topic store.")
             break
-            
-        topic = get_random_topic(topics_data)
-        print(f"Attempt {attempts+1}: Selected topic: {topic}")
+        print(f"Attempt {attempts+1}: Selected topic: {job['topic']}")
         
         # Generate a script based on the selected topic
-        script_content = get_script(topic)
+        script_content = get_script(job["topic"])
         
         # Check if script generation was successful
         if script_content == "Could not generate a response for your query.":
-            print(f"Failed to generate script for topic: '{topic}'. Removing it and trying another topic.")
-            # remove_used_topic(topic, topics_data)
-            script_content = None
+            print(f"Failed to generate script for topic: '{job['topic']}'. Marking it failed and trying another topic.")
+            job_store.fail(job["id"], "Could not generate a script", retry=False)
             attempts += 1
-        else:
-            print(f"Successfully generated script for topic: '{topic}'")
-            # remove_used_topic(topic, topics_data)
+            continue
         
-    # If all attempts failed, exit the program
-    if script_content is None or script_content == "Could not generate a response for your query.":
-        print("Failed to generate a script after multiple attempts. Exiting program.")
+        print(f"Successfully generated script for topic: '{job['topic']}'")
+        print("Output script:", script_content)
+        job_store.advance(job["id"], SCRIPTED, job_dir=job_dir, backend=MUSETALK)
+        return {"topic": job["topic"], "topic_id": job["id"], "script": script_content}
         
-    script_content = get_script(topic)
+    # If all attempts failed, stop the job
+    raise Exception("Failed to generate a script after multiple attempts.")
+
+
+def build_pipeline(job_dir, musetalk_client, args):
+    """
+    The MuseTalk video job as a stage graph. When uploading, metadata
+    generation and YouTube authentication run while the video renders.
+    """
+    def pick_speaker():
+        input_speaker = random.choice(musetalk_client.list_speakers())
+        print("Selected speaker:", input_speaker)
+        return input_speaker
+
+    def render(script, output_file):
+        # # Create a video
+        created = musetalk_client.create_video(
+            text=script["script"],
+            video_path=output_file,
+            input_video_id=args.input_video,
+            gender=args.gender
+        )
+        if not created:
+            raise Exception(f"MuseTalk could not render {output_file}")
+        job_store.advance(script["topic_id"], RENDERED, release=not args.upload)
+        return output_file
+
+    def save_metadata(script, render, metadata_file):
+        metadata = {
+            "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "topic": script["topic"],
+            "output_file": render
+        }
+        with open(metadata_file, 'w') as f:
+            json.dump(metadata, f, indent=4)
+        return metadata_file
+
+    def upload(script, render, video_info, youtube):
+        # Charged to the channel quota the upload queue tracks
+        UploadQueue().record_insert(file_path=render)
+        video_id = upload_video(
+            file_path=render,
+            title=video_info["title"], 
+            description=video_info["description"],  
+            tags=video_info["tags"], 
+            privacy="unlisted",
+            youtube=youtube
+        )
+        print("Video uploaded to YouTube.")
+        job_store.advance(script["topic_id"], UPLOADED, release=True)
+        return video_id
+
+    stages = [
+        Stage("script", generate_script_for_topic, inputs=["topic", "job_dir"]),
+        Stage("speaker", pick_speaker),
+        Stage("render", render, inputs=["script", "output_file"], validate=os.path.exists),
+        Stage("metadata_file", save_metadata, inputs=["script", "render", "metadata_file"]),
+    ]
+    # Upload the video to YouTube if --upload is provided
+    if args.upload:
+        stages += [
+            Stage("video_info", lambda script: script.get("video_info") or video_metadata.generate_all(script["script"]),
+                  inputs=["script"]),
+            Stage("youtube", get_authenticated_service, checkpoint=False),
+            Stage("upload", upload, inputs=["script", "render", "video_info", "youtube"]),
+        ]
+    return Pipeline(stages, job_dir)
+
+
+def new_job(output_folder, topic=None):
+    """
+    Returns:
+        tuple: (job directory, job parameters) of a fresh job.
+    """
+    unique_id, job_dir = new_job_dir()
+    params = {
+        "topic": topic,
+        "job_dir": job_dir,
+        "output_file": os.path.join(output_folder, f"output_{unique_id}.mp4"),
+        "metadata_file": os.path.join(output_folder, f"metadata_{unique_id}.json"),
+    }
+    return job_dir, params
+
+
+def run_worker(capabilities, musetalk_client, args, output_folder):
+    """
+    Serve the shared job store as one host of a worker fleet: "script"
+    researches queued topics and pins them to MuseTalk, "musetalk" renders
+    them on this host's servers and "upload" uploads the results. Job
+    directories and outputs must be on storage every host can reach.
+    """
+    global job_store
+    job_store = get_shared_store()
     
-    print(f"Current UTC time: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-    print("Output script:", script_content)
+    def script_job(job):
+        job_dir, params = job["job_dir"], None
+        if not job_dir or not os.path.isdir(job_dir):
+            job_dir, params = new_job(output_folder, {"id": job["id"], "topic": job["topic"], "payload": job["payload"]})
+        build_pipeline(job_dir, musetalk_client, args).run(params, targets=["script", "video_info"])
+        job_store.advance(job["id"], SCRIPTED, release=True, job_dir=job_dir, backend=MUSETALK)
     
-    # Create an output folder if it doesn't exist
-    output_folder = "outputs"
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+    def render_job(job):
+        build_pipeline(job["job_dir"], musetalk_client, args).run(targets=["render", "metadata_file"])
+        job_store.advance(job["id"], RENDERED, release=True)
     
-    speakers = musetalk_client.list_speakers()
+    def upload_job(job):
+        build_pipeline(job["job_dir"], musetalk_client, args).run(targets=["upload"])
+        job_store.advance(job["id"], UPLOADED, release=True)
     
-    input_speaker = random.choice(speakers)
-    print("Selected speaker:", input_speaker)
+    routes = [
+        Route(QUEUED, SCRIPT, script_job),
+        Route(SCRIPTED, MUSETALK, render_job, backend=MUSETALK),
+        Route(RENDERED, UPLOAD, upload_job, backend=MUSETALK),
+    ]
+    # One render per free MuseTalk slot
+    concurrency = {SCRIPT: 1, MUSETALK: len(args.servers) * args.capacity, UPLOAD: 1}
+    FleetWorker(job_store, capabilities, routes, concurrency=concurrency).run()
+
+
+def run_job(musetalk_client, args, output_folder):
+    """Run one video job, or continue an earlier one with --resume"""
+    if args.resume:
+        job_dir = resolve_resume(args.resume)
+        params = None
+        print(f"Resuming job {job_dir}")
+    else:
+        job_dir, params = new_job(output_folder)
+        print(f"Starting job {job_dir}")
     
-    unique_id = str(uuid.uuid4())
-    output_file = os.path.join(output_folder, f"output_{unique_id}.mp4")
+    pipeline = build_pipeline(job_dir, musetalk_client, args)
+    script = pipeline.result("script") if args.resume else None
+    if script:
+        # The worker that held this topic is gone
+        job_store.take_over(script["topic_id"])
+    try:
+        pipeline.run(params)
+    except PipelineError as e:
+        script = pipeline.result("script")
+        if script:
+            job_store.fail(script["topic_id"], e)
+        print(f"{str(e)}. Rerun with --resume {os.path.basename(job_dir)} to continue from the failed stage.")
+    if not args.upload:
+        print("Skipping video upload as --upload flag was not provided.")
+
+
+if __name__ == "__main__":
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(description="Generate and optionally upload a video.")
+    parser.add_argument("--upload", action="store_true", help="Upload the generated video to YouTube.")
+    parser.add_argument("--servers", nargs="+", default=[os.getenv("MUSETALK_URL", "http://localhost:7860")],
+                        help="MuseTalk server base URLs; jobs go to the least loaded one.")
+    parser.add_argument("--capacity", type=int, default=1, help="Concurrent jobs each MuseTalk server can run.")
+    parser.add_argument("--input-video", default="sample9.mp4", help="Source video the speaker is rendered from.")
+    parser.add_argument("--gender", default="Female", help="Voice gender used for the speech.")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None, metavar="JOB_ID",
+                        help="Continue an unfinished job (the most recent one if no ID is given).")
+    parser.add_argument("--worker", type=parse_capabilities, default=None, metavar="CAPABILITIES",
+                        help="Serve the shared job store (FLEET_STORE) as a fleet worker doing the comma "
+                             "separated work, out of script, musetalk and upload.")
+    args = parser.parse_args()
+    if args.worker and args.resume:
+        parser.error("--resume cannot be combined with --worker")
+    if args.worker:
+        # Uploading is a fleet capability; any upload host may take the video
+        args.upload = True
+
+    # Initialize the MuseTalk pool (keep-alive sessions, cached speaker list)
+    musetalk_client = MuseTalkPool(args.servers, capacity=args.capacity)
     
-    # # Create a video
-    musetalk_client.create_video(
-        text=script_content,
-        video_path=output_file,
-        input_video_id = 'sample9.mp4',
-        gender='Female'
-    )
+    print(f"Current UTC time: {time.strftime('%Y-%m-%d %H:%M:%S')}")
     
-    metadata_file = os.path.join(output_folder, f"metadata_{unique_id}.json")
-    metadata = {
-        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
-        "topic": topic,
-        "output_file": output_file
-    }
-    with open(metadata_file, 'w') as f:
-        json.dump(metadata, f, indent=4)
+    # Create an output folder if it doesn't exist
+    output_folder = OUTPUT_FOLDER
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
     
-    # Upload the video to YouTube if --upload is provided
-    if args.upload:
-        title = video_metadata.generate_video_title(script_content)
-        description = video_metadata.generate_video_description(script_content)
-        tags = video_metadata.generate_video_tags(script_content)
-        upload_video(
-            file_path=output_file,
-            title=title, 
-            description=description,  
-            tags=tags, 
-            privacy="unlisted"
-        )
-        print("Video uploaded to YouTube.")
+    if args.worker:
+        run_worker(args.worker, musetalk_client, args, output_folder)
     else:
-        print("Skipping video upload as --upload flag was not provided.")
\ No newline at end of file
+        run_job(musetalk_client, args, output_folder)
+    musetalk_client.shutdown()
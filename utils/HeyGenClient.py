@@ -3,28 +3,49 @@ import dotenv
 import os
 import time
 import json
-from typing import Dict, Any, Optional
+import shutil
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional
+from utils.downloader import download_file, DownloadError
+from utils.job_poller import JobPoller, JobFailedError, JobTimeoutError, get_default_poller, PENDING, COMPLETED, FAILED
+from utils.render_store import RenderStore, resolve_render_store
+from utils.scene_planner import Scene, MAX_SCENES_PER_REQUEST, join_videos, plan_scenes
 
 # Load environment variables
 dotenv.load_dotenv()
 
+# Shortest poll delay when completion is expected through a webhook callback
+FALLBACK_POLL_INTERVAL = 30
+DEFAULT_BACKGROUND = "#000000"
+
 class HeyGenClient:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, poller: Optional[JobPoller] = None,
+                 callback_url: Optional[str] = None, base_url: Optional[str] = None,
+                 render_store: Optional[RenderStore] = None):
         """
         Initialize the HeyGen API client.
         
         Args:
             api_key: Optional API key. If not provided, will try to get it from environment variable.
+            poller: JobPoller tracking render status. Defaults to the shared process-wide poller.
+            callback_url: Webhook HeyGen notifies on completion (see utils.render_webhook).
+                Falls back to HEYGEN_CALLBACK_URL; polling then only runs as a slow safety net.
+            base_url: API root, e.g. a local stand-in server. Falls back to HEYGEN_BASE_URL.
+            render_store: RenderStore consulted before submitting a render. Defaults to the
+                shared store; pass False to always render.
         """
         self.api_key = api_key or os.getenv("HEY_GEN_KEY")
         if not self.api_key:
             raise ValueError("API key is required. Set HEYGEN_API_KEY environment variable or pass it directly.")
         
-        self.base_url = "https://api.heygen.com"
+        self.base_url = (base_url or os.getenv("HEYGEN_BASE_URL") or "https://api.heygen.com").rstrip("/")
+        self.poller = poller or get_default_poller()
+        self.callback_url = callback_url or os.getenv("HEYGEN_CALLBACK_URL")
+        self.render_store = resolve_render_store(render_store)
     
     def generate_video(self, input_text: str, avatar_id: str = "05ff47bf08f74d8d9161aae0c003f53b", 
                       voice_id: str = "0d4d97379a6746baa5dfc692b37774d4", 
-                      bg_color: str = "#000000",
+                      bg_color: str = DEFAULT_BACKGROUND,
                       width: int = 720, height: int = 1280) -> str:
         """
         Generate a video using the HeyGen API.
@@ -40,32 +61,42 @@ class HeyGenClient:
         Returns:
             video_id: The ID of the generated video
         """
+        video_input = self._video_input(input_text, avatar_id, voice_id, bg_color)
+        return self._submit_video_inputs([video_input], width, height)
+    
+    @staticmethod
+    def _video_input(input_text: str, avatar_id: str, voice_id: str, bg_color: str) -> Dict[str, Any]:
+        """Build one entry of the v2/video/generate `video_inputs` list"""
+        return {
+            "character": {
+                "type": "avatar",
+                "avatar_id": avatar_id,
+                "avatar_style": "normal"
+            },
+            "voice": {
+                "type": "text",
+                "input_text": input_text,
+                "voice_id": voice_id
+            },
+            "background": {
+                "type": "color",
+                "value": bg_color
+            }
+        }
+    
+    def _submit_video_inputs(self, video_inputs: List[Dict[str, Any]], width: int, height: int) -> str:
+        """Submit a v2/video/generate request and return the video ID"""
         url = f"{self.base_url}/v2/video/generate"
         
         payload = {
-            "video_inputs": [
-                {
-                    "character": {
-                        "type": "avatar",
-                        "avatar_id": avatar_id,
-                        "avatar_style": "normal"
-                    },
-                    "voice": {
-                        "type": "text",
-                        "input_text": input_text,
-                        "voice_id": voice_id
-                    },
-                    "background": {
-                        "type": "color",
-                        "value": bg_color
-                    }
-                }
-            ],
+            "video_inputs": video_inputs,
             "dimension": {
                 "width": width,
                 "height": height
             }
         }
+        if self.callback_url:
+            payload["callback_url"] = self.callback_url
         
         headers = {
             "X-Api-Key": self.api_key,
@@ -84,6 +115,33 @@ class HeyGenClient:
             
         return response_data["data"]["video_id"]
     
+    def generate_multi_scene_video(self, scenes: List[Scene], avatar_id: str = "05ff47bf08f74d8d9161aae0c003f53b",
+                                   voice_id: str = "0d4d97379a6746baa5dfc692b37774d4",
+                                   bg_color: str = DEFAULT_BACKGROUND,
+                                   width: int = 720, height: int = 1280) -> str:
+        """
+        Generate one video from several scenes in a single request.
+        
+        Args:
+            scenes: Scenes from utils.scene_planner.plan_scenes
+            avatar_id: Avatar for scenes that do not set their own
+            voice_id: Voice for scenes that do not set their own
+            bg_color: Background for scenes that do not set their own
+            width: Video width in pixels
+            height: Video height in pixels
+            
+        Returns:
+            video_id: The ID of the generated video
+        """
+        if len(scenes) > MAX_SCENES_PER_REQUEST:
+            raise ValueError(f"HeyGen accepts at most {MAX_SCENES_PER_REQUEST} scenes per video, got {len(scenes)}")
+        video_inputs = [
+            self._video_input(scene.text, scene.avatar_id or avatar_id, scene.voice_id or voice_id,
+                              scene.background or bg_color)
+            for scene in scenes
+        ]
+        return self._submit_video_inputs(video_inputs, width, height)
+    
     def check_video_status(self, video_id: str) -> Dict[str, Any]:
         """
         Check the status of a video.
@@ -111,42 +169,76 @@ class HeyGenClient:
         
         return response.json()
     
+    @staticmethod
+    def estimate_render_seconds(input_text: str) -> float:
+        """
+        Rough render time estimate used to seed the poll schedule.
+        Assumes ~15 spoken characters per second and about twice real time to render.
+        """
+        return 30 + 2 * (len(input_text) / 15)
+    
+    def _poll_status(self, video_id: str):
+        """
+        Single status check in the (state, payload) form expected by JobPoller.
+        """
+        status_data = self.check_video_status(video_id)
+        
+        if status_data["code"] != 100:
+            return FAILED, f"API error: {status_data.get('message', 'Unknown error')}"
+            
+        video_status = status_data["data"]["status"]
+        
+        if video_status == "completed":
+            return COMPLETED, status_data["data"]
+            
+        if video_status == "failed" or status_data["data"].get("error"):
+            return FAILED, status_data["data"].get("error", "Unknown error")
+        
+        print(f"Video {video_id} status: {video_status}")
+        return PENDING, None
+    
+    def track_video(self, video_id: str, expected_duration: float = 60, timeout: int = 1800,
+                    callback: Optional[Callable[[Future], None]] = None,
+                    poll_interval: Optional[float] = None) -> Future:
+        """
+        Start tracking a video without blocking.
+        
+        Args:
+            video_id: ID of the video to track
+            expected_duration: Estimated render seconds, used to delay the first check
+            timeout: Max seconds to wait for completion
+            callback: Called with the finished future
+            poll_interval: Shortest delay between status checks
+            
+        Returns:
+            Future resolving to the final video status data
+        """
+        return self.poller.submit(video_id, lambda: self._poll_status(video_id),
+                                  expected_duration=expected_duration, timeout=timeout,
+                                  callback=callback, min_interval=poll_interval)
+    
     def wait_for_video_completion(self, video_id: str, poll_interval: int = 5, 
-                                 timeout: int = 300) -> Dict[str, Any]:
+                                 timeout: int = 1800, expected_duration: float = 60) -> Dict[str, Any]:
         """
         Poll the video status until it's completed or an error occurs.
         
         Args:
             video_id: ID of the video to check
-            poll_interval: Seconds to wait between status checks
+            poll_interval: Shortest delay in seconds between status checks
             timeout: Max seconds to wait for completion
+            expected_duration: Estimated render seconds, used to delay the first check
             
         Returns:
             Final video status data
         """
-        start_time = time.time()
-        while True:
-            status_data = self.check_video_status(video_id)
-            
-            if status_data["code"] != 100:
-                raise Exception(f"API error: {status_data.get('message', 'Unknown error')}")
-                
-            video_status = status_data["data"]["status"]
-            
-            if video_status == "completed":
-                return status_data["data"]
-                
-            if video_status == "failed" or status_data["data"].get("error"):
-                error_msg = status_data["data"].get("error", "Unknown error")
-                raise Exception(f"Video generation failed: {error_msg}")
-                
-                
-            print(f"Video status: {video_status}. Checking again in {poll_interval} seconds...")
-            time.sleep(poll_interval)
+        future = self.track_video(video_id, expected_duration=expected_duration,
+                                  timeout=timeout, poll_interval=poll_interval)
+        return future.result()
     
     def download_video(self, video_url: str, output_path: str) -> str:
         """
         Download a video from a URL and save it to disk.
+        The file is resumable, verified and only renamed into place when complete.
         
         Args:
             video_url: URL of the video to download
@@ -155,16 +247,12 @@ class HeyGenClient:
         Returns:
             Path to the saved video file
         """
-        response = requests.get(video_url, stream=True)
-        
-        if response.status_code != 200:
-            raise Exception(f"Error downloading video: {response.status_code}")
-            
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        try:
+            result = download_file(video_url, output_path)
+        except DownloadError as e:
+            raise Exception(f"Error downloading video: {str(e)}")
                 
-        print(f"Video downloaded successfully to {output_path}")
+        print(f"Video downloaded successfully to {output_path} ({result.size} bytes, sha256 {result.sha256})")
         return output_path
     
     def generate_and_download_video(self, input_text: str, output_path: str, 
@@ -183,18 +271,188 @@ class HeyGenClient:
         Returns:
             Path to the downloaded video file
         """
-        print(f"Generating video with text: '{input_text}'")
-        video_id = self.generate_video(input_text=input_text, avatar_id=avatar_id, voice_id=voice_id, width=width, height=height)
+        key = self._render_key(input_text, avatar_id, voice_id, width, height)
+        if self.render_store and self.render_store.restore(key, output_path):
+            return output_path
+        
+        video_url = self.render_video(input_text, avatar_id=avatar_id, voice_id=voice_id, width=width, height=height)
+        print(f"Video is ready. Downloading from {video_url}")
+        self.download_video(video_url, output_path)
+        if self.render_store:
+            self.render_store.record_completed(key, output_path=output_path)
+        return output_path
+    
+    def _wait_for_render(self, video_id: str, expected_duration: float) -> Dict[str, Any]:
+        """Wait for a submitted render, polling rarely when a webhook will report it"""
+        if self.callback_url:
+            # Completion normally arrives through the webhook; poll rarely as a fallback
+            return self.wait_for_video_completion(
+                video_id, poll_interval=FALLBACK_POLL_INTERVAL, expected_duration=2 * expected_duration
+            )
+        return self.wait_for_video_completion(video_id, expected_duration=expected_duration)
+    
+    def _render_key(self, input_text: str, avatar_id: str, voice_id: str, width: int, height: int,
+                    background: str = DEFAULT_BACKGROUND) -> str:
+        """RenderStore key of a render on this client's server"""
+        return RenderStore.make_key("heygen", input_text, avatar_id, voice_id, width, height, background,
+                                    endpoint=self.base_url)
+    
+    def _render(self, key: str, submit: Callable[[], str], expected_duration: float) -> str:
+        """
+        Re-attach to the earlier render of `key` or call `submit()` for a new
+        one, wait for it and record it in the render store.
         
-        print(f"Video generation started with ID: {video_id}")
-        print("Waiting for video to complete...")
+        Returns:
+            URL of the finished video
+        """
+        video_data = None
         
-        video_data = self.wait_for_video_completion(video_id)
+        entry = self.render_store.get(key) if self.render_store else None
+        if entry and entry["job_id"]:
+            print(f"Re-attaching to earlier render {entry['job_id']}")
+            remaining = max(0, expected_duration - (time.time() - entry["submitted_at"]))
+            try:
+                video_data = self._wait_for_render(entry["job_id"], remaining)
+            except (JobFailedError, JobTimeoutError) as e:
+                print(f"Earlier render {entry['job_id']} cannot be reused ({str(e)}), submitting a new one")
+                self.render_store.record_failed(key, e)
+        
+        if video_data is None:
+            video_id = submit()
+            if self.render_store:
+                self.render_store.record_submitted(key, "heygen", video_id)
+            
+            print(f"Video generation started with ID: {video_id}")
+            print("Waiting for video to complete...")
+            try:
+                video_data = self._wait_for_render(video_id, expected_duration)
+            except (JobFailedError, JobTimeoutError) as e:
+                if self.render_store:
+                    self.render_store.record_failed(key, e)
+                raise
         
         video_url = video_data.get("video_url")
         if not video_url:
             raise Exception("Video URL not found in the response")
+        if self.render_store:
+            self.render_store.record_completed(key, video_url=video_url)
             
-        print(f"Video is ready. Downloading from {video_url}")
-        return self.download_video(video_url, output_path)
-
+        return video_url
+    
+    def render_video(self, input_text: str,
+                     avatar_id: str = "Daisy-inskirt-20220818",
+                     voice_id: str = "2d5b0e6cf36f460aa7fc47e3eee4ba54",
+                     width: int = 720, height: int = 1280) -> str:
+        """
+        Generate a video and wait for it, without downloading.
+        
+        A render of the same inputs that was submitted earlier, e.g. by a
+        process that crashed afterwards, is re-attached to instead of
+        submitted again.
+        
+        Args:
+            input_text: The text for the avatar to speak
+            avatar_id: ID of the avatar to use
+            voice_id: ID of the voice to use
+            
+        Returns:
+            URL of the finished video
+        """
+        def submit():
+            print(f"Generating video with text: '{input_text}'")
+            return self.generate_video(input_text=input_text, avatar_id=avatar_id, voice_id=voice_id,
+                                       bg_color=DEFAULT_BACKGROUND, width=width, height=height)
+        
+        key = self._render_key(input_text, avatar_id, voice_id, width, height)
+        return self._render(key, submit, self.estimate_render_seconds(input_text))
+    
+    def generate_and_download_scenes(self, input_text: str, output_path: str,
+                                     avatar_id: str = "Daisy-inskirt-20220818",
+                                     voice_id: str = "2d5b0e6cf36f460aa7fc47e3eee4ba54",
+                                     width: int = 720, height: int = 1280,
+                                     scenes: Optional[List[Scene]] = None,
+                                     parallel: bool = True, max_retries: int = 2) -> str:
+        """
+        Render a long script as several scenes.
+        
+        With `parallel`, every scene is rendered as its own video at the same
+        time, a failed scene is resubmitted on its own (up to `max_retries`
+        times) and the parts are joined locally with ffmpeg. Otherwise all
+        scenes are packed into one multi-input request. Each render goes
+        through the render store, so a retried job re-attaches to running
+        scenes and reuses the ones already downloaded.
+        
+        Args:
+            input_text: The text for the avatar to speak
+            output_path: Path where to save the video
+            avatar_id: Avatar for scenes that do not set their own
+            voice_id: Voice for scenes that do not set their own
+            width: Video width in pixels
+            height: Video height in pixels
+            scenes: Pre-planned scenes; planned from input_text when omitted
+            parallel: Render scenes separately and join them locally
+            max_retries: Resubmissions allowed per failed scene
+            
+        Returns:
+            Path to the downloaded video file
+        """
+        scenes = scenes or plan_scenes(input_text)
+        print(f"Rendering {len(scenes)} scene(s) ({'parallel' if parallel else 'single request'})")
+        
+        if not parallel or len(scenes) == 1:
+            # Keyed by every scene's text, avatar, voice and background
+            layout = json.dumps([[scene.text, scene.avatar_id or avatar_id, scene.voice_id or voice_id,
+                                  scene.background or DEFAULT_BACKGROUND] for scene in scenes])
+            key = self._render_key(layout, avatar_id, voice_id, width, height)
+            if self.render_store and self.render_store.restore(key, output_path):
+                return output_path
+            video_url = self._render(
+                key,
+                lambda: self.generate_multi_scene_video(scenes, avatar_id=avatar_id, voice_id=voice_id,
+                                                        width=width, height=height),
+                self.estimate_render_seconds(input_text),
+            )
+            self.download_video(video_url, output_path)
+            if self.render_store:
+                self.render_store.record_completed(key, output_path=output_path)
+            return output_path
+        
+        # Kept until the join succeeds, so a retried job reuses finished scenes
+        scene_dir = output_path + ".scenes"
+        os.makedirs(scene_dir, exist_ok=True)
+        
+        def render_scene(scene):
+            scene_path = os.path.join(scene_dir, f"scene_{scene.index:03d}.mp4")
+            scene_avatar = scene.avatar_id or avatar_id
+            scene_voice = scene.voice_id or voice_id
+            background = scene.background or DEFAULT_BACKGROUND
+            key = self._render_key(scene.text, scene_avatar, scene_voice, width, height, background)
+            if self.render_store and self.render_store.restore(key, scene_path):
+                return scene_path
+            
+            def submit():
+                video_id = self.generate_video(input_text=scene.text, avatar_id=scene_avatar, voice_id=scene_voice,
+                                               bg_color=background, width=width, height=height)
+                print(f"Scene {scene.index} submitted with ID: {video_id}")
+                return video_id
+            
+            for attempt in range(max_retries + 1):
+                try:
+                    video_url = self._render(key, submit, self.estimate_render_seconds(scene.text))
+                    break
+                except (JobFailedError, JobTimeoutError) as e:
+                    if attempt == max_retries:
+                        raise Exception(f"Scene {scene.index} failed after {max_retries} retries: {str(e)}")
+                    print(f"Scene {scene.index} failed ({str(e)}), retrying this scene only...")
+            self.download_video(video_url, scene_path)
+            if self.render_store:
+                self.render_store.record_completed(key, output_path=scene_path)
+            return scene_path
+        
+        # Every scene renders at once; the poller does the waiting
+        with ThreadPoolExecutor(max_workers=len(scenes), thread_name_prefix="heygen-scene") as executor:
+            scene_paths = list(executor.map(render_scene, scenes))
+        join_videos(scene_paths, output_path)
+        shutil.rmtree(scene_dir, ignore_errors=True)
+        print(f"Joined {len(scenes)} scenes into {output_path}")
+        return output_path
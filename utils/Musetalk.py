@@ -2,10 +2,14 @@ import requests
 import json
 import os
 import time
+from utils.downloader import download_file, DownloadError
+from utils.job_poller import get_default_poller, PENDING, COMPLETED, FAILED, JobFailedError, JobTimeoutError
+from utils.render_store import RenderStore, resolve_render_store
 
 
 class MuseTalk:
-    def __init__(self, base_url, proxies=None, headers=None):
+    def __init__(self, base_url, proxies=None, headers=None, poller=None, callback_url=None, render_store=None,
+                 callback_token=None):
         """
         Initialize the MuseTalk client.
 
@@ -13,10 +17,27 @@ class MuseTalk:
             base_url (str): The base URL of the API.
             proxies (dict): Proxy settings for requests.
             headers (dict): Headers for API requests.
+            poller (JobPoller): Tracks job status. Defaults to the shared process-wide poller.
+            callback_url (str): Webhook a compatible server notifies on completion
+                (see utils.render_webhook); polling then only runs as a slow fallback.
+            render_store (RenderStore): Consulted before submitting a job. Defaults to the
+                shared store; pass False to always render.
+            callback_token (str): Token the server sends back with the callback so the
+                webhook can authenticate it; MUSETALK_WEBHOOK_TOKEN by default.
         """
         self.base_url = base_url
         self.proxies = proxies or {'http': None, 'https': None}
         self.headers = headers or {"Content-Type": "application/json"}
+        # Keep-alive connection pool reused by every request to this server
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.proxies.update(self.proxies)
+        # Explicit proxy settings must not be overridden by environment proxies
+        self.session.trust_env = False
+        self.poller = poller or get_default_poller()
+        self.callback_url = callback_url or os.getenv("MUSETALK_CALLBACK_URL")
+        self.callback_token = callback_token or os.getenv("MUSETALK_WEBHOOK_TOKEN")
+        self.render_store = resolve_render_store(render_store)
 
     def list_speakers(self):
         """
@@ -26,63 +47,145 @@ class MuseTalk:
             list: A list of speakers if successful, None otherwise.
         """
         try:
-            response = requests.get(f"{self.base_url}/speakers", headers=self.headers, proxies=self.proxies)
+            response = self.session.get(f"{self.base_url}/speakers")
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             print(f"Request failed: {str(e)}")
             return None
         
-    def create_video(self, text, video_path,input_video_id, gender):
+    @staticmethod
+    def estimate_render_seconds(text):
         """
-        Create a video using the API and download it upon success.
+        Rough render time estimate used to seed the poll schedule.
+        Assumes ~15 spoken characters per second and about three times real time to render.
+        """
+        return 20 + 3 * (len(text) / 15)
 
-        Args:
-            text (str): The text for the video.
-            video_path (str): Path to save the downloaded video.
-            gender (str): Gender for the video generation.
+    def submit_video(self, text, input_video_id, gender):
+        """
+        Submit a video generation job without waiting for it.
 
         Returns:
-            bool: True if the video was successfully downloaded, False otherwise.
+            str: The job ID, or None if the server did not return one.
         """
-        create_endpoint = f"{self.base_url}/generate_video"
-        status_endpoint = f"{self.base_url}/job-status"
         gender = gender.capitalize()  # Ensure
         payload = {
             "text": text,
             "gender": gender,
             "video_path": input_video_id
         }
-        
+        if self.callback_url:
+            payload["callback_url"] = self.callback_url
+            if self.callback_token:
+                payload["callback_token"] = self.callback_token
+        response = self.session.post(f"{self.base_url}/generate_video", data=json.dumps(payload))
+        response.raise_for_status()
+        return response.json().get("job_id")
+
+    def job_status(self, job_id):
+        """
+        Single status check in the (state, payload) form expected by JobPoller.
+        """
+        status_response = self.session.get(f"{self.base_url}/job-status/{job_id}")
+        status_response.raise_for_status()
+        status_data = status_response.json()
+
+        if status_data.get("status") == "success":
+            return COMPLETED, status_data
+        elif status_data.get("status") == "failed" or status_data.get("status") == "error":
+            return FAILED, status_data
+        print(f"Job {job_id} is still processing: {status_data}")
+        return PENDING, None
+
+    def track_job(self, job_id, expected_duration=60, timeout=1800, callback=None):
+        """
+        Start tracking a job without blocking.
+
+        Returns:
+            Future: Resolves to the final status data of the job.
+        """
+        min_interval = None
+        if self.callback_url:
+            # Completion normally arrives through the webhook; poll rarely as a fallback
+            expected_duration *= 2
+            min_interval = 30
+        return self.poller.submit(job_id, lambda: self.job_status(job_id),
+                                  expected_duration=expected_duration, timeout=timeout,
+                                  callback=callback, min_interval=min_interval)
+
+    @staticmethod
+    def render_key(text, input_video_id, gender):
+        """RenderStore key of a job; the same inputs give the same video on any server"""
+        return RenderStore.make_key("musetalk", text, avatar_id=input_video_id, voice_id=gender.capitalize())
+
+    def _reattach(self, key, text, timeout):
+        """
+        Wait for a job of the same inputs submitted earlier to this server.
+
+        Returns:
+            str: The job ID if it completed, None if there is nothing to reuse.
+        """
+        entry = self.render_store.get(key) if self.render_store else None
+        if not entry or not entry["job_id"] or entry["server"] != self.base_url:
+            return None
+        print(f"Re-attaching to earlier job {entry['job_id']}")
+        remaining = max(0, self.estimate_render_seconds(text) - (time.time() - entry["submitted_at"]))
         try:
-            # Step 1: Call the create-video API
-            print(self.headers)
-            response = requests.post(create_endpoint, data=json.dumps(payload), headers=self.headers,proxies=self.proxies)
-            response.raise_for_status()
-            job_id = response.json().get("job_id")
-            print(job_id)
-
-            if not job_id:
-                print("Failed to retrieve job_id from the response.")
-                return False
-
-            # Step 2: Poll the status endpoint
-            while True:
-                status_response = requests.get(f"{status_endpoint}/{job_id}", headers=self.headers, proxies=self.proxies)
-                status_response.raise_for_status()
-                status_data = status_response.json()
-                print(status_data)
-
-                if status_data.get("status") == "success":
-                    # Step 3: Download the video
-                    return self.download_video(job_id, video_path)
-                elif status_data.get("status") == "failed" or status_data.get("status") == "error":
-                    print("Video creation failed.")
-                    return False
+            self.track_job(entry["job_id"], expected_duration=remaining, timeout=timeout).result()
+            return entry["job_id"]
+        except (JobFailedError, JobTimeoutError, requests.exceptions.RequestException) as e:
+            print(f"Earlier job {entry['job_id']} cannot be reused ({str(e)}), submitting a new one")
+            self.render_store.record_failed(key, e)
+            return None
+        
+    def create_video(self, text, video_path,input_video_id, gender, timeout=1800):
+        """
+        Create a video using the API and download it upon success.
+
+        Args:
+            text (str): The text for the video.
+            video_path (str): Path to save the downloaded video.
+            gender (str): Gender for the video generation.
+            timeout (int): Max seconds to wait for the job to finish.
 
-                print("Video is still processing. Retrying in 5 seconds...")
-                time.sleep(5)
+        Returns:
+            bool: True if the video was successfully downloaded, False otherwise.
+        """
+        key = self.render_key(text, input_video_id, gender)
+        if self.render_store and self.render_store.restore(key, video_path):
+            return True
 
+        try:
+            job_id = self._reattach(key, text, timeout)
+            if job_id is None:
+                # Step 1: Call the create-video API
+                job_id = self.submit_video(text, input_video_id, gender)
+                print(job_id)
+
+                if not job_id:
+                    print("Failed to retrieve job_id from the response.")
+                    return False
+                if self.render_store:
+                    self.render_store.record_submitted(key, "musetalk", job_id, server=self.base_url)
+
+                # Step 2: Wait for the job through the shared poller
+                try:
+                    self.track_job(job_id, expected_duration=self.estimate_render_seconds(text), timeout=timeout).result()
+                except JobFailedError as e:
+                    if self.render_store:
+                        self.render_store.record_failed(key, e)
+                    raise
+
+            # Step 3: Download the video
+            downloaded = self.download_video(job_id, video_path)
+            if downloaded and self.render_store:
+                self.render_store.record_completed(key, output_path=video_path)
+            return downloaded
+
+        except (JobFailedError, JobTimeoutError) as e:
+            print(f"Video creation failed: {str(e)}")
+            return False
         except requests.exceptions.RequestException as e:
             print(f"Request failed: {str(e)}")
             return False
@@ -99,21 +202,12 @@ class MuseTalk:
             bool: True if the video was successfully downloaded, False otherwise.
         """
         try:
-            # Ensure the directory for save_path exists
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-
             url = f'{self.base_url}/download-video/{job_id}'
-            response = requests.get(url, proxies=self.proxies, stream=True)
-            response.raise_for_status()  # Raise an error for bad status codes
+            # Resumable, verified download that is only renamed into place when complete
+            result = download_file(url, save_path, session=self.session)
 
-            # Save the file from the response
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:  # Filter out keep-alive chunks
-                        f.write(chunk)
-
-            print(f"Video successfully downloaded to {save_path}")
+            print(f"Video successfully downloaded to {save_path} ({result.size} bytes, sha256 {result.sha256})")
             return True
-        except requests.exceptions.RequestException as e:
+        except (DownloadError, requests.exceptions.RequestException) as e:
             print(f"Failed to download video: {str(e)}")
             return False
\ No newline at end of file
@@ -0,0 +1,289 @@
+import json
+import os
+import random
+import re
+import requests
+
+DEFAULT_LISTING_PATH = "data/speaker.json"
+DEFAULT_CURATED_PATH = "data/HeyGenAvaters.json"
+DEFAULT_CATALOG_PATH = os.getenv("AVATAR_CATALOG_PATH", "cache/avatar_catalog.json")
+CATALOG_VERSION = 2
+
+# Words in HeyGen avatar names that are useful as selection tags
+NAME_TAGS = {
+    "front", "side", "sitting", "standing", "office", "sofa", "business",
+    "casual", "outdoor", "lounge", "expressive", "yoga", "training",
+}
+# Framings that crop well to a 9:16 portrait video
+VERTICAL_TAGS = {"front", "upper_body", "expressive"}
+
+
+def derive_tags(name, provider_tags=None):
+    """
+    Build the tag set of an avatar from the provider tags and keywords in its name.
+    Adds "vertical" for framings that suit portrait video.
+    """
+    tags = {str(tag).lower() for tag in (provider_tags or [])}
+    lowered = (name or "").lower()
+    if "upper body" in lowered:
+        tags.add("upper_body")
+    tags.update(word for word in re.findall(r"[a-z]+", lowered) if word in NAME_TAGS)
+    if tags & VERTICAL_TAGS:
+        tags.add("vertical")
+    return frozenset(tags)
+
+
+def _file_state(path):
+    """(mtime, size) of a source file, used to detect changes cheaply"""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return (stat.st_mtime, stat.st_size)
+
+
+class AvatarCatalog:
+    """
+    Pre-indexed store of HeyGen avatars.
+
+    Built from the provider's avatar listing (data/speaker.json or the live
+    v2/avatars endpoint) merged with the hand-maintained voice assignments in
+    data/HeyGenAvaters.json. Avatars are indexed by gender, premium flag,
+    tag and voice availability, and the candidate list of every distinct
+    filter is computed once, so repeated selections are O(1). The catalog is
+    persisted as JSON and rebuilt incrementally when a source changes.
+    """
+    def __init__(self):
+        self.avatars = {}
+        self.source_state = {}
+        self._by_gender = {}
+        self._by_premium = {True: set(), False: set()}
+        self._by_tag = {}
+        self._with_voice = set()
+        self._selection_cache = {}
+
+    def __len__(self):
+        return len(self.avatars)
+
+    def _index(self, record):
+        avatar_id = record["avatar_id"]
+        self._by_gender.setdefault(record["gender"], set()).add(avatar_id)
+        self._by_premium[record["premium"]].add(avatar_id)
+        for tag in record["tags"]:
+            self._by_tag.setdefault(tag, set()).add(avatar_id)
+        if record["voice_id"]:
+            self._with_voice.add(avatar_id)
+
+    def _unindex(self, record):
+        avatar_id = record["avatar_id"]
+        self._by_gender.get(record["gender"], set()).discard(avatar_id)
+        self._by_premium[record["premium"]].discard(avatar_id)
+        for tag in record["tags"]:
+            self._by_tag.get(tag, set()).discard(avatar_id)
+        self._with_voice.discard(avatar_id)
+
+    def upsert(self, avatar_id, name=None, gender=None, premium=None, tags=None, voice_id=None, curated_name=None):
+        """
+        Add an avatar or update the given fields of an existing one.
+
+        Returns:
+            bool: True if the stored record changed.
+        """
+        old = self.avatars.get(avatar_id)
+        record = dict(old) if old else {
+            "avatar_id": avatar_id, "name": avatar_id, "curated_name": None,
+            "gender": "unknown", "premium": False, "tags": frozenset(), "voice_id": None,
+        }
+        if name is not None:
+            record["name"] = name
+        if curated_name is not None:
+            record["curated_name"] = curated_name
+        if gender:
+            record["gender"] = gender.lower()
+        if premium is not None:
+            record["premium"] = bool(premium)
+        if voice_id:
+            record["voice_id"] = voice_id
+        record["tags"] = derive_tags(record["name"], tags) if tags is not None or name is not None else record["tags"]
+
+        if record == old:
+            return False
+        if old:
+            self._unindex(old)
+        self.avatars[avatar_id] = record
+        self._index(record)
+        self._selection_cache.clear()
+        return True
+
+    def remove(self, avatar_id):
+        record = self.avatars.pop(avatar_id, None)
+        if record:
+            self._unindex(record)
+            self._selection_cache.clear()
+
+    def merge_listing(self, listing):
+        """
+        Merge a HeyGen avatar listing (the v2/avatars response or its `data`).
+        Avatars missing from the listing are dropped unless they come from
+        the curated list.
+
+        Returns:
+            int: Number of avatars added, changed or removed.
+        """
+        data = listing.get("data", listing)
+        seen = set()
+        changed = 0
+        for avatar in data.get("avatars", []):
+            avatar_id = avatar["avatar_id"]
+            seen.add(avatar_id)
+            changed += self.upsert(
+                avatar_id,
+                name=avatar.get("avatar_name") or avatar_id,
+                gender=avatar.get("gender"),
+                premium=avatar.get("premium"),
+                tags=avatar.get("tags") or [],
+                voice_id=avatar.get("default_voice_id"),
+            )
+        for avatar_id in list(self.avatars):
+            record = self.avatars[avatar_id]
+            if avatar_id not in seen and not record["curated_name"]:
+                self.remove(avatar_id)
+                changed += 1
+        return changed
+
+    def merge_curated(self, curated):
+        """
+        Merge the hand-maintained {name: {gender, avater_id, voide_id}} mapping.
+
+        Returns:
+            int: Number of avatars added or changed.
+        """
+        changed = 0
+        for curated_name, entry in curated.items():
+            avatar_id = entry["avater_id"]
+            known = avatar_id in self.avatars
+            changed += self.upsert(
+                avatar_id,
+                name=None if known else curated_name,
+                curated_name=curated_name,
+                gender=entry.get("gender"),
+                voice_id=entry.get("voide_id"),
+            )
+        return changed
+
+    def select(self, gender=None, premium=None, tags=(), requires_voice=True, rng=random):
+        """
+        Pick a random avatar matching every given filter.
+
+        Args:
+            gender (str): "female" or "male"; any when None.
+            premium (bool): Restrict to (non-)premium avatars; any when None.
+            tags (iterable): Tags that must all be present, e.g. ("vertical",).
+            requires_voice (bool): Only avatars with a known voice_id.
+            rng: Random source with a `choice` method.
+
+        Returns:
+            dict: The avatar record, or None if nothing matches.
+        """
+        candidates = self.candidates(gender, premium, tags, requires_voice)
+        return self.avatars[rng.choice(candidates)] if candidates else None
+
+    def candidates(self, gender=None, premium=None, tags=(), requires_voice=True):
+        """Sorted tuple of avatar IDs matching the filters, memoized per filter"""
+        key = (gender.lower() if gender else None, premium, frozenset(tags), requires_voice)
+        cached = self._selection_cache.get(key)
+        if cached is not None:
+            return cached
+
+        sets = []
+        if key[0]:
+            sets.append(self._by_gender.get(key[0], set()))
+        if premium is not None:
+            sets.append(self._by_premium[bool(premium)])
+        for tag in key[2]:
+            sets.append(self._by_tag.get(tag, set()))
+        if requires_voice:
+            sets.append(self._with_voice)
+        matched = set.intersection(*sets) if sets else set(self.avatars)
+        result = tuple(sorted(matched))
+        self._selection_cache[key] = result
+        return result
+
+    def save(self, path=DEFAULT_CATALOG_PATH):
+        """Persist the catalog as JSON, replacing the file atomically"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "version": CATALOG_VERSION,
+                "avatars": [dict(record, tags=sorted(record["tags"])) for record in self.avatars.values()],
+                "source_state": self.source_state,
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def _from_json(cls, path):
+        with open(path, "r") as f:
+            stored = json.load(f)
+        if stored.get("version") != CATALOG_VERSION:
+            return None
+        catalog = cls()
+        # JSON turns the (mtime, size) tuples into lists
+        catalog.source_state = {source: tuple(state) for source, state in stored["source_state"].items()}
+        for record in stored["avatars"]:
+            record["tags"] = frozenset(record["tags"])
+            catalog.avatars[record["avatar_id"]] = record
+            catalog._index(record)
+        return catalog
+
+    def refresh_sources(self, listing_path=DEFAULT_LISTING_PATH, curated_path=DEFAULT_CURATED_PATH):
+        """
+        Re-read only the source files that changed since the last build.
+
+        Returns:
+            int: Number of avatars added, changed or removed.
+        """
+        changed = 0
+        listing_state = _file_state(listing_path)
+        if listing_state and listing_state != self.source_state.get("listing"):
+            with open(listing_path, "r") as file:
+                changed += self.merge_listing(json.load(file))
+            self.source_state["listing"] = listing_state
+
+        curated_state = _file_state(curated_path)
+        if curated_state and curated_state != self.source_state.get("curated"):
+            with open(curated_path, "r") as file:
+                changed += self.merge_curated(json.load(file))
+            self.source_state["curated"] = curated_state
+        return changed
+
+    def refresh_from_api(self, api_key=None, timeout=30):
+        """
+        Merge the live avatar listing from HeyGen's v2/avatars endpoint.
+
+        Returns:
+            int: Number of avatars added, changed or removed.
+        """
+        api_key = api_key or os.getenv("HEY_GEN_KEY")
+        response = requests.get("https://api.heygen.com/v2/avatars", headers={"X-Api-Key": api_key}, timeout=timeout)
+        response.raise_for_status()
+        return self.merge_listing(response.json())
+
+    @classmethod
+    def load(cls, path=DEFAULT_CATALOG_PATH, listing_path=DEFAULT_LISTING_PATH, curated_path=DEFAULT_CURATED_PATH):
+        """
+        Load the persisted catalog, refreshing it from any changed source file.
+        The JSON sources are only parsed when they changed since the last save.
+        """
+        catalog = None
+        if os.path.exists(path):
+            try:
+                catalog = cls._from_json(path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Ignoring unreadable avatar catalog {path}: {str(e)}")
+        if catalog is None:
+            catalog = cls()
+        if catalog.refresh_sources(listing_path, curated_path) or not os.path.exists(path):
+            catalog.save(path)
+        return catalog
@@ -0,0 +1,321 @@
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+PARALLEL_THRESHOLD = 64 * 1024 * 1024
+DEFAULT_PARTS = 4
+DEFAULT_RETRIES = 3
+
+DownloadResult = namedtuple("DownloadResult", ["path", "size", "sha256"])
+
+
+class DownloadError(Exception):
+    """Raised when a download cannot be completed or fails verification"""
+
+
+def _server_checksum(headers, full_response):
+    """
+    Whole-file checksum reported by the server, if any.
+
+    Returns:
+        tuple: (hashlib algorithm name, hex digest), or None.
+    """
+    for item in headers.get("x-goog-hash", "").split(","):
+        name, _, value = item.strip().partition("=")
+        if name == "md5" and value:
+            return "md5", base64.b64decode(value).hex()
+    if headers.get("x-amz-checksum-sha256"):
+        return "sha256", base64.b64decode(headers["x-amz-checksum-sha256"]).hex()
+    # On a 206 response Content-MD5 would describe the range, not the file
+    if full_response and headers.get("Content-MD5"):
+        return "md5", base64.b64decode(headers["Content-MD5"]).hex()
+    return None
+
+
+def _probe(session, url, timeout):
+    """
+    Find the total size, Range support, validator and checksum with a
+    one-byte ranged GET. A GET is used instead of HEAD because presigned
+    download URLs are usually only signed for GET.
+
+    Returns:
+        tuple: (total size or None, whether byte ranges are supported, ETag or
+        Last-Modified, server checksum or None)
+    """
+    with session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=timeout) as response:
+        validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+        if response.status_code == 206:
+            match = re.match(r"bytes \d+-\d+/(\d+)", response.headers.get("Content-Range", ""))
+            total = int(match.group(1)) if match else None
+            return total, True, validator, _server_checksum(response.headers, False)
+        response.raise_for_status()
+        length = response.headers.get("Content-Length")
+        return (int(length) if length else None), False, validator, _server_checksum(response.headers, True)
+
+
+def _hash_file(path, chunk_size=DEFAULT_CHUNK_SIZE, algorithm="sha256", length=None):
+    """Hash the first `length` bytes of a file (all of it when None)"""
+    hasher = hashlib.new(algorithm)
+    remaining = length
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            block = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return hasher
+
+
+class _Progress:
+    """
+    Sidecar file recording which bytes of a .part file are really written.
+
+    Each range is [start, end, position]: bytes start..position-1 are on
+    disk, end is inclusive (None while the total size is unknown). A .part
+    file is only resumed through its sidecar, so a preallocated file is
+    never mistaken for downloaded data. Positions are saved after the data
+    is flushed, so they can lag behind the file but never run ahead of it.
+    """
+    SAVE_EVERY = 16
+
+    def __init__(self, path, total, validator, ranges):
+        self.path = path
+        self.total = total
+        self.validator = validator
+        self.ranges = ranges
+        self._lock = threading.Lock()
+        self._unsaved = 0
+
+    @classmethod
+    def load(cls, path, total, validator):
+        """The recorded progress, or None if there is none for this exact file"""
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("total") != total or data.get("validator") != validator or not data.get("ranges"):
+            return None
+        return cls(path, total, validator, data["ranges"])
+
+    def save(self):
+        with self._lock:
+            self._unsaved = 0
+            data = {"total": self.total, "validator": self.validator,
+                    "ranges": [list(entry) for entry in self.ranges]}
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def advance(self, index, position, f):
+        """Record that range `index` is written up to `position`, saving every few chunks"""
+        # Flush first so no saved position runs ahead of the data in the file
+        f.flush()
+        with self._lock:
+            self.ranges[index][2] = position
+            self._unsaved += 1
+            due = self._unsaved >= self.SAVE_EVERY
+        if due:
+            self.save()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _download_sequential(session, url, part_path, progress, total, ranges, chunk_size, retries, timeout):
+    """
+    Stream into `part_path`, resuming from the recorded position when the
+    server supports ranges. The hash is computed while streaming.
+    """
+    offset = progress.ranges[0][2] if ranges else 0
+    if offset:
+        # Drop anything written after the last recorded position
+        with open(part_path, "r+b") as f:
+            f.truncate(offset)
+        hasher = _hash_file(part_path, chunk_size)
+    else:
+        hasher = hashlib.sha256()
+
+    for attempt in range(retries + 1):
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if offset and response.status_code == 200:
+                    # Server ignored the range; start over
+                    offset = 0
+                    hasher = hashlib.sha256()
+                elif response.status_code == 416 and total is not None and offset == total:
+                    return hasher.hexdigest()
+                response.raise_for_status()
+
+                mode = "ab" if offset else "wb"
+                with open(part_path, mode, buffering=chunk_size) as f:
+                    try:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            if chunk:
+                                f.write(chunk)
+                                hasher.update(chunk)
+                                offset += len(chunk)
+                                progress.advance(0, offset, f)
+                    finally:
+                        f.flush()
+                        progress.save()
+            if total is None or offset >= total:
+                return hasher.hexdigest()
+            raise DownloadError(f"Connection closed after {offset} of {total} bytes")
+        except (requests.exceptions.RequestException, DownloadError) as e:
+            if attempt == retries or not ranges:
+                raise DownloadError(f"Download failed after {attempt + 1} attempts: {str(e)}") from e
+            print(f"Download interrupted at {offset} bytes ({str(e)}), resuming...")
+            time.sleep(2 ** attempt)
+    raise DownloadError("Download failed")
+
+
+def _download_parallel(session, url, part_path, progress, chunk_size, retries, timeout):
+    """
+    Download the unfinished byte ranges of `progress` concurrently into a
+    preallocated file, then hash the result in one sequential pass.
+    """
+    log_lock = threading.Lock()
+
+    def fetch_range(index):
+        start, end, position = progress.ranges[index]
+        for attempt in range(retries + 1):
+            try:
+                headers = {"Range": f"bytes={position}-{end}"}
+                with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                    if response.status_code != 206:
+                        raise DownloadError(f"Expected 206 for range {position}-{end}, got {response.status_code}")
+                    with open(part_path, "r+b", buffering=chunk_size) as f:
+                        f.seek(position)
+                        try:
+                            for chunk in response.iter_content(chunk_size=chunk_size):
+                                if chunk:
+                                    f.write(chunk[:end + 1 - position])
+                                    position = min(position + len(chunk), end + 1)
+                                    progress.advance(index, position, f)
+                        finally:
+                            f.flush()
+                            progress.save()
+                if position > end:
+                    return
+                raise DownloadError(f"Range {start}-{end} stopped at {position}")
+            except (requests.exceptions.RequestException, DownloadError) as e:
+                if attempt == retries:
+                    raise DownloadError(f"Range {start}-{end} failed: {str(e)}") from e
+                with log_lock:
+                    print(f"Range {start}-{end} interrupted at {position} ({str(e)}), retrying...")
+                time.sleep(2 ** attempt)
+
+    pending = [index for index, (_, end, position) in enumerate(progress.ranges) if position <= end]
+    with ThreadPoolExecutor(max_workers=max(1, len(pending)), thread_name_prefix="download-range") as executor:
+        for future in [executor.submit(fetch_range, index) for index in pending]:
+            future.result()
+
+    return _hash_file(part_path, chunk_size).hexdigest()
+
+
+def download_file(url, output_path, session=None, expected_sha256=None, parts=DEFAULT_PARTS,
+                  parallel_threshold=PARALLEL_THRESHOLD, chunk_size=DEFAULT_CHUNK_SIZE,
+                  retries=DEFAULT_RETRIES, timeout=60, proxies=None):
+    """
+    Download a file safely: resume, optional parallel ranges, hash, atomic rename.
+
+    Data is written to `output_path + ".part"`, with a `.part.progress`
+    sidecar recording which byte ranges are really on disk. A leftover
+    partial file from an earlier run is resumed from that record with HTTP
+    Range requests; one without a record (or whose ETag changed) is
+    downloaded again. Files larger than
+    `parallel_threshold` are fetched as `parts` concurrent ranges when the
+    server supports it. The final file only appears at `output_path` once
+    its size, `expected_sha256` (if given) and any checksum the server
+    reports have been verified, so an interrupted download never looks like
+    a finished video.
+
+    Args:
+        url (str): URL to download.
+        output_path (str): Final destination of the file.
+        session (requests.Session): Session to reuse; a new one is created if omitted.
+        expected_sha256 (str): Optional checksum the file must match.
+        parts (int): Number of concurrent ranges for large files (1 disables).
+        parallel_threshold (int): Minimum size in bytes for a parallel download.
+        chunk_size (int): Read and write buffer size in bytes.
+        retries (int): Reconnect attempts after an interrupted transfer.
+        timeout (int): Seconds to wait on connect/read.
+        proxies (dict): Proxy settings for requests.
+
+    Returns:
+        DownloadResult: path, size in bytes and sha256 hex digest.
+    """
+    session = session or requests.Session()
+    if proxies is not None:
+        session.proxies.update(proxies)
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    part_path = output_path + ".part"
+
+    try:
+        total, ranges, validator, checksum = _probe(session, url, timeout)
+    except requests.exceptions.RequestException as e:
+        raise DownloadError(f"Error downloading {url}: {str(e)}") from e
+
+    progress_path = part_path + ".progress"
+    progress = _Progress.load(progress_path, total, validator) if ranges and os.path.exists(part_path) else None
+    if progress is None or (progress.total is not None and os.path.getsize(part_path) != progress.total
+                            and len(progress.ranges) > 1):
+        # No trustworthy record of what the .part file holds; start from scratch
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        if ranges and total and total >= parallel_threshold and parts > 1:
+            part_size = -(-total // parts)
+            progress = _Progress(progress_path, total, validator,
+                                 [[start, min(start + part_size, total) - 1, start]
+                                  for start in range(0, total, part_size)])
+            with open(part_path, "wb") as f:
+                f.truncate(total)
+        else:
+            progress = _Progress(progress_path, total, validator,
+                                 [[0, total - 1 if total is not None else None, 0]])
+        progress.save()
+    else:
+        print(f"Resuming download of {output_path} from {progress_path}")
+
+    if len(progress.ranges) > 1:
+        digest = _download_parallel(session, url, part_path, progress, chunk_size, retries, timeout)
+    else:
+        digest = _download_sequential(session, url, part_path, progress, total, ranges, chunk_size, retries, timeout)
+
+    size = os.path.getsize(part_path)
+    if total is not None and size != total:
+        raise DownloadError(f"Size mismatch for {url}: got {size} bytes, expected {total}")
+    mismatch = None
+    if expected_sha256 and digest != expected_sha256.lower():
+        mismatch = f"got sha256 {digest}, expected {expected_sha256}"
+    elif checksum is not None:
+        algorithm, expected = checksum
+        actual = digest if algorithm == "sha256" else _hash_file(part_path, chunk_size, algorithm).hexdigest()
+        if actual != expected:
+            mismatch = f"got {algorithm} {actual}, server reported {expected}"
+    if mismatch:
+        os.remove(part_path)
+        progress.remove()
+        raise DownloadError(f"Checksum mismatch for {url}: {mismatch}")
+
+    with open(part_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(part_path, output_path)
+    progress.remove()
+    return DownloadResult(output_path, size, digest)
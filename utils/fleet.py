@@ -0,0 +1,311 @@
+import json
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from utils.job_store import JobStore, DEFAULT_STORE_PATH, WORKER_ID, QUEUED
+
+DEFAULT_FLEET_STORE = os.getenv("FLEET_STORE", f"sqlite:///{DEFAULT_STORE_PATH}")
+HEARTBEAT_INTERVAL = 30
+# A worker that missed this many heartbeats is considered dead
+MISSED_HEARTBEATS = 3
+# Leases are renewed on every heartbeat, so they can be short
+FLEET_LEASE_SECONDS = 5 * 60
+
+# Capabilities a host can advertise
+SCRIPT = "script"
+HEYGEN = "heygen"
+MUSETALK = "musetalk"
+UPLOAD = "upload"
+CAPABILITIES = (SCRIPT, HEYGEN, MUSETALK, UPLOAD)
+
+# A kind of work: jobs in `state` (pinned to `backend`, if given) go to
+# workers advertising `capability`, which run `handler(job)` on them
+Route = namedtuple("Route", ["state", "capability", "handler", "backend"])
+Route.__new__.__defaults__ = (None,)
+
+
+class SharedStore:
+    """
+    Interface of the store a worker fleet shares.
+
+    On top of the JobStore job methods (claim, advance, renew, release,
+    fail, take_over, get, count, stats) a fleet store keeps a registry of
+    live workers. Implementations for a networked database register a
+    scheme with `register_store_backend`; SQLiteSharedStore is the local
+    stand-in, usable by several processes on one host or on a shared disk.
+    """
+    def register_worker(self, worker_id, capabilities, host=None):
+        raise NotImplementedError
+
+    def heartbeat(self, worker_id, job_ids=()):
+        """Mark the worker alive and renew the leases of the jobs it is running"""
+        raise NotImplementedError
+
+    def deregister_worker(self, worker_id):
+        raise NotImplementedError
+
+    def workers(self, alive_only=True):
+        raise NotImplementedError
+
+    def reclaim_expired(self):
+        """Release the jobs of dead workers and expired leases; returns the number released"""
+        raise NotImplementedError
+
+
+class SQLiteSharedStore(JobStore, SharedStore):
+    """SQLite stand-in for the shared fleet store"""
+    def __init__(self, path=DEFAULT_STORE_PATH, lease_seconds=FLEET_LEASE_SECONDS,
+                 heartbeat_interval=HEARTBEAT_INTERVAL, **kwargs):
+        super().__init__(path, lease_seconds=lease_seconds, **kwargs)
+        self.heartbeat_interval = heartbeat_interval
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                host TEXT NOT NULL,
+                capabilities TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                last_heartbeat REAL NOT NULL,
+                active_jobs TEXT NOT NULL DEFAULT '[]'
+            )
+            """
+        )
+
+    def _dead_before(self):
+        return time.time() - MISSED_HEARTBEATS * self.heartbeat_interval
+
+    def register_worker(self, worker_id, capabilities, host=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO workers (worker_id, host, capabilities, started_at, last_heartbeat)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (worker_id, host or socket.gethostname(), json.dumps(sorted(capabilities)), now, now),
+            )
+
+    def heartbeat(self, worker_id, job_ids=()):
+        job_ids = list(job_ids)
+
+        def update():
+            now = time.time()
+            self._conn.execute(
+                "UPDATE workers SET last_heartbeat = ?, active_jobs = ? WHERE worker_id = ?",
+                (now, json.dumps(job_ids), worker_id),
+            )
+            if job_ids:
+                self._conn.execute(
+                    f"UPDATE jobs SET lease_expires = ? WHERE lease_owner = ? "
+                    f"AND id IN ({','.join('?' * len(job_ids))})",
+                    [now + self.lease_seconds, worker_id] + job_ids,
+                )
+        self._transaction(update)
+
+    def deregister_worker(self, worker_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def workers(self, alive_only=True):
+        query = "SELECT * FROM workers"
+        params = []
+        if alive_only:
+            query += " WHERE last_heartbeat >= ?"
+            params.append(self._dead_before())
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        workers = []
+        for row in rows:
+            worker = dict(row)
+            worker["capabilities"] = json.loads(worker["capabilities"])
+            worker["active_jobs"] = json.loads(worker["active_jobs"])
+            workers.append(worker)
+        return workers
+
+    def reclaim_expired(self):
+        def update():
+            now = time.time()
+            dead = [row["worker_id"] for row in self._conn.execute(
+                "SELECT worker_id FROM workers WHERE last_heartbeat < ?", (self._dead_before(),)
+            )]
+            owned_by_dead = f"lease_owner IN ({','.join('?' * len(dead))})"
+            # A job whose host died did not fail its stage, so the claim is given back;
+            # a lease that expired under a live worker still counts as an attempt
+            released = self._conn.execute(
+                f"""
+                UPDATE jobs SET lease_owner = NULL, lease_expires = NULL, updated_at = ?,
+                    attempts = CASE WHEN {owned_by_dead} THEN MAX(attempts - 1, 0) ELSE attempts END
+                WHERE lease_owner IS NOT NULL AND (lease_expires < ? OR {owned_by_dead})
+                """,
+                [now] + dead + [now] + dead,
+            ).rowcount
+            if dead:
+                self._conn.execute(
+                    f"DELETE FROM workers WHERE worker_id IN ({','.join('?' * len(dead))})", dead
+                )
+            return released
+
+        released = self._transaction(update)
+        if released:
+            print(f"Reclaimed {released} job(s) from expired leases or dead workers")
+        return released
+
+
+_store_backends = {"sqlite": SQLiteSharedStore}
+
+
+def register_store_backend(scheme, factory):
+    """Make `factory(location)` the SharedStore for FLEET_STORE URLs starting with `scheme://`"""
+    _store_backends[scheme] = factory
+
+
+def open_shared_store(url=DEFAULT_FLEET_STORE):
+    """
+    Open the shared store named by `url`, e.g. "sqlite:///cache/job_store.sqlite".
+    Topic files are imported when they changed.
+    """
+    scheme, _, location = url.partition("://")
+    if scheme not in _store_backends:
+        raise ValueError(f"No fleet store backend for '{scheme}://' (known: {sorted(_store_backends)})")
+    # sqlite:///relative/path and sqlite:////absolute/path
+    store = _store_backends[scheme](location[1:] if location.startswith("/") else location)
+    store.import_sources()
+    return store
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_store():
+    """Return the process-wide shared store configured by FLEET_STORE"""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = open_shared_store()
+        return _shared_store
+
+
+class FleetWorker:
+    """
+    Pulls jobs from the shared store for the capabilities this host advertises.
+
+    Every route whose capability the worker has is polled for claimable
+    jobs, up to `concurrency[capability]` at a time. A heartbeat thread
+    keeps the worker registered and renews the leases of its running jobs,
+    and every poll releases the jobs of workers that stopped heartbeating,
+    so their work is picked up elsewhere. Retries are counted per stage:
+    the store resets a job's attempts when a handler advances it, and a
+    job reclaimed from a dead worker does not use one up.
+    """
+    def __init__(self, store, capabilities, routes, concurrency=None, worker_id=WORKER_ID,
+                 heartbeat_interval=HEARTBEAT_INTERVAL, poll_interval=10):
+        """
+        Args:
+            store (SharedStore): Store shared by the fleet.
+            capabilities (iterable): What this host can do, from CAPABILITIES.
+            routes (list): Route tuples describing every kind of work.
+            concurrency (dict): Jobs run at once per capability (default 1).
+            worker_id (str): Lease owner name; must match the owner the handlers advance jobs with.
+            heartbeat_interval (float): Seconds between heartbeats.
+            poll_interval (float): Seconds to wait when no job is claimable.
+        """
+        unknown = set(capabilities) - set(CAPABILITIES)
+        if unknown:
+            raise ValueError(f"Unknown capabilities: {sorted(unknown)}")
+        self.store = store
+        self.capabilities = set(capabilities)
+        self.routes = [route for route in routes if route.capability in self.capabilities]
+        self.concurrency = {capability: (concurrency or {}).get(capability, 1) for capability in self.capabilities}
+        self.worker_id = worker_id
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self._running = {}
+        self._running_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, sum(self.concurrency.values())),
+                                            thread_name_prefix="fleet-job")
+
+    def _busy(self, capability):
+        with self._running_lock:
+            return sum(1 for running in self._running.values() if running == capability)
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._running_lock:
+                job_ids = list(self._running)
+            try:
+                self.store.heartbeat(self.worker_id, job_ids)
+            except Exception as e:
+                print(f"Heartbeat failed: {str(e)}")
+
+    def _run_job(self, route, job):
+        try:
+            route.handler(job)
+        except Exception as e:
+            print(f"Job {job['id']} ({job['topic']}) failed in state '{route.state}': {str(e)}")
+            try:
+                self.store.fail(job["id"], e, owner=self.worker_id)
+            except Exception as fail_error:
+                print(f"Could not record failure of job {job['id']}: {str(fail_error)}")
+        finally:
+            with self._running_lock:
+                self._running.pop(job["id"], None)
+
+    def poll_once(self):
+        """
+        Claim and start as many jobs as free slots allow.
+
+        Returns:
+            int: Number of jobs started.
+        """
+        self.store.reclaim_expired()
+        started = 0
+        for route in self.routes:
+            while self._busy(route.capability) < self.concurrency[route.capability]:
+                backends = (route.backend,) if route.backend else None
+                job = None
+                if route.state == QUEUED:
+                    # Topics with a buffered script are rendered before new ones are researched
+                    job = self.store.claim(self.worker_id, state=route.state, backends=backends, ready=True)
+                job = job or self.store.claim(self.worker_id, state=route.state, backends=backends)
+                if job is None:
+                    break
+                print(f"Worker {self.worker_id} took job {job['id']} ({job['topic']}) in state '{route.state}'")
+                with self._running_lock:
+                    self._running[job["id"]] = route.capability
+                self._executor.submit(self._run_job, route, job)
+                started += 1
+        return started
+
+    def run(self):
+        """Serve jobs until stop() is called or the process is interrupted"""
+        self.store.register_worker(self.worker_id, self.capabilities)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="fleet-heartbeat", daemon=True)
+        heartbeat.start()
+        print(f"Worker {self.worker_id} serving {sorted(self.capabilities)}")
+        try:
+            while not self._stop.is_set():
+                try:
+                    if not self.poll_once():
+                        self._stop.wait(self.poll_interval)
+                except Exception as e:
+                    print(f"Fleet worker error: {str(e)}")
+                    self._stop.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            print("Stopping worker; waiting for running jobs...")
+        finally:
+            self._stop.set()
+            self._executor.shutdown(wait=True)
+            self.store.deregister_worker(self.worker_id)
+
+    def stop(self):
+        self._stop.set()
+
+
+def parse_capabilities(value):
+    """Split a comma separated --capabilities argument"""
+    return [capability.strip() for capability in value.split(",") if capability.strip()]
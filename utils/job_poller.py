@@ -0,0 +1,258 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+MAX_UNCLAIMED_RESULTS = 1000
+
+PENDING = "pending"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class JobFailedError(Exception):
+    """Raised through a job's future when the provider reports a failed render"""
+
+
+class JobTimeoutError(Exception):
+    """Raised through a job's future when its deadline passes before completion"""
+
+
+class _PolledJob:
+    def __init__(self, job_id, check, future, deadline, expected_duration, min_interval):
+        self.job_id = job_id
+        self.check = check
+        self.future = future
+        self.deadline = deadline
+        self.expected_duration = expected_duration
+        self.min_interval = min_interval
+        self.attempt = 0
+        self.in_flight = False
+
+
+class JobPoller:
+    """
+    Polls many in-flight render jobs from a single scheduler thread.
+
+    Each job supplies a `check()` callable returning `(state, payload)` where
+    state is PENDING, COMPLETED or FAILED. The first check is delayed by
+    roughly half the job's expected duration; after that the interval starts
+    at `min_interval` and grows exponentially (with jitter) up to
+    `max_interval`, so long renders are not hammered and short ones are
+    picked up quickly. Status checks run on a small worker pool so a slow
+    endpoint does not delay other jobs. Results are delivered through a
+    Future and an optional callback.
+    """
+    def __init__(self, min_interval=2, max_interval=60, backoff=1.6, jitter=0.2, max_workers=8):
+        """
+        Args:
+            min_interval (float): Shortest delay between two checks of a job.
+            max_interval (float): Longest delay between two checks of a job.
+            backoff (float): Growth factor of the delay after each pending check.
+            jitter (float): Relative random spread applied to every delay.
+            max_workers (int): Status checks allowed to run at the same time.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self._jobs = {}
+        self._unclaimed = OrderedDict()
+        self._poked = OrderedDict()
+        self._schedule = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-poller-check")
+        self._thread = None
+        self._stopped = False
+
+    def _delay(self, job):
+        """Seconds until the next check of `job`"""
+        if job.attempt == 0:
+            delay = job.expected_duration * 0.5
+        else:
+            delay = job.min_interval * (self.backoff ** (job.attempt - 1))
+        delay = min(self.max_interval, max(job.min_interval, delay))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _schedule_job(self, job, delay):
+        heapq.heappush(self._schedule, (time.monotonic() + delay, next(self._counter), job.job_id))
+        self._condition.notify()
+
+    def submit(self, job_id, check, expected_duration=60, timeout=None, callback=None, min_interval=None):
+        """
+        Start tracking a job.
+
+        Args:
+            job_id (str): Provider job/video ID.
+            check (callable): Returns (state, payload) for the job.
+            expected_duration (float): Estimated seconds until completion.
+            timeout (float): Seconds before the job fails with JobTimeoutError.
+            callback (callable): Called with the finished Future.
+            min_interval (float): Per-job override of the shortest poll delay.
+
+        Returns:
+            Future: Resolves to the COMPLETED payload.
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        deadline = time.monotonic() + timeout if timeout else None
+        job = _PolledJob(job_id, check, future, deadline, expected_duration,
+                         min_interval or self.min_interval)
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("JobPoller has been shut down.")
+            if job_id in self._jobs:
+                return self._jobs[job_id].future
+            if job_id in self._unclaimed:
+                # A webhook beat the submit call; settle the job right away
+                result, error = self._unclaimed.pop(job_id)
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+                return future
+            self._jobs[job_id] = job
+            # A callback that beat the submit call asks for an immediate check
+            self._schedule_job(job, 0 if self._poked.pop(job_id, False) else self._delay(job))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="job-poller", daemon=True)
+                self._thread.start()
+        return future
+
+    def resolve(self, job_id, payload):
+        """
+        Complete a job immediately, e.g. from a webhook.
+        Results for jobs not yet submitted are held until they are. Returns
+        True if a tracked job was completed.
+        """
+        return self._finish(job_id, result=payload, hold=True)
+
+    def poll_now(self, job_id):
+        """
+        Check a job right away instead of at its next scheduled poll, e.g.
+        when a webhook reports it finished. The provider's status endpoint
+        stays the source of truth. A job not submitted yet is checked as
+        soon as it is. Returns True if a tracked job was scheduled.
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                self._poked[job_id] = True
+                while len(self._poked) > MAX_UNCLAIMED_RESULTS:
+                    self._poked.popitem(last=False)
+                return False
+            if not job.in_flight:
+                self._schedule_job(job, 0)
+            return True
+
+    def reject(self, job_id, error):
+        """Fail a job immediately. Held like `resolve` when the job is unknown"""
+        error = error if isinstance(error, Exception) else JobFailedError(str(error))
+        return self._finish(job_id, error=error, hold=True)
+
+    def cancel(self, job_id):
+        """Stop tracking a job and cancel its future"""
+        with self._condition:
+            job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        return job.future.cancel()
+
+    def pending(self):
+        """Number of jobs still being tracked"""
+        with self._condition:
+            return len(self._jobs)
+
+    def _finish(self, job_id, result=None, error=None, hold=False):
+        with self._condition:
+            job = self._jobs.pop(job_id, None)
+            if job is None and hold:
+                self._unclaimed[job_id] = (result, error)
+                while len(self._unclaimed) > MAX_UNCLAIMED_RESULTS:
+                    self._unclaimed.popitem(last=False)
+        if job is None or job.future.done():
+            return False
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+        return True
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._schedule and self._schedule[0][0] <= time.monotonic():
+                        break
+                    timeout = self._schedule[0][0] - time.monotonic() if self._schedule else None
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+                _, _, job_id = heapq.heappop(self._schedule)
+                job = self._jobs.get(job_id)
+                if job is None or job.in_flight:
+                    continue
+                if job.deadline is not None and time.monotonic() >= job.deadline:
+                    expired = True
+                else:
+                    expired = False
+                    job.in_flight = True
+            if expired:
+                self._finish(job_id, error=JobTimeoutError(f"Job {job_id} did not finish before its deadline."))
+                continue
+            self._executor.submit(self._check, job)
+
+    def _check(self, job):
+        try:
+            state, payload = job.check()
+        except Exception as e:
+            # Treat errors talking to the status endpoint as transient; the
+            # deadline bounds how long we keep retrying.
+            print(f"Status check for job {job.job_id} failed: {str(e)}")
+            state, payload = PENDING, None
+
+        if state == COMPLETED:
+            self._finish(job.job_id, result=payload)
+            return
+        if state == FAILED:
+            self._finish(job.job_id, error=JobFailedError(f"Job {job.job_id} failed: {payload}"))
+            return
+
+        with self._condition:
+            job.in_flight = False
+            job.attempt += 1
+            if self._jobs.get(job.job_id) is not job:
+                return
+            delay = self._delay(job)
+            if job.deadline is not None:
+                delay = min(delay, max(0, job.deadline - time.monotonic()))
+            self._schedule_job(job, delay)
+
+    def shutdown(self):
+        """Stop the scheduler; jobs still tracked are cancelled"""
+        with self._condition:
+            self._stopped = True
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+            self._condition.notify_all()
+        for job in jobs:
+            job.future.cancel()
+        self._executor.shutdown(wait=False)
+
+
+_default_poller = None
+_default_poller_lock = threading.Lock()
+
+
+def get_default_poller():
+    """Return the process-wide JobPoller, creating it on first use"""
+    global _default_poller
+    with _default_poller_lock:
+        if _default_poller is None:
+            _default_poller = JobPoller()
+        return _default_poller
@@ -0,0 +1,443 @@
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+
+DEFAULT_STORE_PATH = os.getenv("JOB_STORE_PATH", "cache/job_store.sqlite")
+# Topic lists imported on startup; main.py and run_musetalk.py used to read one each
+DEFAULT_TOPIC_FILES = ("data/video_topics.json", "utils/video_topics.json")
+DEFAULT_LEASE_SECONDS = 2 * 3600
+MAX_ATTEMPTS = 3
+# Identifies this process as a lease holder
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+QUEUED = "queued"
+SCRIPTED = "scripted"
+RENDERED = "rendered"
+UPLOADED = "uploaded"
+FAILED = "failed"
+STATES = (QUEUED, SCRIPTED, RENDERED, UPLOADED, FAILED)
+
+RANDOM = "random"
+PRIORITY = "priority"
+# rand_key is drawn uniformly from [0, 2**62)
+RAND_KEY_RANGE = 2 ** 62
+
+
+class LeaseLostError(Exception):
+    """The job is leased to another worker"""
+
+
+class JobStore:
+    """
+    Transactional store of video topics and the jobs made from them.
+
+    Every topic is one row that moves through queued -> scripted ->
+    rendered -> uploaded (or failed). Workers claim a row in a given state
+    atomically and hold it under a lease until they advance it, release it
+    or the lease expires, so overlapping runs never pick the same topic.
+
+    Random selection is O(log n): each row carries a uniformly random
+    `rand_key`, and a claim takes the first claimable row at or after a
+    random point of the (state, rand_key) index. Priority selection uses a
+    (state, priority, created_at) index the same way.
+
+    A queued job may carry a `payload` holding a script written ahead of
+    time (see utils/script_buffer.py and main.py's speculative topics);
+    claiming with `ready=True` takes those, so they are used before new
+    topics are researched.
+
+    `attempts` counts the claims of a job in its current state; it starts
+    over when the job advances, so each stage gets its own retries.
+    """
+    def __init__(self, path=DEFAULT_STORE_PATH, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        """
+        Args:
+            path (str): SQLite file holding the store.
+            lease_seconds (int): Default lease length of a claim.
+            max_attempts (int): Claims allowed in one state before a retried job is marked failed.
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode so claims can take an explicit write lock with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL UNIQUE,
+                state TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                rand_key INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                job_dir TEXT,
+                backend TEXT,
+                payload TEXT,
+                error TEXT,
+                source TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "backend" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN backend TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_random ON jobs(state, rand_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_priority ON jobs(state, priority DESC, created_at)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(state, rand_key) WHERE payload IS NOT NULL"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """
+        )
+
+    def _transaction(self, func, *args):
+        """Run func(*args) under an exclusive write lock and commit"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(*args)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"]) if job["payload"] else None
+        return job
+
+    def add(self, topic, priority=0, source=None):
+        """
+        Queue a topic; topics already in the store are left untouched.
+
+        Returns:
+            bool: True if the topic was new.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT OR IGNORE INTO jobs (topic, state, priority, rand_key, source, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (topic, QUEUED, priority, random.randrange(RAND_KEY_RANGE), source, now, now),
+            )
+            return cursor.rowcount == 1
+
+    def import_json(self, path, priority=0):
+        """
+        Queue the topics of a {"topics": [...]} (or plain list) JSON file.
+
+        Returns:
+            int: Number of new topics.
+        """
+        with open(path, "r") as file:
+            data = json.load(file)
+        topics = data.get("topics", []) if isinstance(data, dict) else data
+        now = time.time()
+
+        def insert():
+            added = 0
+            for topic in topics:
+                added += self._conn.execute(
+                    """
+                    INSERT OR IGNORE INTO jobs (topic, state, priority, rand_key, source, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (topic, QUEUED, priority, random.randrange(RAND_KEY_RANGE), path, now, now),
+                ).rowcount
+            stat = os.stat(path)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (path, mtime, size) VALUES (?, ?, ?)",
+                (path, stat.st_mtime, stat.st_size),
+            )
+            return added
+
+        added = self._transaction(insert)
+        if added:
+            print(f"Imported {added} new topic(s) from {path}")
+        return added
+
+    def import_sources(self, paths=DEFAULT_TOPIC_FILES):
+        """
+        Import the topic files that changed since their last import.
+
+        Returns:
+            int: Number of new topics.
+        """
+        added = 0
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            stat = os.stat(path)
+            with self._lock:
+                known = self._conn.execute("SELECT mtime, size FROM sources WHERE path = ?", (path,)).fetchone()
+            if known and (known["mtime"], known["size"]) == (stat.st_mtime, stat.st_size):
+                continue
+            added += self.import_json(path)
+        return added
+
+    def claim(self, owner=WORKER_ID, state=QUEUED, order=RANDOM, lease_seconds=None, backends=None, ready=None):
+        """
+        Atomically lease one job in `state` that nobody else holds.
+
+        Args:
+            owner (str): Lease holder, e.g. WORKER_ID.
+            state (str): State to claim from.
+            order (str): RANDOM for a uniformly random job, PRIORITY for the
+                highest priority (then oldest) one.
+            lease_seconds (int): Lease length; the store default when None.
+            backends (iterable): Only jobs pinned to one of these render
+                backends, or not pinned at all.
+            ready (bool): True for only jobs carrying a payload, False for
+                only jobs without one, None for either.
+
+        Returns:
+            dict: The claimed job, or None if no job is available.
+        """
+        return self._transaction(self._claim, owner, state, order, lease_seconds or self.lease_seconds,
+                                 tuple(backends) if backends is not None else None, ready)
+
+    def _claim(self, owner, state, order, lease_seconds, backends=None, ready=None):
+        now = time.time()
+        free = "(lease_owner IS NULL OR lease_expires < ?)"
+        free_params = [now]
+        if ready is not None:
+            free += " AND payload IS NOT NULL" if ready else " AND payload IS NULL"
+        if backends is not None:
+            free += f" AND (backend IS NULL OR backend IN ({','.join('?' * len(backends))}))"
+            free_params.extend(backends)
+        if order == RANDOM:
+            start = random.randrange(RAND_KEY_RANGE)
+            row = self._conn.execute(
+                f"SELECT id FROM jobs WHERE state = ? AND rand_key >= ? AND {free} ORDER BY rand_key LIMIT 1",
+                [state, start] + free_params,
+            ).fetchone()
+            if row is None:
+                # Wrap around to the start of the index
+                row = self._conn.execute(
+                    f"SELECT id FROM jobs WHERE state = ? AND rand_key < ? AND {free} ORDER BY rand_key LIMIT 1",
+                    [state, start] + free_params,
+                ).fetchone()
+        elif order == PRIORITY:
+            row = self._conn.execute(
+                f"SELECT id FROM jobs WHERE state = ? AND {free} ORDER BY priority DESC, created_at ASC LIMIT 1",
+                [state] + free_params,
+            ).fetchone()
+        else:
+            raise ValueError(f"Unknown claim order: {order}")
+        if row is None:
+            return None
+        self._conn.execute(
+            """
+            UPDATE jobs SET lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?
+            WHERE id = ?
+            """,
+            (owner, now + lease_seconds, now, row["id"]),
+        )
+        return self._row(self._conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def _check_lease(self, job_id, owner, now):
+        row = self._conn.execute("SELECT lease_owner, lease_expires FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        held_by_other = row["lease_owner"] not in (None, owner) and row["lease_expires"] >= now
+        if held_by_other:
+            raise LeaseLostError(f"Job {job_id} is leased to {row['lease_owner']}")
+
+    def renew(self, job_id, owner=WORKER_ID, lease_seconds=None):
+        """Extend a lease held by `owner`"""
+        def update():
+            now = time.time()
+            self._check_lease(job_id, owner, now)
+            self._conn.execute(
+                "UPDATE jobs SET lease_owner = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+                (owner, now + (lease_seconds or self.lease_seconds), now, job_id),
+            )
+        self._transaction(update)
+
+    def take_over(self, job_id, owner=WORKER_ID, lease_seconds=None):
+        """
+        Lease a job to `owner` regardless of its current holder, e.g. when an
+        operator explicitly resumes a job whose worker died.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_owner = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+                (owner, now + (lease_seconds or self.lease_seconds), now, job_id),
+            )
+
+    def advance(self, job_id, state, owner=WORKER_ID, release=False, job_dir=None, payload=None, backend=None):
+        """
+        Move a job to `state`, recording its job directory, payload or the
+        render backend it is pinned to.
+
+        The lease is renewed for `owner`, or dropped with `release`. Raises
+        LeaseLostError if another worker holds an unexpired lease.
+        """
+        if state not in STATES:
+            raise ValueError(f"Unknown job state: {state}")
+
+        def update():
+            now = time.time()
+            self._check_lease(job_id, owner, now)
+            lease_owner, lease_expires = (None, None) if release else (owner, now + self.lease_seconds)
+            self._conn.execute(
+                """
+                UPDATE jobs SET state = ?, lease_owner = ?, lease_expires = ?, updated_at = ?, error = NULL,
+                    attempts = CASE WHEN state = ? THEN attempts ELSE 0 END,
+                    job_dir = COALESCE(?, job_dir),
+                    payload = COALESCE(?, payload),
+                    backend = COALESCE(?, backend)
+                WHERE id = ?
+                """,
+                (state, lease_owner, lease_expires, now, state, job_dir,
+                 json.dumps(payload) if payload is not None else None, backend, job_id),
+            )
+        self._transaction(update)
+
+    def release(self, job_id, owner=WORKER_ID, attempted=True):
+        """
+        Give up a lease without changing the job's state. Pass
+        `attempted=False` for a claim that did no work on the job (e.g. a
+        probe for a buffered script), so it does not use up an attempt.
+        """
+        def update():
+            self._check_lease(job_id, owner, time.time())
+            self._conn.execute(
+                """
+                UPDATE jobs SET lease_owner = NULL, lease_expires = NULL, updated_at = ?,
+                    attempts = CASE WHEN ? THEN attempts ELSE MAX(attempts - 1, 0) END
+                WHERE id = ?
+                """,
+                (time.time(), attempted, job_id),
+            )
+        self._transaction(update)
+
+    def fail(self, job_id, error, owner=WORKER_ID, retry=True):
+        """
+        Record a failed attempt and release the lease.
+
+        With `retry`, the job stays in its state to be claimed again until it
+        has used up max_attempts; otherwise it is marked failed right away.
+
+        Returns:
+            bool: True if the job can be retried.
+        """
+        def update():
+            now = time.time()
+            self._check_lease(job_id, owner, now)
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            can_retry = retry and row["attempts"] < self.max_attempts
+            self._conn.execute(
+                """
+                UPDATE jobs SET state = CASE WHEN ? THEN state ELSE ? END, error = ?,
+                    lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                WHERE id = ?
+                """,
+                (can_retry, FAILED, str(error), now, job_id),
+            )
+            return can_retry
+        return self._transaction(update)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._row(self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def count(self, state=None, claimable=False, ready=None):
+        """Number of jobs, optionally in one state, not leased, or with(out) a payload"""
+        query = "SELECT COUNT(*) FROM jobs WHERE 1 = 1"
+        params = []
+        if state is not None:
+            query += " AND state = ?"
+            params.append(state)
+        if claimable:
+            query += " AND (lease_owner IS NULL OR lease_expires < ?)"
+            params.append(time.time())
+        if ready is not None:
+            query += " AND payload IS NOT NULL" if ready else " AND payload IS NULL"
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def expire_payloads(self, max_age, state=QUEUED):
+        """
+        Drop the payloads of unleased jobs in `state` whose `created_at` is
+        more than `max_age` seconds old (or missing), so stale buffered
+        scripts are written again.
+
+        Returns:
+            int: Number of payloads dropped.
+        """
+        def update():
+            now = time.time()
+            rows = self._conn.execute(
+                """
+                SELECT id, payload FROM jobs
+                WHERE state = ? AND payload IS NOT NULL AND (lease_owner IS NULL OR lease_expires < ?)
+                """,
+                (state, now),
+            ).fetchall()
+            stale = [row["id"] for row in rows
+                     if (json.loads(row["payload"]).get("created_at") or 0) < now - max_age]
+            self._conn.executemany(
+                "UPDATE jobs SET payload = NULL, updated_at = ? WHERE id = ?", [(now, job_id) for job_id in stale]
+            )
+            return len(stale)
+        return self._transaction(update)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Job counts per state and the number of active leases.
+        """
+        with self._lock:
+            counts = {row["state"]: row["count"] for row in self._conn.execute(
+                "SELECT state, COUNT(*) AS count FROM jobs GROUP BY state"
+            )}
+            leased = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE lease_owner IS NOT NULL AND lease_expires >= ?", (time.time(),)
+            ).fetchone()[0]
+        return {"jobs": counts, "leased": leased}
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_job_store():
+    """
+    Return the process-wide job store, importing any changed topic file
+    from DEFAULT_TOPIC_FILES on first use.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = JobStore()
+            _default_store.import_sources()
+        return _default_store
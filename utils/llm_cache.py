@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite")
+DEFAULT_MAX_ENTRIES = 20000
+
+# Seconds a response stays valid, per kind of call. Research steps go stale
+# with the news, metadata only depends on the script text.
+DEFAULT_TTLS = {
+    "search_or_not": 7 * 24 * 3600,
+    "query_generator": 24 * 3600,
+    "best_search_results": 24 * 3600,
+    "contains_data_needed": 24 * 3600,
+    "generate_response": 24 * 3600,
+    "video_title": 30 * 24 * 3600,
+    "video_description": 30 * 24 * 3600,
+    "video_tags": 30 * 24 * 3600,
+    "video_metadata": 30 * 24 * 3600,
+}
+DEFAULT_TTL = 24 * 3600
+
+
+class CachedResponse:
+    """
+    Minimal stand-in for a genai response replayed from the cache.
+    Callers only ever read `.text`.
+    """
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return f"CachedResponse(text={self.text!r})"
+
+
+class LLMCache:
+    """
+    Disk-backed, content-addressed cache for Gemini responses.
+
+    Entries are keyed by a hash of (model, prompt, generation config), expire
+    after a per-call-type TTL and are evicted least-recently-used once the
+    store grows past `max_entries`. Callers can pass `store_if(text)` so
+    that unusable answers (unparseable JSON, failed scripts) are neither
+    stored nor replayed.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttls=None):
+        """
+        Args:
+            path (str): SQLite file holding the cache.
+            max_entries (int): Number of responses kept before LRU eviction.
+            ttls (dict): Overrides for DEFAULT_TTLS, keyed by call type.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.hits = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                call_type TEXT NOT NULL,
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, contents, config=None):
+        """Hash (model, prompt, generation config) into a cache key"""
+        material = json.dumps(
+            {"model": model, "contents": contents, "config": config},
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key, call_type="default"):
+        """
+        Return the cached text for `key`, or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses[call_type] = self.misses.get(call_type, 0) + 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits[call_type] = self.hits.get(call_type, 0) + 1
+            return row[0]
+
+    def set(self, key, text, call_type="default", model=""):
+        """Store a response text and evict the least recently used overflow"""
+        now = time.time()
+        ttl = self.ttls.get(call_type, DEFAULT_TTL)
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO responses
+                    (key, call_type, model, text, created_at, expires_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, call_type, model, text, now, now + ttl, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop expired rows, then the oldest-accessed rows beyond max_entries"""
+        self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def _lookup(self, key, call_type, store_if):
+        """Cached text for `key`, dropping an entry `store_if` rejects"""
+        text = self.get(key, call_type)
+        if text is not None and store_if is not None and not store_if(text):
+            self.delete(key)
+            return None
+        return text
+
+    def _store(self, key, response, call_type, model, store_if):
+        if response and response.text and (store_if is None or store_if(response.text)):
+            self.set(key, response.text, call_type, model)
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def generate(self, client, model, contents, call_type="default", config=None, store_if=None):
+        """
+        Cached equivalent of `client.models.generate_content`.
+
+        Args:
+            store_if (callable): Takes the response text; only texts it accepts are cached.
+
+        Returns:
+            The live genai response on a miss, a CachedResponse on a hit.
+        """
+        key = self.make_key(model, contents, config)
+        text = self._lookup(key, call_type, store_if)
+        if text is not None:
+            return CachedResponse(text)
+
+        kwargs = {"config": config} if config is not None else {}
+        response = client.models.generate_content(model=model, contents=contents, **kwargs)
+        self._store(key, response, call_type, model, store_if)
+        return response
+
+    async def agenerate(self, client, model, contents, call_type="default", config=None, store_if=None):
+        """
+        Cached equivalent of `client.aio.models.generate_content`. The SQLite
+        reads and writes run in a worker thread so they never block the event loop.
+        """
+        key = self.make_key(model, contents, config)
+        text = await asyncio.to_thread(self._lookup, key, call_type, store_if)
+        if text is not None:
+            return CachedResponse(text)
+
+        kwargs = {"config": config} if config is not None else {}
+        response = await client.aio.models.generate_content(model=model, contents=contents, **kwargs)
+        await asyncio.to_thread(self._store, key, response, call_type, model, store_if)
+        return response
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit/miss counters per call type plus the stored entry count.
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "entries": entries,
+        }
+
+    def clear(self):
+        """Remove every cached response"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+_default_caches = {}
+_default_caches_lock = threading.Lock()
+
+
+def get_default_cache(path=DEFAULT_CACHE_PATH):
+    """
+    Return the process-wide cache for `path`, creating it on first use.
+    Set LLM_CACHE_DISABLED=1 to turn caching off entirely.
+    """
+    if os.getenv("LLM_CACHE_DISABLED") == "1":
+        return None
+    with _default_caches_lock:
+        if path not in _default_caches:
+            _default_caches[path] = LLMCache(path)
+        return _default_caches[path]
+
+
+def resolve_cache(cache):
+    """
+    Normalize a `cache` constructor argument: None selects the default
+    cache, False disables caching, anything else is used as-is.
+    """
+    if cache is None:
+        return get_default_cache()
+    if cache is False:
+        return None
+    return cache
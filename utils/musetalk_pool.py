@@ -0,0 +1,129 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.Musetalk import MuseTalk
+from utils.render_store import SUBMITTED, resolve_render_store
+
+DEFAULT_SPEAKER_TTL = 3600
+
+
+class MuseTalkPool:
+    """
+    Spreads MuseTalk jobs over one or more self-hosted servers.
+
+    Each server gets its own MuseTalk client (and so its own keep-alive
+    session) and a capacity: the number of jobs it may run at once. A job
+    goes to the server with the lowest load (jobs in flight / capacity);
+    when every server is full it waits for a free slot. The speaker list is
+    cached for `speaker_ttl` seconds. A job whose render is still running
+    on a server from an earlier attempt is routed back to that server.
+    """
+    def __init__(self, base_urls, capacity=1, speaker_ttl=DEFAULT_SPEAKER_TTL, proxies=None, poller=None,
+                 callback_url=None, render_store=None):
+        """
+        Args:
+            base_urls (list): MuseTalk server base URLs.
+            capacity (int or dict): Concurrent jobs per server, or a {base_url: capacity} mapping.
+            speaker_ttl (int): Seconds the speaker list stays cached.
+            proxies (dict): Proxy settings for requests.
+            poller (JobPoller): Poller shared by all clients. Defaults to the process-wide poller.
+            callback_url (str): Webhook the servers notify on completion.
+            render_store (RenderStore): Shared by all clients. Defaults to the shared store.
+        """
+        if isinstance(base_urls, str):
+            base_urls = [base_urls]
+        if not base_urls:
+            raise ValueError("MuseTalkPool needs at least one server URL.")
+        self.render_store = resolve_render_store(render_store)
+        self.clients = {
+            url: MuseTalk(url, proxies=proxies, poller=poller, callback_url=callback_url,
+                          render_store=self.render_store if self.render_store else False)
+            for url in base_urls
+        }
+        if isinstance(capacity, dict):
+            self.capacity = {url: capacity.get(url, 1) for url in base_urls}
+        else:
+            self.capacity = {url: capacity for url in base_urls}
+        self.speaker_ttl = speaker_ttl
+        self._in_flight = {url: 0 for url in base_urls}
+        self._condition = threading.Condition()
+        self._speakers = None
+        self._speakers_expire = 0
+        self._speakers_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=sum(self.capacity.values()), thread_name_prefix="musetalk-job")
+
+    def list_speakers(self, force=False):
+        """
+        Return the speaker list, served from cache while it is fresh.
+        Servers are asked in turn until one answers.
+        """
+        with self._speakers_lock:
+            if not force and self._speakers is not None and time.time() < self._speakers_expire:
+                return self._speakers
+            for client in self.clients.values():
+                speakers = client.list_speakers()
+                if speakers is not None:
+                    self._speakers = speakers
+                    self._speakers_expire = time.time() + self.speaker_ttl
+                    break
+            return self._speakers
+
+    def queue_depth(self):
+        """Jobs currently running on each server"""
+        with self._condition:
+            return dict(self._in_flight)
+
+    def _acquire(self, preferred=None):
+        """
+        Block until a server has a free slot and claim it on the least loaded
+        one, or on `preferred` whenever that server has room.
+        """
+        with self._condition:
+            while True:
+                free = [url for url in self.clients if self._in_flight[url] < self.capacity[url]]
+                if free:
+                    if preferred in free:
+                        url = preferred
+                    else:
+                        url = min(free, key=lambda u: self._in_flight[u] / self.capacity[u])
+                    self._in_flight[url] += 1
+                    return url
+                self._condition.wait()
+
+    def _release(self, url):
+        with self._condition:
+            self._in_flight[url] -= 1
+            self._condition.notify()
+
+    def _preferred_server(self, text, input_video_id, gender):
+        """Server still running an earlier attempt of this job, if any"""
+        if not self.render_store:
+            return None
+        entry = self.render_store.get(MuseTalk.render_key(text, input_video_id, gender))
+        if entry and entry["status"] == SUBMITTED and entry["server"] in self.clients:
+            return entry["server"]
+        return None
+
+    def _run(self, text, video_path, input_video_id, gender, timeout):
+        url = self._acquire(self._preferred_server(text, input_video_id, gender))
+        try:
+            print(f"Rendering {video_path} on {url}")
+            return self.clients[url].create_video(text, video_path, input_video_id, gender, timeout=timeout)
+        finally:
+            self._release(url)
+
+    def submit(self, text, video_path, input_video_id, gender, timeout=1800):
+        """
+        Queue a video for rendering on the least loaded server.
+
+        Returns:
+            Future: Resolves to MuseTalk.create_video's result (True on success).
+        """
+        return self._executor.submit(self._run, text, video_path, input_video_id, gender, timeout)
+
+    def create_video(self, text, video_path, input_video_id, gender, timeout=1800):
+        """Blocking equivalent of MuseTalk.create_video routed through the pool"""
+        return self.submit(text, video_path, input_video_id, gender, timeout).result()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
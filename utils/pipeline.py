@@ -0,0 +1,370 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+DEFAULT_JOBS_ROOT = os.getenv("PIPELINE_JOBS_ROOT", "jobs")
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+COMPLETED = "completed"
+# Some stages were deliberately left for a later run (see Pipeline.run targets)
+PAUSED = "paused"
+
+
+class PipelineError(Exception):
+    """A stage of a pipeline run raised; its checkpoint is not written"""
+    def __init__(self, stage, error):
+        super().__init__(f"Stage '{stage}' failed: {str(error)}")
+        self.stage = stage
+        self.error = error
+
+
+class Stage:
+    """
+    One node of a pipeline.
+
+    `func` is called with one keyword argument per name in `inputs`, each
+    being a job parameter or the result of an upstream stage. Its return
+    value is the stage result; checkpointed stages must return something
+    JSON-serializable. Stages whose result cannot outlive the process (an
+    authenticated API client, say) set `checkpoint=False` and are only run
+    when a stage that needs them has to run.
+    """
+    def __init__(self, name, func, inputs=(), checkpoint=True, validate=None):
+        """
+        Args:
+            name (str): Unique stage name; downstream stages refer to the result by it.
+            func (callable): Computes the result.
+            inputs (iterable): Names of the parameters and stages this stage needs.
+            checkpoint (bool): Persist the result so a rerun of the job skips the stage.
+            validate (callable): Called with a checkpointed result on resume; returning
+                False reruns the stage, e.g. when a file it produced was deleted.
+        """
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.checkpoint = checkpoint
+        self.validate = validate
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, inputs={list(self.inputs)})"
+
+
+class Pipeline:
+    """
+    Runs a DAG of stages for one job, checkpointing every finished stage
+    to the job directory.
+
+    Stages run as soon as their inputs are available, so independent stages
+    (e.g. rendering and metadata generation) overlap. Rerunning a job loads
+    the completed stages from their checkpoints and only executes what is
+    left, so a late failure costs just the failed stage.
+    """
+    def __init__(self, stages, job_dir, max_workers=4):
+        """
+        Args:
+            stages (list): Stage objects; order does not matter.
+            job_dir (str): Directory holding params.json, job.json and one checkpoint per stage.
+            max_workers (int): Stages running at the same time.
+        """
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            self.stages[stage.name] = stage
+        self.job_dir = job_dir
+        self.max_workers = max_workers
+        self._state_lock = threading.Lock()
+        self._state = {"status": RUNNING, "stages": {}}
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, visited = set(), set()
+
+        def visit(name, path):
+            if name in visited or name not in self.stages:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a cycle: {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for dependency in self.stages[name].inputs:
+                visit(dependency, path + [name])
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name, [])
+
+    def _path(self, filename):
+        return os.path.join(self.job_dir, filename)
+
+    def _write_json(self, filename, data):
+        """Write a file of the job directory atomically"""
+        tmp_path = self._path(filename + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self._path(filename))
+
+    def _read_json(self, filename):
+        with open(self._path(filename), "r") as f:
+            return json.load(f)
+
+    def _set_state(self, stage=None, **fields):
+        with self._state_lock:
+            if stage is None:
+                self._state.update(fields)
+            else:
+                self._state["stages"].setdefault(stage, {}).update(fields)
+            self._state["updated_at"] = time.time()
+            self._write_json("job.json", self._state)
+
+    def _load_checkpoint(self, stage):
+        """
+        Returns:
+            tuple: (True, result) for a valid checkpoint, (False, None) otherwise.
+        """
+        filename = f"{stage.name}.json"
+        if not stage.checkpoint or not os.path.exists(self._path(filename)):
+            return False, None
+        try:
+            result = self._read_json(filename)["result"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable checkpoint of stage '{stage.name}': {str(e)}")
+            return False, None
+        if stage.validate is not None and not stage.validate(result):
+            print(f"Checkpoint of stage '{stage.name}' is no longer valid; running it again")
+            return False, None
+        return True, result
+
+    def result(self, name):
+        """Checkpointed result of stage `name`, or None if it has not completed"""
+        restored, result = self._load_checkpoint(self.stages[name])
+        return result if restored else None
+
+    def _needed(self, done, targets=None):
+        """
+        Stages that must run: unfinished stages (or unfinished targets and
+        their upstream stages) plus the uncheckpointed stages they depend on
+        """
+        needed = set()
+
+        def need(name):
+            if name in needed or name not in self.stages or name in done:
+                return
+            needed.add(name)
+            for dependency in self.stages[name].inputs:
+                need(dependency)
+
+        for name in (targets if targets is not None else self.stages):
+            if name not in done and (targets is not None or self.stages[name].checkpoint):
+                need(name)
+        return needed
+
+    def _run_stage(self, stage, kwargs):
+        started = time.time()
+        self._set_state(stage.name, status=RUNNING, started_at=started)
+        print(f"[{os.path.basename(self.job_dir)}] Running stage '{stage.name}'")
+        result = stage.func(**kwargs)
+        if stage.checkpoint:
+            self._write_json(f"{stage.name}.json", {"stage": stage.name, "result": result, "completed_at": time.time()})
+        self._set_state(stage.name, status=DONE, duration=round(time.time() - started, 3))
+        return result
+
+    def run(self, params=None, targets=None):
+        """
+        Run every stage that has no valid checkpoint yet.
+
+        Args:
+            params (dict): Job parameters available as stage inputs. Stored in
+                params.json on the first run; omitted on resume to reuse them.
+            targets (iterable): Only run these stages and what they depend on;
+                the rest is left for a later run.
+
+        Returns:
+            dict: Parameters and the result of every stage that ran or was restored.
+
+        Raises:
+            PipelineError: A stage raised. Stages already running are allowed to
+                finish (and checkpoint) first.
+        """
+        os.makedirs(self.job_dir, exist_ok=True)
+        if params is not None:
+            self._write_json("params.json", params)
+        elif os.path.exists(self._path("params.json")):
+            params = self._read_json("params.json")
+        else:
+            params = {}
+        if os.path.exists(self._path("job.json")):
+            self._state = self._read_json("job.json")
+            self._state["status"] = RUNNING
+
+        unknown = [name for name in (targets or ()) if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown target stages: {unknown}")
+        for stage in self.stages.values():
+            missing = [name for name in stage.inputs if name not in self.stages and name not in params]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' needs unknown inputs: {missing}")
+
+        results = dict(params)
+        done = set()
+        for stage in self.stages.values():
+            restored, result = self._load_checkpoint(stage)
+            if restored:
+                results[stage.name] = result
+                done.add(stage.name)
+                print(f"[{os.path.basename(self.job_dir)}] Skipping stage '{stage.name}' (checkpointed)")
+
+        pending = self._needed(done, targets)
+        running = {}
+        failure = None
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                if failure is None:
+                    ready = [name for name in pending
+                             if all(dependency in results for dependency in self.stages[name].inputs)]
+                    for name in ready:
+                        stage = self.stages[name]
+                        kwargs = {dependency: results[dependency] for dependency in stage.inputs}
+                        running[executor.submit(self._run_stage, stage, kwargs)] = name
+                        pending.discard(name)
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        self._set_state(name, status=FAILED, error=str(e))
+                        if failure is None:
+                            failure = PipelineError(name, e)
+
+        if failure is not None:
+            self._set_state(status=FAILED)
+            raise failure
+        finished = all(name in results for name, stage in self.stages.items() if stage.checkpoint)
+        self._set_state(status=COMPLETED if finished else PAUSED)
+        return results
+
+
+def run_batch(items, phases, queue_size=None):
+    """
+    Push items through a chain of phases, each with its own worker pool.
+
+    Phases are connected by bounded queues, so a phase that falls behind
+    makes the phases before it block instead of piling up finished work.
+    An item whose phase raises drops out of the batch; the others continue.
+
+    Args:
+        items (iterable): Work items, e.g. job directories.
+        phases (list): (name, func, workers) tuples; func(item) returns the
+            item handed to the next phase.
+        queue_size (int): Capacity of each queue; defaults to the worker
+            count of the phase reading from it.
+
+    Returns:
+        tuple: (items that passed every phase, [(item, phase name, error)] of failed ones)
+    """
+    queues = [queue.Queue(maxsize=queue_size or workers) for _, _, workers in phases]
+    finished = []
+    failed = []
+    results_lock = threading.Lock()
+    remaining = [workers for _, _, workers in phases]
+    remaining_lock = threading.Lock()
+    stop = object()
+
+    def worker(index):
+        name, func, _ = phases[index]
+        while True:
+            item = queues[index].get()
+            if item is stop:
+                break
+            try:
+                result = func(item)
+            except Exception as e:
+                print(f"Phase '{name}' failed for {item}: {str(e)}")
+                with results_lock:
+                    failed.append((item, name, e))
+                continue
+            if index + 1 < len(phases):
+                queues[index + 1].put(result)
+            else:
+                with results_lock:
+                    finished.append(result)
+        with remaining_lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        # The last worker of a phase closes the next one
+        if last and index + 1 < len(phases):
+            for _ in range(phases[index + 1][2]):
+                queues[index + 1].put(stop)
+
+    threads = []
+    for index, (name, _, workers) in enumerate(phases):
+        for number in range(workers):
+            thread = threading.Thread(target=worker, args=(index,), name=f"{name}-{number}", daemon=True)
+            thread.start()
+            threads.append(thread)
+    for item in items:
+        queues[0].put(item)
+    for _ in range(phases[0][2]):
+        queues[0].put(stop)
+    for thread in threads:
+        thread.join()
+    return finished, failed
+
+
+def new_job_dir(root=DEFAULT_JOBS_ROOT, job_id=None):
+    """
+    Returns:
+        tuple: (job_id, job directory) for a fresh job.
+    """
+    job_id = job_id or str(uuid.uuid4())
+    return job_id, os.path.join(root, job_id)
+
+
+def job_status(job_dir):
+    """Overall status recorded in job.json, or None if the job never started"""
+    path = os.path.join(job_dir, "job.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f).get("status")
+
+
+def latest_unfinished_job(root=DEFAULT_JOBS_ROOT):
+    """
+    Returns:
+        str: Directory of the most recently updated job that did not complete, or None.
+    """
+    if not os.path.isdir(root):
+        return None
+    candidates = []
+    for name in os.listdir(root):
+        job_dir = os.path.join(root, name)
+        state_path = os.path.join(job_dir, "job.json")
+        if os.path.exists(state_path) and job_status(job_dir) != COMPLETED:
+            candidates.append((os.path.getmtime(state_path), job_dir))
+    return max(candidates)[1] if candidates else None
+
+
+def resolve_resume(resume, root=DEFAULT_JOBS_ROOT):
+    """
+    Turn a --resume argument into a job directory: "latest" picks the most
+    recent unfinished job, anything else is a job ID or directory.
+    """
+    if resume == "latest":
+        job_dir = latest_unfinished_job(root)
+        if job_dir is None:
+            raise ValueError(f"No unfinished job to resume in {root}")
+        return job_dir
+    job_dir = resume if os.path.isdir(resume) else os.path.join(root, resume)
+    if not os.path.isdir(job_dir):
+        raise ValueError(f"Unknown job: {resume}")
+    return job_dir
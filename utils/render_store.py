@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+DEFAULT_STORE_PATH = os.getenv("RENDER_STORE_PATH", "cache/render_store.sqlite")
+
+SUBMITTED = "submitted"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class RenderStore:
+    """
+    Disk-backed, content-addressed record of avatar renders.
+
+    Renders are keyed by a hash of everything that determines the output
+    video: backend, script text, avatar, voice, dimensions and background.
+    The provider job ID is stored as soon as a render is submitted, so a
+    restarted process re-attaches to a render that is still running, and the
+    local file is stored once downloaded, so an identical request is served
+    without rendering again.
+    """
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        """
+        Args:
+            path (str): SQLite file holding the store.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS renders (
+                key TEXT PRIMARY KEY,
+                backend TEXT NOT NULL,
+                server TEXT,
+                job_id TEXT,
+                status TEXT NOT NULL,
+                video_url TEXT,
+                output_path TEXT,
+                size INTEGER,
+                error TEXT,
+                submitted_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(backend, script, avatar_id=None, voice_id=None, width=None, height=None, background=None,
+                 endpoint=None):
+        """
+        Hash the inputs that determine a rendered video into a store key.
+        `endpoint` separates renders of the same inputs on different servers
+        of a backend, e.g. a stand-in and the real API.
+        """
+        fields = [backend, script, avatar_id, voice_id, width, height, background]
+        if endpoint:
+            fields.append(endpoint)
+        material = json.dumps(fields, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns:
+            dict: The stored render, or None if the key is unknown or its render failed.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM renders WHERE key = ?", (key,)).fetchone()
+        if row is None or row["status"] == FAILED:
+            return None
+        return dict(row)
+
+    def record_submitted(self, key, backend, job_id, server=None):
+        """Remember a freshly submitted provider job, replacing any earlier attempt"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO renders
+                    (key, backend, server, job_id, status, submitted_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, backend, server, job_id, SUBMITTED, now, now),
+            )
+            self._conn.commit()
+
+    def record_completed(self, key, video_url=None, output_path=None):
+        """Mark a render finished, optionally with its URL and downloaded file"""
+        size = os.path.getsize(output_path) if output_path and os.path.exists(output_path) else None
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE renders SET status = ?, updated_at = ?,
+                    video_url = COALESCE(?, video_url),
+                    output_path = COALESCE(?, output_path),
+                    size = COALESCE(?, size)
+                WHERE key = ?
+                """,
+                (COMPLETED, time.time(), video_url, os.path.abspath(output_path) if output_path else None, size, key),
+            )
+            self._conn.commit()
+
+    def record_failed(self, key, error=None):
+        """Mark a render failed so the next request submits it again"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE renders SET status = ?, error = ?, updated_at = ? WHERE key = ?",
+                (FAILED, str(error) if error is not None else None, time.time(), key),
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def local_copy(entry):
+        """
+        Returns:
+            str: Path of the entry's downloaded video if it is still on disk and intact, else None.
+        """
+        path = entry.get("output_path") if entry else None
+        if not path or not os.path.exists(path):
+            return None
+        if entry.get("size") is not None and os.path.getsize(path) != entry["size"]:
+            return None
+        return path
+
+    def restore(self, key, output_path):
+        """
+        Place the stored video of `key` at `output_path` (hard link, or copy
+        across file systems).
+
+        Returns:
+            bool: True if a completed render with an intact local file was found.
+        """
+        source = self.local_copy(self.get(key))
+        if source is None:
+            return False
+        if os.path.abspath(output_path) != source:
+            directory = os.path.dirname(output_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            try:
+                os.link(source, output_path)
+            except OSError:
+                shutil.copyfile(source, output_path)
+        print(f"Reusing stored render {source} for {output_path}")
+        return True
+
+    def in_flight(self, backend=None):
+        """
+        Returns:
+            list: Submitted renders that have not completed or failed yet.
+        """
+        query = "SELECT * FROM renders WHERE status = ?"
+        params = [SUBMITTED]
+        if backend is not None:
+            query += " AND backend = ?"
+            params.append(backend)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query, params).fetchall()]
+
+    def clear(self):
+        """Forget every render"""
+        with self._lock:
+            self._conn.execute("DELETE FROM renders")
+            self._conn.commit()
+
+
+_default_stores = {}
+_default_stores_lock = threading.Lock()
+
+
+def get_default_render_store(path=DEFAULT_STORE_PATH):
+    """
+    Return the process-wide render store for `path`, creating it on first use.
+    Set RENDER_STORE_DISABLED=1 to turn it off entirely.
+    """
+    if os.getenv("RENDER_STORE_DISABLED") == "1":
+        return None
+    with _default_stores_lock:
+        if path not in _default_stores:
+            _default_stores[path] = RenderStore(path)
+        return _default_stores[path]
+
+
+def resolve_render_store(store):
+    """
+    Normalize a `render_store` constructor argument: None selects the
+    default store, False disables it, anything else is used as-is.
+    """
+    if store is None:
+        return get_default_render_store()
+    if store is False:
+        return None
+    return store
@@ -0,0 +1,190 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import requests
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from utils.job_poller import get_default_poller
+
+# Only reachable from this host unless explicitly exposed (e.g. behind a reverse proxy)
+DEFAULT_HOST = os.getenv("RENDER_WEBHOOK_HOST", "127.0.0.1")
+DEFAULT_PORT = 8765
+
+# HeyGen signs each webhook with HMAC-SHA256 of the raw body, keyed with the
+# endpoint's secret; MuseTalk servers send back the token they were given
+HEYGEN_SIGNATURE_HEADER = "Signature"
+MUSETALK_TOKEN_HEADER = "Authorization"
+
+HEYGEN_SUCCESS_EVENT = "avatar_video.success"
+HEYGEN_FAIL_EVENT = "avatar_video.fail"
+
+
+def sign_body(secret, body):
+    """HMAC-SHA256 hex signature of a raw webhook body"""
+    return hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+class RenderWebhookServer:
+    """
+    Local callback server for render completion notifications.
+
+    HeyGen (and MuseTalk-compatible servers) POST here when a render
+    finishes. Callbacks must be signed (HeyGen) or carry the configured
+    token (MuseTalk); anything else is rejected with 401. Even an
+    authenticated callback is only a hint: the matching job tracked by the
+    JobPoller is checked against the provider's status endpoint right away,
+    so the video URL always comes from the provider API. The poller keeps
+    polling at a slow rate as a fallback for missed callbacks.
+    """
+    def __init__(self, poller=None, host=DEFAULT_HOST, port=DEFAULT_PORT, public_url=None,
+                 heygen_secret=None, musetalk_token=None):
+        """
+        Args:
+            poller (JobPoller): Poller whose jobs are checked. Defaults to the shared poller.
+            host (str): Interface to listen on.
+            port (int): Port to listen on.
+            public_url (str): Base URL the providers can reach this server at.
+                Falls back to RENDER_CALLBACK_URL, then to http://host:port.
+            heygen_secret (str): Secret of the HeyGen webhook endpoint; HEYGEN_WEBHOOK_SECRET by default.
+            musetalk_token (str): Token MuseTalk servers send back; MUSETALK_WEBHOOK_TOKEN by default.
+        """
+        self.poller = poller or get_default_poller()
+        self.host = host
+        self.port = port
+        self.public_url = (public_url or os.getenv("RENDER_CALLBACK_URL") or f"http://{host}:{port}").rstrip("/")
+        self.heygen_secret = heygen_secret or os.getenv("HEYGEN_WEBHOOK_SECRET")
+        self.musetalk_token = musetalk_token or os.getenv("MUSETALK_WEBHOOK_TOKEN")
+        self.app = self._build_app()
+        self._server = None
+        self._thread = None
+
+    @property
+    def heygen_callback_url(self):
+        return f"{self.public_url}/callbacks/heygen"
+
+    @property
+    def musetalk_callback_url(self):
+        return f"{self.public_url}/callbacks/musetalk"
+
+    def _build_app(self):
+        app = FastAPI(title="Render completion webhooks")
+        poller = self.poller
+
+        def parse(body):
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid JSON")
+            if not isinstance(payload, dict):
+                raise HTTPException(status_code=400, detail="Expected a JSON object")
+            return payload
+
+        @app.post("/callbacks/heygen")
+        async def heygen_callback(request: Request):
+            body = await request.body()
+            signature = request.headers.get(HEYGEN_SIGNATURE_HEADER, "")
+            if not self.heygen_secret or not hmac.compare_digest(sign_body(self.heygen_secret, body), signature):
+                raise HTTPException(status_code=401, detail="Invalid signature")
+            payload = parse(body)
+            event_type = payload.get("event_type")
+            video_id = (payload.get("event_data") or {}).get("video_id")
+            if not video_id:
+                return {"accepted": False, "reason": "missing video_id"}
+            if event_type not in (HEYGEN_SUCCESS_EVENT, HEYGEN_FAIL_EVENT):
+                return {"accepted": False, "reason": f"unhandled event {event_type}"}
+            # The event's URL is not used; the status check fetches it from HeyGen
+            matched = poller.poll_now(video_id)
+            print(f"HeyGen callback for {video_id}: {event_type}")
+            return {"accepted": True, "matched": matched}
+
+        @app.post("/callbacks/musetalk")
+        async def musetalk_callback(request: Request):
+            body = await request.body()
+            token = request.headers.get(MUSETALK_TOKEN_HEADER, "")
+            if not self.musetalk_token or not hmac.compare_digest(f"Bearer {self.musetalk_token}", token):
+                raise HTTPException(status_code=401, detail="Invalid token")
+            payload = parse(body)
+            job_id = payload.get("job_id")
+            if not job_id:
+                return {"accepted": False, "reason": "missing job_id"}
+            matched = poller.poll_now(job_id)
+            print(f"MuseTalk callback for {job_id}: {payload.get('status')}")
+            return {"accepted": True, "matched": matched}
+
+        @app.get("/health")
+        def health():
+            return {"status": "ok", "pending_jobs": poller.pending()}
+
+        return app
+
+    def start(self, wait=10):
+        """
+        Serve the callbacks from a daemon thread.
+
+        Args:
+            wait (float): Seconds to wait for the server to accept connections.
+        """
+        if self._thread is not None:
+            return self
+        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name="render-webhook", daemon=True)
+        self._thread.start()
+
+        deadline = time.monotonic() + wait
+        while not self._server.started and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if not self._server.started:
+            raise RuntimeError(f"Webhook server did not start on {self.host}:{self.port}")
+        print(f"Render webhook server listening on {self.host}:{self.port} ({self.public_url})")
+        if not self.heygen_secret:
+            print("HEYGEN_WEBHOOK_SECRET is not set; HeyGen callbacks will be rejected and renders polled")
+        if not self.musetalk_token:
+            print("MUSETALK_WEBHOOK_TOKEN is not set; MuseTalk callbacks will be rejected and renders polled")
+        return self
+
+    def stop(self):
+        """Shut the server down"""
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+            self._server = None
+            self._thread = None
+
+
+def send_fake_callback(callback_url, job_id, success=True, video_url=None, backend="heygen", secret=None):
+    """
+    POST a provider-shaped completion callback, standing in for HeyGen or MuseTalk.
+
+    Args:
+        callback_url (str): URL of the callback endpoint.
+        job_id (str): Video ID (HeyGen) or job ID (MuseTalk) to report.
+        success (bool): Report a finished render or a failure.
+        video_url (str): Download URL reported on HeyGen success.
+        backend (str): "heygen" or "musetalk".
+        secret (str): HeyGen webhook secret to sign with, or MuseTalk token to send.
+
+    Returns:
+        dict: The receiver's JSON answer.
+    """
+    if backend == "heygen":
+        payload = {
+            "event_type": HEYGEN_SUCCESS_EVENT if success else HEYGEN_FAIL_EVENT,
+            "event_data": {"video_id": job_id, "url": video_url} if success
+            else {"video_id": job_id, "msg": "Simulated failure"},
+        }
+    else:
+        payload = {"job_id": job_id, "status": "success" if success else "failed"}
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if secret and backend == "heygen":
+        headers[HEYGEN_SIGNATURE_HEADER] = sign_body(secret, body)
+    elif secret:
+        headers[MUSETALK_TOKEN_HEADER] = f"Bearer {secret}"
+    response = requests.post(callback_url, data=body, headers=headers, proxies={'http': None, 'https': None},
+                             timeout=10)
+    response.raise_for_status()
+    return response.json()
@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import threading
+import time
+from utils.job_store import get_default_job_store, QUEUED
+from utils.scene_planner import MAX_SCENE_CHARS, MAX_SCENES_PER_REQUEST
+from utils.script_generator.script_generator import is_usable_script
+
+DEFAULT_BUFFER_SIZE = int(os.getenv("SCRIPT_BUFFER_SIZE", "3"))
+# News topics age; a buffered script older than this is researched again
+DEFAULT_TTL = float(os.getenv("SCRIPT_TTL_HOURS", "24")) * 3600
+# Research plus metadata takes minutes, not hours
+PREFETCH_LEASE_SECONDS = 30 * 60
+MIN_SCRIPT_CHARS = 200
+# The most a single render request can take once split into scenes
+MAX_SCRIPT_CHARS = MAX_SCENE_CHARS * MAX_SCENES_PER_REQUEST
+
+
+def make_payload(script, context=None, video_info=None):
+    """Job store payload of a script written ahead of time"""
+    return {"script": script, "context": context, "video_info": video_info, "created_at": time.time()}
+
+
+def buffered_script(job, ttl=DEFAULT_TTL):
+    """
+    Returns:
+        dict: The job's payload if it holds a script younger than `ttl` seconds, else None.
+    """
+    payload = job.get("payload") if job else None
+    if not payload or not payload.get("script"):
+        return None
+    if time.time() - (payload.get("created_at") or 0) > ttl:
+        return None
+    return payload
+
+
+def validate_script(script):
+    """
+    Returns:
+        str: Why the script cannot be rendered, or None if it can.
+    """
+    if not is_usable_script(script):
+        return "no script was generated"
+    if len(script) < MIN_SCRIPT_CHARS:
+        return f"script is only {len(script)} characters"
+    if len(script) > MAX_SCRIPT_CHARS:
+        return f"script is {len(script)} characters, more than one render request takes"
+    return None
+
+
+class ScriptPrefetcher:
+    """
+    Keeps `size` researched and validated scripts buffered in the job store.
+
+    Worker threads claim queued topics without a buffered script, research
+    them, check the script, precompute its video metadata and park all of
+    it (with the research context) as the topic's payload. Consumers claim
+    buffered topics first, so a free render slot starts right away instead
+    of waiting on Gemini. Scripts older than `ttl` are dropped and their
+    topics researched again.
+    """
+    def __init__(self, script_generator, video_metadata, job_store=None, size=DEFAULT_BUFFER_SIZE,
+                 ttl=DEFAULT_TTL, concurrency=1, poll_interval=30):
+        """
+        Args:
+            script_generator (ScriptGenerator): Researches topics and writes scripts.
+            video_metadata (VideoMetadata): Writes titles, descriptions and tags.
+            job_store (JobStore): Store holding the topics; the default store when None.
+            size (int): Buffered scripts to keep ready.
+            ttl (float): Seconds a buffered script stays usable.
+            concurrency (int): Topics researched at the same time.
+            poll_interval (float): Seconds to wait while the buffer is full.
+        """
+        self.script_generator = script_generator
+        self.video_metadata = video_metadata
+        self.job_store = job_store or get_default_job_store()
+        self.size = size
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._preparing = set()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f"script-prefetch-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, wait=True):
+        """
+        Stop prefetching. Without `wait`, topics still being researched are
+        released right away so other runs can take them.
+        """
+        self._stop.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+            return
+        with self._lock:
+            preparing = list(self._preparing)
+        for job_id in preparing:
+            self.job_store.release(job_id)
+
+    def buffered(self):
+        """Number of buffered scripts ready to be claimed"""
+        return self.job_store.count(QUEUED, claimable=True, ready=True)
+
+    def prepare(self, job):
+        """Research a claimed topic and buffer its script, or retire the topic if the script is unusable"""
+        print(f"Prefetching script for topic: '{job['topic']}'")
+        response, context = self.script_generator.research(job["topic"])
+        script = response.text if response else None
+        problem = validate_script(script)
+        if problem:
+            print(f"Not buffering the script for topic '{job['topic']}': {problem}")
+            self.job_store.fail(job["id"], f"Prefetched script rejected: {problem}", retry=False)
+            return
+        video_info = self.video_metadata.generate_all(script)
+        self.job_store.advance(job["id"], QUEUED, release=True, payload=make_payload(script, context, video_info))
+        print(f"Buffered script for topic: '{job['topic']}'")
+
+    def run_once(self):
+        """
+        Top the buffer up by one script.
+
+        Returns:
+            bool: False if the buffer is full or no topic is left.
+        """
+        self.job_store.expire_payloads(self.ttl)
+        with self._lock:
+            if self.buffered() + len(self._preparing) >= self.size:
+                return False
+            job = self.job_store.claim(ready=False, lease_seconds=PREFETCH_LEASE_SECONDS)
+            if job is None:
+                return False
+            self._preparing.add(job["id"])
+        try:
+            self.prepare(job)
+        except Exception as e:
+            print(f"Prefetching topic '{job['topic']}' failed: {str(e)}")
+            self.job_store.fail(job["id"], e)
+        finally:
+            with self._lock:
+                self._preparing.discard(job["id"])
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.run_once():
+                    self._stop.wait(self.poll_interval)
+            except Exception as e:
+                print(f"Script prefetcher error: {str(e)}")
+                self._stop.wait(self.poll_interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep a buffer of researched scripts ready for rendering.")
+    parser.add_argument("--size", type=int, default=DEFAULT_BUFFER_SIZE, help="Buffered scripts to keep ready.")
+    parser.add_argument("--ttl-hours", type=float, default=DEFAULT_TTL / 3600,
+                        help="Hours after which a buffered script is researched again.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Topics researched at the same time.")
+    parser.add_argument("--poll-interval", type=float, default=30)
+    parser.add_argument("--stats", action="store_true", help="Print the number of buffered scripts and exit.")
+    args = parser.parse_args()
+
+    job_store = get_default_job_store()
+    if args.stats:
+        job_store.expire_payloads(args.ttl_hours * 3600)
+        print(json.dumps({"buffered": job_store.count(QUEUED, claimable=True, ready=True),
+                          "queued": job_store.count(QUEUED)}, indent=4))
+    else:
+        from utils.script_generator.script_generator import ScriptGenerator
+        from utils.video_metadata import VideoMetadata
+        prefetcher = ScriptPrefetcher(ScriptGenerator(), VideoMetadata(), job_store, size=args.size,
+                                      ttl=args.ttl_hours * 3600, concurrency=args.concurrency,
+                                      poll_interval=args.poll_interval).start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print("Stopping script prefetcher...")
+            prefetcher.stop(wait=False)
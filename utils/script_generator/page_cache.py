@@ -0,0 +1,226 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+import requests
+import trafilatura
+
+DEFAULT_PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", "cache/pages.sqlite")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Pages younger than this are served without contacting the server, unless
+# the response's Cache-Control says otherwise
+DEFAULT_MAX_AGE = float(os.getenv("PAGE_CACHE_MAX_AGE_HOURS", "6")) * 3600
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.'
+}
+
+
+def freshness_lifetime(headers, default):
+    """
+    Seconds a response may be served from the cache without revalidation:
+    Cache-Control max-age if present, 0 for no-cache, otherwise `default`.
+    """
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-cache" in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return int(match.group(1)) if match else default
+
+
+def extract_content(raw):
+    """Run trafilatura's extraction with the options used across the project"""
+    return trafilatura.extract(raw, include_links=True, deduplicate=True)
+
+
+class PageCache:
+    """
+    URL-keyed store of scraped pages.
+
+    Each entry holds the zlib-compressed raw response body together with the
+    trafilatura extraction and the validators (ETag / Last-Modified) sent by
+    the server. A page is served straight from the cache until it expires
+    (`max_age`, or the server's Cache-Control max-age); after that it is
+    revalidated with a conditional GET, so an unchanged article costs a 304
+    instead of a download plus an extraction. Pages without validators
+    cannot be revalidated and are downloaded again once expired. Responses
+    marked no-store are not cached. Least recently used pages are evicted
+    once the compressed total exceeds `max_bytes`.
+    """
+    def __init__(self, path=DEFAULT_PAGE_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, timeout=20,
+                 max_age=DEFAULT_MAX_AGE):
+        """
+        Args:
+            path (str): SQLite file holding the pages.
+            max_bytes (int): Upper bound on the compressed size of all entries.
+            timeout (int): Seconds to wait on each HTTP request.
+            max_age (float): Seconds a page is served without contacting the server.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_age = max_age
+        # requests sessions are not thread-safe; scrapes run in a thread pool
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                raw BLOB NOT NULL,
+                extracted BLOB,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(pages)")}
+        if "expires_at" not in columns:
+            self._conn.execute("ALTER TABLE pages ADD COLUMN expires_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_last_access ON pages(last_access)")
+        self._conn.commit()
+
+    @property
+    def session(self):
+        """The calling thread's HTTP session"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            self._local.session = session
+        return session
+
+    def _lookup(self, url):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT etag, last_modified, extracted, expires_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+
+    def _touch(self, url):
+        with self._lock:
+            self._conn.execute("UPDATE pages SET last_access = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def _renew(self, url, lifetime):
+        """Record a successful revalidation: the page is fresh again for `lifetime` seconds"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET expires_at = ?, last_access = ? WHERE url = ?", (now + lifetime, now, url)
+            )
+            self._conn.commit()
+
+    def _store(self, url, etag, last_modified, raw, extracted, lifetime):
+        raw_blob = zlib.compress(raw)
+        extracted_blob = zlib.compress(extracted.encode("utf-8")) if extracted is not None else None
+        size = len(raw_blob) + len(extracted_blob or b"")
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO pages
+                    (url, etag, last_modified, raw, extracted, size, fetched_at, expires_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (url, etag, last_modified, raw_blob, extracted_blob, size, now, now + lifetime, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used pages until the store fits in max_bytes"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, size in self._conn.execute(
+            "SELECT url, size FROM pages ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            total -= size
+
+    def fetch(self, url):
+        """
+        Return the extracted text of `url`: from the cache while it is fresh,
+        otherwise downloading it only if it changed.
+
+        Args:
+            url (str): Page to scrape.
+
+        Returns:
+            str: The trafilatura extraction, or None if nothing could be extracted.
+        """
+        cached = self._lookup(url)
+        headers = {}
+        if cached:
+            etag, last_modified, extracted, expires_at = cached
+            if expires_at is not None and time.time() < expires_at:
+                self._touch(url)
+                return zlib.decompress(extracted).decode("utf-8") if extracted is not None else None
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        lifetime = freshness_lifetime(response.headers, self.max_age)
+
+        if response.status_code == 304 and headers:
+            self._renew(url, lifetime)
+            extracted = cached[2]
+            return zlib.decompress(extracted).decode("utf-8") if extracted is not None else None
+
+        response.raise_for_status()
+        raw = response.content
+        extracted = extract_content(raw)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        # A page that can be neither reused nor revalidated is not worth the space
+        if "no-store" in response.headers.get("Cache-Control", "").lower() or (
+                lifetime <= 0 and not (etag or last_modified)):
+            return extracted
+        self._store(url, etag, last_modified, raw, extracted, lifetime)
+        return extracted
+
+    def raw(self, url):
+        """Return the cached raw body of `url` (bytes), or None if not stored"""
+        with self._lock:
+            row = self._conn.execute("SELECT raw FROM pages WHERE url = ?", (url,)).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def clear(self):
+        """Remove every cached page"""
+        with self._lock:
+            self._conn.execute("DELETE FROM pages")
+            self._conn.commit()
+
+
+_default_page_cache = None
+_default_page_cache_lock = threading.Lock()
+
+
+def get_default_page_cache():
+    """
+    Return the process-wide page cache, creating it on first use.
+    Set PAGE_CACHE_DISABLED=1 to always download pages directly.
+    """
+    global _default_page_cache
+    if os.getenv("PAGE_CACHE_DISABLED") == "1":
+        return None
+    with _default_page_cache_lock:
+        if _default_page_cache is None:
+            _default_page_cache = PageCache()
+        return _default_page_cache
@@ -1,17 +1,53 @@
-import bs4 as beautifulsoup
-import requests
+import asyncio
+import threading
 import trafilatura
 from google import genai
 import dotenv
 import os
+from urllib.parse import urlparse
 from . import system_prompts
+from .page_cache import get_default_page_cache
+from .search_backends import get_default_backend
+from utils.llm_cache import resolve_cache
 
 
-class ScriptGenerator:
-    def __init__(self, api_key=None):
+MODEL = "gemini-2.0-flash"
+FAILED_RESPONSE = "Could not generate a response for your query."
+# Marks a search pick that still depends on pending fetches
+_UNDECIDED = object()
+
+
+def is_usable_script(text):
+    """False for empty answers and the failure message, which must not be cached as scripts"""
+    return bool(text and text.strip()) and text.strip() != FAILED_RESPONSE
+
+
+def scrape_webpage(url):
+    """Extract content from a webpage (blocking), revalidating through the page cache"""
+    page_cache = get_default_page_cache()
+    if page_cache is not None:
+        return page_cache.fetch(url)
+    downloaded = trafilatura.fetch_url(url)
+    return trafilatura.extract(downloaded, include_links=True, deduplicate=True)
+
+
+class AsyncScriptGenerator:
+    """
+    asyncio-native script generator.
+
+    Every Gemini call goes through the genai async client and every blocking
+    network step (search, scraping) runs in the default executor, so many
+    topics can be researched concurrently on a single event loop.
+    """
+    def __init__(self, api_key=None, cache=None, parallel_search=False, max_fetches_per_host=2,
+                 search_backend=None):
         """
-        Initialize the ScriptGenerator class with Google API key
+        Initialize the AsyncScriptGenerator class with Google API key
         If no API key is provided, it will attempt to load from environment variables
+        `cache` is an LLMCache; None uses the shared default, False disables caching
+        `parallel_search` scrapes and verifies every search result at once instead
+        of ranking, scraping and verifying them one by one
+        `search_backend` is a SearchBackend; None uses the shared default from SEARCH_BACKENDS
         """
         dotenv.load_dotenv()
         self.api_key = api_key or os.getenv('GOOGLE_API_KEY')
@@ -19,42 +55,54 @@ class ScriptGenerator:
             raise ValueError("Google API key is required. Provide it as a parameter or set GOOGLE_API_KEY environment variable.")
         
         self.client = genai.Client(api_key=self.api_key)
+        self.cache = resolve_cache(cache)
+        self.search_backend = search_backend or get_default_backend()
+        self.parallel_search = parallel_search
+        self.max_fetches_per_host = max_fetches_per_host
         self.debug = False  # Control debug printing
     
     def set_debug(self, debug=True):
         """Enable or disable debug printing"""
         self.debug = debug
+
+    def set_parallel_search(self, parallel_search=True):
+        """Enable or disable concurrent scraping and verification of search results"""
+        self.parallel_search = parallel_search
     
     def _debug_print(self, message):
         """Print debug messages if debug mode is enabled"""
         if self.debug:
             print(message)
+
+    async def _generate(self, contents, call_type, store_if=None):
+        """Send a single prompt to Gemini through the async client and the response cache"""
+        if self.cache is None:
+            return await self.client.aio.models.generate_content(
+                model=MODEL, contents=contents,
+            )
+        return await self.cache.agenerate(self.client, MODEL, contents, call_type, store_if=store_if)
     
-    def search_or_not(self, user_query):
+    async def asearch_or_not(self, user_query):
         """Determine if the query requires web search"""
         PROMPT = f"""
             {system_prompts.SEARCH_OR_NOT_MSG}
             USER QUERY: {user_query}
         """
 
-        response = self.client.models.generate_content(
-            model="gemini-2.0-flash", contents=PROMPT,
-        )
+        response = await self._generate(PROMPT, "search_or_not")
 
         content = response.text
         self._debug_print(f'SEARCH OR NOT: {content}')
 
         return 'yes' in content.lower()
     
-    def query_generator(self, user_query):
+    async def aquery_generator(self, user_query):
         """Generate an optimized search query from user input"""
         PROMPT = f"""
         {system_prompts.QUERY_GENERATOR_MSG}
         USER QUERY: {user_query}
         """
-        response = self.client.models.generate_content(
-            model="gemini-2.0-flash", contents=PROMPT,
-        )
+        response = await self._generate(PROMPT, "query_generator")
 
         content = response.text
         content = content.replace('"', '')
@@ -62,81 +110,11 @@ class ScriptGenerator:
 
         return content
 
-    def duckduckgo_search(self, query):
-        """Perform a DuckDuckGo search and extract results"""
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.'
-        }
-        url = f'https://duckduckgo.com/html/?q={query}'
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-
-        soup = beautifulsoup.BeautifulSoup(response.text, 'html.parser')
-        results = []
-        for i, result in enumerate(soup.find_all('div', class_ = 'result'), start=1):
-            if i > 5:
-                break
-            title = result.find('a', class_='result__a')
-            if not title:
-                continue
+    async def aduckduckgo_search(self, query):
+        """Search the web through the configured backend without blocking the event loop"""
+        return await asyncio.to_thread(self.search_backend.search, query)
 
-            link = title['href']
-            snippet_tag = result.find('a', class_='result__snippet')
-            snippet = snippet_tag.text.strip() if snippet_tag else 'No description available'
-
-            results.append({
-                'id': i,
-                'link': link,
-                'search_description': snippet
-            })
-        return results
-    
-    # def searxng_search(self,query):
-
-    #     headers = {
-    #         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
-    #     }
-    #     # Query the local searxng instance. Adjust parameters as needed.
-    #     url = 'http://localhost:4000/search'
-    #     params = {
-    #     'q': query,
-    #     'format': 'html'  # Explicitly request HTML format
-    #     }
-    #     proxies = {
-    #         'http': None,
-    #         'https': None
-    #     }
-
-    #     response = requests.get(url, headers=headers, params=params, proxies=proxies)
-    #     response.raise_for_status()
-        
-    #     soup = beautifulsoup.BeautifulSoup(response.text, 'html.parser')
-    #     results = []
-        
-    #     # Use a CSS selector to get all articles with class "result"
-    #     articles = soup.select('article.result')
-    #     for i, article in enumerate(articles, start=1):
-    #         if i > 5:
-    #             break
-    #         # Get the URL from the <a> with class "url_header"
-    #         link_tag = article.find('a', class_='url_header')
-    #         if not link_tag:
-    #             continue
-    #         link = link_tag.get('href', 'No URL found')
-            
-    #         # Get the snippet from the <p> with class "content"
-    #         snippet_tag = article.find('p', class_='content')
-    #         snippet = snippet_tag.get_text(strip=True) if snippet_tag else 'No description available'
-            
-    #         results.append({
-    #             'id': i,
-    #             'link': link,
-    #             'search_description': snippet
-    #         })
-        
-    #     return results
-
-    def best_search_results(self, s_results, query, user_prompt):
+    async def abest_search_results(self, s_results, query, user_prompt):
         """Determine the most relevant search result"""
         PROMPT = f"""
             {system_prompts.BEST_SEARCH_RESULT_MSG}
@@ -144,25 +122,22 @@ class ScriptGenerator:
             USER_PROMPT: {user_prompt} 
             SEARCH_QUERY: {query}
         """
-        response = self.client.models.generate_content(
-            model="gemini-2.0-flash", contents=PROMPT,
-        )
+        response = await self._generate(PROMPT, "best_search_results")
 
         content = response.text
         self._debug_print(f'BEST SEARCH RESULT: {content}')
 
         return content
 
-    def scrape_webpage(self, url):
-        """Extract content from a webpage"""
+    async def ascrape_webpage(self, url):
+        """Extract content from a webpage without blocking the event loop"""
         try:
-            downloaded = trafilatura.fetch_url(url)
-            return trafilatura.extract(downloaded, include_links=True, deduplicate=True)
+            return await asyncio.to_thread(scrape_webpage, url)
         except Exception as e:
             self._debug_print(f"Error scraping webpage: {str(e)}")
             return None
         
-    def contains_data_needed(self, search_content, query, user_prompt):
+    async def acontains_data_needed(self, search_content, query, user_prompt):
         """Check if the scraped content contains the information needed"""
         PROMPT = f"""
             {system_prompts.CONTAINS_DATA_NEEDED_MSG}
@@ -170,29 +145,30 @@ class ScriptGenerator:
             USER PROMPT: {user_prompt}
             SEARCH QUERY: {query}
         """
-        response = self.client.models.generate_content(
-            model="gemini-2.0-flash", contents=PROMPT,
-        )
+        response = await self._generate(PROMPT, "contains_data_needed")
 
         content = response.text
         self._debug_print(f'CONTAINS DATA NEEDED: {content}')
 
         return 'true' in content.lower()
         
-    def ai_search(self, user_query):
+    async def aai_search(self, user_query):
         """Perform an AI-guided web search"""
+        if self.parallel_search:
+            return await self.aai_search_parallel(user_query)
+
         self._debug_print("GENERATING SEARCH QUERY...")
-        search_query = self.query_generator(user_query)
+        search_query = await self.aquery_generator(user_query)
 
         if search_query and search_query[0] == '"' and search_query[-1] == '"':
             search_query = search_query[1:-1]
 
-        search_results = self.duckduckgo_search(search_query)
+        search_results = await self.aduckduckgo_search(search_query)
         self._debug_print(f"SEARCH RESULTS: {search_results}")
         context_found = False
 
         while not context_found and len(search_results) > 0:
-            best_result = self.best_search_results(search_results, search_query, user_query)
+            best_result = await self.abest_search_results(search_results, search_query, user_query)
             
             # Convert the result to an integer and handle invalid responses
             try:
@@ -215,9 +191,9 @@ class ScriptGenerator:
                 search_results.pop(best_result)  # Remove the invalid result
                 continue
             
-            page_content = self.scrape_webpage(page_link)
+            page_content = await self.ascrape_webpage(page_link)
             
-            if page_content and self.contains_data_needed(page_content, search_query, user_query):
+            if page_content and await self.acontains_data_needed(page_content, search_query, user_query):
                 context_found = True
                 return page_content
             else:   
@@ -226,7 +202,102 @@ class ScriptGenerator:
 
         return None
 
-    def generate_response(self, user_query, context=None):
+    async def aai_search_parallel(self, user_query):
+        """
+        Perform an AI-guided web search, scraping and verifying all results at once.
+
+        Every search result is fetched concurrently (at most
+        `max_fetches_per_host` at a time per host) and checked with
+        contains_data_needed as soon as it arrives, while a single
+        best_search_results call ranks the candidates. The ranked pick is
+        returned if it passes verification, otherwise the highest listed
+        result that passed. The answer is returned as soon as no pending
+        fetch can change it, and the remaining work is cancelled.
+        """
+        self._debug_print("GENERATING SEARCH QUERY...")
+        search_query = await self.aquery_generator(user_query)
+
+        if search_query and search_query[0] == '"' and search_query[-1] == '"':
+            search_query = search_query[1:-1]
+
+        search_results = await self.aduckduckgo_search(search_query)
+        self._debug_print(f"SEARCH RESULTS: {search_results}")
+        if not search_results:
+            return None
+
+        host_limits = {}
+
+        async def fetch_and_verify(result):
+            host = urlparse(result['link']).netloc
+            if host not in host_limits:
+                host_limits[host] = asyncio.Semaphore(self.max_fetches_per_host)
+            async with host_limits[host]:
+                page_content = await self.ascrape_webpage(result['link'])
+            if not page_content:
+                return None, False
+            try:
+                verified = await self.acontains_data_needed(page_content, search_query, user_query)
+            except Exception as e:
+                self._debug_print(f"Error verifying {result['link']}: {str(e)}")
+                verified = False
+            return page_content, verified
+
+        async def rank():
+            try:
+                return int(await self.abest_search_results(search_results, search_query, user_query))
+            except Exception as e:
+                self._debug_print(f"Ranking failed, falling back to search order: {str(e)}")
+                return -1
+
+        rank_task = asyncio.ensure_future(rank())
+        fetch_tasks = [asyncio.ensure_future(fetch_and_verify(result)) for result in search_results]
+        index_of = {task: index for index, task in enumerate(fetch_tasks)}
+        candidates = [None] * len(fetch_tasks)
+        best_result = None
+
+        def pick():
+            """The winning page, None if nothing can win, or _UNDECIDED while it depends on pending work"""
+            if best_result is None:
+                return _UNDECIDED
+            if 0 <= best_result < len(candidates):
+                if candidates[best_result] is None:
+                    return _UNDECIDED
+                if candidates[best_result][1]:
+                    return candidates[best_result][0]
+            # The ranked pick failed: the highest listed verified result wins
+            for candidate in candidates:
+                if candidate is None:
+                    return _UNDECIDED
+                if candidate[1]:
+                    return candidate[0]
+            return None
+
+        pending = {rank_task, *fetch_tasks}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task is rank_task:
+                        best_result = task.result()
+                    else:
+                        candidates[index_of[task]] = task.result()
+                choice = pick()
+                if choice is not _UNDECIDED:
+                    break
+        finally:
+            # Fetches and checks that can no longer change the answer
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if choice is None:
+            self._debug_print("NO SEARCH RESULT CONTAINED THE DATA NEEDED.")
+        elif pending:
+            self._debug_print(f"Picked a verified result; cancelled {len(pending)} remaining fetches and checks")
+        return choice
+
+    async def agenerate_response(self, user_query, context=None):
         """Generate a response to the user query, optionally with context"""
         if context:
             PROMPT = f"""
@@ -235,34 +306,225 @@ class ScriptGenerator:
                 CONTEXT: {context}
                 USER TOPIC: {user_query}
             """
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash", contents=PROMPT,
-            )
+            response = await self._generate(PROMPT, "generate_response", store_if=is_usable_script)
         else:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash", contents=user_query,
-            )
+            response = await self._generate(user_query, "generate_response", store_if=is_usable_script)
 
         self._debug_print(f"Response: {response.text}")
         return response
     
-    def process_query(self, user_query):
+    async def aresearch(self, user_query):
         """
-        Process a user query and return the generated response
-        This is the main API method that handles the entire workflow
+        Research a topic and write its script.
+
+        Returns:
+            tuple: (response, context), where context is the web content the
+            script is based on (None if no search was needed) and response is
+            None if no relevant context was found.
         """
-        if self.search_or_not(user_query):
-            context = self.ai_search(user_query)
+        if await self.asearch_or_not(user_query):
+            context = await self.aai_search(user_query)
             if context:
-                return self.generate_response(user_query, context)
+                return await self.agenerate_response(user_query, context), context
             else:
                 self._debug_print("No relevant context found.")
-                return None
+                return None, None
         else:
             self._debug_print("No search needed for this query.")
-            return self.generate_response(f"""
+            return await self.agenerate_response(f"""
                 {system_prompts.CONTENT_GENERATOR_WITHOUT_CONTEXT_MSG}
-                                          {user_query}""")
+                                          {user_query}"""), None
+
+    async def aprocess_query(self, user_query):
+        """
+        Process a user query and return the generated response
+        This is the main API coroutine that handles the entire workflow
+        """
+        response, _ = await self.aresearch(user_query)
+        return response
+
+    async def aprocess_many(self, user_queries, concurrency=None):
+        """
+        Process several queries concurrently on the running event loop.
+
+        Args:
+            user_queries (list): Topics to research and script.
+            concurrency (int): Optional cap on queries in flight at once.
+
+        Returns:
+            list: One response (or None) per query, in input order. A query
+            that raised is reported as None rather than failing the batch.
+        """
+        semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+
+        async def _one(query):
+            try:
+                if semaphore is None:
+                    return await self.aprocess_query(query)
+                async with semaphore:
+                    return await self.aprocess_query(query)
+            except Exception as e:
+                self._debug_print(f"Failed to process '{query}': {str(e)}")
+                return None
+
+        return await asyncio.gather(*(_one(query) for query in user_queries))
+
+    async def aprocess_first(self, user_queries, on_result=None, keep_running=False):
+        """
+        Research several queries at once and return as soon as one succeeds.
+
+        Args:
+            user_queries (list): Candidate topics.
+            on_result (callable): Called as on_result(index, response) for every
+                other query once it finishes; response is None if it failed.
+            keep_running (bool): Let the other queries finish after the first
+                success (reporting them to on_result) instead of cancelling them.
+
+        Returns:
+            tuple: (index, response) of the first successful query, or
+            (None, None) if every query failed.
+        """
+        def succeeded(task):
+            return task.exception() is None and task.result() is not None
+
+        def report(task):
+            if task.cancelled():
+                return
+            if task.exception() is not None:
+                self._debug_print(f"Failed to process '{user_queries[tasks[task]]}': {str(task.exception())}")
+            if on_result is None:
+                return
+            try:
+                on_result(tasks[task], task.result() if succeeded(task) else None)
+            except Exception as e:
+                print(f"Error handling the result of '{user_queries[tasks[task]]}': {str(e)}")
+
+        tasks = {asyncio.ensure_future(self.aprocess_query(query)): index
+                 for index, query in enumerate(user_queries)}
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in sorted(done, key=tasks.get) if succeeded(task)), None)
+            for task in done:
+                if task is not winner:
+                    report(task)
+            if winner is not None:
+                for task in pending:
+                    if keep_running:
+                        task.add_done_callback(report)
+                    else:
+                        task.cancel()
+                return tasks[winner], winner.result()
+        return None, None
+
+
+class ScriptGenerator:
+    """
+    Synchronous facade over AsyncScriptGenerator.
+
+    Coroutines are executed on a private event loop running in a daemon
+    thread, so the blocking API can be used from plain scripts (and from
+    several threads at once) without owning an event loop.
+    """
+    def __init__(self, api_key=None, cache=None, parallel_search=False, search_backend=None):
+        """
+        Initialize the ScriptGenerator class with Google API key
+        If no API key is provided, it will attempt to load from environment variables
+        `cache` is an LLMCache; None uses the shared default, False disables caching
+        `parallel_search` scrapes and verifies all search results concurrently
+        `search_backend` is a SearchBackend; None uses the shared default from SEARCH_BACKENDS
+        """
+        self.async_generator = AsyncScriptGenerator(api_key=api_key, cache=cache, parallel_search=parallel_search,
+                                                    search_backend=search_backend)
+        self.api_key = self.async_generator.api_key
+        self.client = self.async_generator.client
+        self.cache = self.async_generator.cache
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    @property
+    def debug(self):
+        return self.async_generator.debug
+    
+    def set_debug(self, debug=True):
+        """Enable or disable debug printing"""
+        self.async_generator.set_debug(debug)
+    
+    def set_parallel_search(self, parallel_search=True):
+        """Enable or disable concurrent scraping and verification of search results"""
+        self.async_generator.set_parallel_search(parallel_search)
+    
+    def _debug_print(self, message):
+        """Print debug messages if debug mode is enabled"""
+        self.async_generator._debug_print(message)
+
+    def _run(self, coro):
+        """Run a coroutine on the background loop and wait for its result"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="script-generator-loop", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+    
+    def search_or_not(self, user_query):
+        """Determine if the query requires web search"""
+        return self._run(self.async_generator.asearch_or_not(user_query))
+    
+    def query_generator(self, user_query):
+        """Generate an optimized search query from user input"""
+        return self._run(self.async_generator.aquery_generator(user_query))
+
+    def duckduckgo_search(self, query):
+        """Search the web through the configured backend and extract results"""
+        return self.async_generator.search_backend.search(query)
+    
+    def best_search_results(self, s_results, query, user_prompt):
+        """Determine the most relevant search result"""
+        return self._run(self.async_generator.abest_search_results(s_results, query, user_prompt))
+
+    def scrape_webpage(self, url):
+        """Extract content from a webpage"""
+        try:
+            return scrape_webpage(url)
+        except Exception as e:
+            self._debug_print(f"Error scraping webpage: {str(e)}")
+            return None
+        
+    def contains_data_needed(self, search_content, query, user_prompt):
+        """Check if the scraped content contains the information needed"""
+        return self._run(self.async_generator.acontains_data_needed(search_content, query, user_prompt))
+        
+    def ai_search(self, user_query):
+        """Perform an AI-guided web search"""
+        return self._run(self.async_generator.aai_search(user_query))
+
+    def generate_response(self, user_query, context=None):
+        """Generate a response to the user query, optionally with context"""
+        return self._run(self.async_generator.agenerate_response(user_query, context))
+    
+    def process_query(self, user_query):
+        """
+        Process a user query and return the generated response
+        This is the main API method that handles the entire workflow
+        """
+        return self._run(self.async_generator.aprocess_query(user_query))
+
+    def research(self, user_query):
+        """Research a topic and return (response, context); see AsyncScriptGenerator.aresearch"""
+        return self._run(self.async_generator.aresearch(user_query))
+
+    def process_many(self, user_queries, concurrency=None):
+        """
+        Process several queries concurrently and return their responses in order.
+        """
+        return self._run(self.async_generator.aprocess_many(user_queries, concurrency))
+
+    def process_first(self, user_queries, on_result=None, keep_running=False):
+        """
+        Process several queries concurrently and return (index, response) of the
+        first that succeeds; see AsyncScriptGenerator.aprocess_first.
+        """
+        return self._run(self.async_generator.aprocess_first(user_queries, on_result, keep_running))
 
 
 def main():
@@ -0,0 +1,256 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import bs4 as beautifulsoup
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.'
+DEFAULT_SEARCH_TTL = 6 * 3600
+DEFAULT_SEARCH_CACHE_ENTRIES = 1000
+MAX_RESULTS = 5
+
+
+def make_session(pool_size=10, proxies=None):
+    """
+    Create a keep-alive requests session with a connection pool sized for
+    concurrent searches.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({'User-Agent': USER_AGENT})
+    if proxies is not None:
+        session.proxies.update(proxies)
+        # Explicit proxy settings must not be overridden by environment proxies
+        session.trust_env = False
+    return session
+
+
+def normalize_query(query):
+    """Lower-case and collapse whitespace so equivalent queries share a cache entry"""
+    return " ".join(query.lower().split())
+
+
+class SearchBackend:
+    """
+    Interface for web search providers.
+
+    `search` returns a list of dicts with the keys `id`, `link` and
+    `search_description`, the shape consumed by best_search_results.
+    """
+    name = "base"
+
+    def search(self, query):
+        raise NotImplementedError
+
+
+class DuckDuckGoBackend(SearchBackend):
+    """Scrapes DuckDuckGo's HTML endpoint over a pooled session"""
+    name = "duckduckgo"
+
+    def __init__(self, session=None, max_results=MAX_RESULTS, timeout=10):
+        self.session = session or make_session()
+        self.max_results = max_results
+        self.timeout = timeout
+
+    def search(self, query):
+        """Perform a DuckDuckGo search and extract results"""
+        response = self.session.get('https://duckduckgo.com/html/', params={'q': query}, timeout=self.timeout)
+        response.raise_for_status()
+
+        soup = beautifulsoup.BeautifulSoup(response.text, 'html.parser')
+        results = []
+        for i, result in enumerate(soup.find_all('div', class_ = 'result'), start=1):
+            if i > self.max_results:
+                break
+            title = result.find('a', class_='result__a')
+            if not title:
+                continue
+
+            link = title['href']
+            snippet_tag = result.find('a', class_='result__snippet')
+            snippet = snippet_tag.text.strip() if snippet_tag else 'No description available'
+
+            results.append({
+                'id': i,
+                'link': link,
+                'search_description': snippet
+            })
+        return results
+
+
+class SearxNGBackend(SearchBackend):
+    """Queries a (usually local) SearxNG instance and parses its HTML results"""
+    name = "searxng"
+
+    def __init__(self, base_url=None, session=None, max_results=MAX_RESULTS, timeout=10):
+        self.base_url = base_url or os.getenv("SEARXNG_URL", "http://localhost:4000")
+        # A local instance must not be reached through the system proxy
+        self.session = session or make_session(proxies={'http': None, 'https': None})
+        self.max_results = max_results
+        self.timeout = timeout
+
+    def search(self, query):
+        """Perform a SearxNG search and extract results"""
+        params = {
+            'q': query,
+            'format': 'html'  # Explicitly request HTML format
+        }
+        response = self.session.get(f"{self.base_url}/search", params=params, timeout=self.timeout)
+        response.raise_for_status()
+
+        soup = beautifulsoup.BeautifulSoup(response.text, 'html.parser')
+        results = []
+
+        # Use a CSS selector to get all articles with class "result"
+        articles = soup.select('article.result')
+        for i, article in enumerate(articles, start=1):
+            if i > self.max_results:
+                break
+            # Get the URL from the <a> with class "url_header"
+            link_tag = article.find('a', class_='url_header')
+            if not link_tag:
+                continue
+            link = link_tag.get('href', 'No URL found')
+
+            # Get the snippet from the <p> with class "content"
+            snippet_tag = article.find('p', class_='content')
+            snippet = snippet_tag.get_text(strip=True) if snippet_tag else 'No description available'
+
+            results.append({
+                'id': i,
+                'link': link,
+                'search_description': snippet
+            })
+
+        return results
+
+
+class FixtureBackend(SearchBackend):
+    """
+    Offline backend answering from canned results, for tests and load runs.
+
+    `fixtures` maps a query (normalized on lookup) to its result list, or is
+    the path of a JSON file with that mapping. Queries without a fixture get
+    `default` results. `delay` simulates network latency in seconds.
+    """
+    name = "fixture"
+
+    def __init__(self, fixtures=None, default=None, delay=0):
+        if isinstance(fixtures, str):
+            with open(fixtures, 'r') as file:
+                fixtures = json.load(file)
+        self.fixtures = {normalize_query(query): results for query, results in (fixtures or {}).items()}
+        self.default = default or []
+        self.delay = delay
+        self.calls = 0
+
+    def search(self, query):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return copy.deepcopy(self.fixtures.get(normalize_query(query), self.default))
+
+
+class CachedSearch(SearchBackend):
+    """
+    Wraps a backend with an in-process normalized-query -> results cache.
+    Empty result lists are not cached so a throttled provider is retried.
+    At most `max_entries` queries are kept, least recently used evicted
+    first; expired entries are dropped when they are looked up.
+    """
+    def __init__(self, backend, ttl=DEFAULT_SEARCH_TTL, max_entries=DEFAULT_SEARCH_CACHE_ENTRIES):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.name = f"cached({backend.name})"
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def search(self, query):
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                return copy.deepcopy(entry[1])
+            if entry:
+                del self._entries[key]
+
+        results = self.backend.search(query)
+        if results:
+            with self._lock:
+                self._entries[key] = (now + self.ttl, copy.deepcopy(results))
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FanOutSearch(SearchBackend):
+    """
+    Sends a query to several backends at once and returns the first
+    non-empty answer, so one slow or throttling provider does not stall
+    the research stage.
+    """
+    def __init__(self, backends):
+        if not backends:
+            raise ValueError("FanOutSearch needs at least one backend.")
+        self.backends = list(backends)
+        self.name = "fanout(" + ",".join(backend.name for backend in self.backends) + ")"
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(self.backends), thread_name_prefix="search")
+
+    def search(self, query):
+        futures = {self._executor.submit(backend.search, query): backend for backend in self.backends}
+        errors = []
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                errors.append(f"{futures[future].name}: {str(e)}")
+                continue
+            if results:
+                for other in futures:
+                    other.cancel()
+                return results
+        if errors and len(errors) == len(self.backends):
+            raise RuntimeError(f"All search backends failed: {'; '.join(errors)}")
+        return []
+
+
+BACKENDS = {
+    DuckDuckGoBackend.name: DuckDuckGoBackend,
+    SearxNGBackend.name: SearxNGBackend,
+}
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+
+def get_default_backend():
+    """
+    Build the process-wide search backend from SEARCH_BACKENDS, a comma
+    separated list of backend names (default "duckduckgo"). Several names
+    fan out concurrently; the result is always wrapped in a CachedSearch.
+    """
+    global _default_backend
+    with _default_backend_lock:
+        if _default_backend is None:
+            names = [name.strip() for name in os.getenv("SEARCH_BACKENDS", "duckduckgo").split(",") if name.strip()]
+            backends = [BACKENDS[name]() for name in names]
+            backend = backends[0] if len(backends) == 1 else FanOutSearch(backends)
+            _default_backend = CachedSearch(backend, ttl=int(os.getenv("SEARCH_CACHE_TTL", DEFAULT_SEARCH_TTL)),
+                                            max_entries=int(os.getenv("SEARCH_CACHE_ENTRIES",
+                                                                      DEFAULT_SEARCH_CACHE_ENTRIES)))
+        return _default_backend
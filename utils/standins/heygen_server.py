@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import uvicorn
+import requests
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import Response
+from typing import Optional
+from utils.render_webhook import sign_body, HEYGEN_SIGNATURE_HEADER
+from utils.standins.render_simulator import (
+    RenderSimulator, ranged_response_args, add_common_arguments, QUEUED, PROCESSING, SUCCESS, FAILED,
+)
+
+# Simulator states mapped to v1/video_status.get states
+HEYGEN_STATUS = {QUEUED: "pending", PROCESSING: "processing", SUCCESS: "completed", FAILED: "failed"}
+
+
+def notify_heygen(job):
+    """
+    POST an avatar_video.success/fail event in HeyGen's webhook shape, signed
+    with HEYGEN_WEBHOOK_SECRET like the endpoint secret of a real HeyGen account.
+    """
+    if job["status"] == SUCCESS:
+        payload = {
+            "event_type": "avatar_video.success",
+            "event_data": {"video_id": job["id"], "url": job["request"]["video_url"]},
+        }
+    else:
+        payload = {
+            "event_type": "avatar_video.fail",
+            "event_data": {"video_id": job["id"], "msg": job["error"]},
+        }
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    secret = os.getenv("HEYGEN_WEBHOOK_SECRET")
+    if secret:
+        headers[HEYGEN_SIGNATURE_HEADER] = sign_body(secret, body)
+    requests.post(job["callback_url"], data=body, headers=headers, proxies={'http': None, 'https': None},
+                  timeout=10)
+
+
+def create_app(simulator=None):
+    """
+    Build a FastAPI app implementing the HeyGen endpoints used by utils.HeyGenClient.
+    Any non-empty X-Api-Key is accepted.
+    """
+    simulator = simulator or RenderSimulator(notify=notify_heygen)
+    if simulator.notify is None:
+        simulator.notify = notify_heygen
+    app = FastAPI(title="HeyGen stand-in")
+    app.state.simulator = simulator
+
+    def check_key(api_key):
+        if not api_key:
+            raise HTTPException(status_code=401, detail="Missing X-Api-Key")
+
+    @app.post("/v2/video/generate")
+    def generate_video(payload: dict, request: Request, x_api_key: Optional[str] = Header(default=None)):
+        check_key(x_api_key)
+        video_inputs = payload.get("video_inputs") or []
+        if not video_inputs:
+            return {"error": {"code": "invalid_parameter", "message": "video_inputs is required"}, "data": None}
+        job_id = simulator.submit(payload, callback_url=payload.get("callback_url"))
+        # The download URL is fixed at submit time so the callback can report it
+        simulator.jobs[job_id]["request"]["video_url"] = f"{str(request.base_url).rstrip('/')}/files/{job_id}.mp4"
+        return {"error": None, "data": {"video_id": job_id}}
+
+    @app.get("/v1/video_status.get")
+    def video_status(video_id: str, x_api_key: Optional[str] = Header(default=None)):
+        check_key(x_api_key)
+        job = simulator.status(video_id)
+        if job is None:
+            return {"code": 40001, "message": "Video not found", "data": None}
+        status = HEYGEN_STATUS[job["status"]]
+        return {
+            "code": 100,
+            "message": "Success",
+            "data": {
+                "id": video_id,
+                "status": status,
+                "video_url": job["request"]["video_url"] if status == "completed" else None,
+                "error": job["error"],
+            },
+        }
+
+    @app.get("/files/{video_id}.mp4")
+    def download(video_id: str, range: Optional[str] = Header(default=None)):
+        job = simulator.status(video_id)
+        if job is None or job["status"] != SUCCESS:
+            raise HTTPException(status_code=404, detail="Video not available")
+        status_code, body, headers = ranged_response_args(simulator.payload(), range)
+        return Response(content=body, status_code=status_code, headers=headers)
+
+    @app.get("/stats")
+    def stats():
+        return simulator.stats
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local HeyGen stand-in server.")
+    add_common_arguments(parser, default_port=8001)
+    args = parser.parse_args()
+    simulator = RenderSimulator(
+        latency=tuple(args.latency), failure_rate=args.failure_rate, concurrency=args.concurrency,
+        payload_bytes=int(args.payload_mb * 1024 * 1024), seed=args.seed,
+    )
+    uvicorn.run(create_app(simulator), host=args.host, port=args.port, log_level="warning")
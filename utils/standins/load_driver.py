@@ -0,0 +1,93 @@
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.HeyGenClient import HeyGenClient
+from utils.musetalk_pool import MuseTalkPool
+
+SAMPLE_SCRIPT = (
+    "Imagine driving 500 miles on a single charge. Tesla has unveiled the Model Z, "
+    "their latest electric vehicle, with a starting price of 35,000 dollars. "
+    "Launching in late 2024, it combines affordability with innovation."
+)
+
+
+def run_heygen_job(client, output_dir, index):
+    output_path = os.path.join(output_dir, f"heygen_{index}.mp4")
+    client.generate_and_download_video(input_text=SAMPLE_SCRIPT, output_path=output_path)
+    return os.path.getsize(output_path)
+
+
+def run_musetalk_job(pool, output_dir, index):
+    output_path = os.path.join(output_dir, f"musetalk_{index}.mp4")
+    if not pool.create_video(SAMPLE_SCRIPT, output_path, "sample9.mp4", "Female"):
+        raise Exception(f"MuseTalk job {index} failed")
+    return os.path.getsize(output_path)
+
+
+def run_load(backend, urls, jobs, concurrency, capacity=1):
+    """
+    Push `jobs` renders through the real client code against stand-in servers.
+
+    Returns:
+        dict: Throughput and latency summary.
+    """
+    output_dir = tempfile.mkdtemp(prefix="load_")
+    # Every job renders the same script; the render store would turn all but
+    # the first into a restore of that one video
+    if backend == "heygen":
+        client = HeyGenClient(api_key="stand-in", base_url=urls[0], render_store=False)
+        run_job = lambda index: run_heygen_job(client, output_dir, index)
+    else:
+        pool = MuseTalkPool(urls, capacity=capacity, render_store=False)
+        run_job = lambda index: run_musetalk_job(pool, output_dir, index)
+
+    def timed(index):
+        start = time.monotonic()
+        size = run_job(index)
+        return time.monotonic() - start, size
+
+    latencies = []
+    failures = 0
+    total_bytes = 0
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(timed, index) for index in range(jobs)]
+        for future in as_completed(futures):
+            try:
+                latency, size = future.result()
+                latencies.append(latency)
+                total_bytes += size
+            except Exception as e:
+                failures += 1
+                print(f"Job failed: {str(e)}")
+    elapsed = time.monotonic() - started
+
+    return {
+        "backend": backend,
+        "jobs": jobs,
+        "succeeded": len(latencies),
+        "failed": failures,
+        "elapsed_s": round(elapsed, 2),
+        "videos_per_min": round(60 * len(latencies) / elapsed, 2) if elapsed else 0,
+        "mean_latency_s": round(statistics.mean(latencies), 2) if latencies else None,
+        "max_latency_s": round(max(latencies), 2) if latencies else None,
+        "downloaded_mb": round(total_bytes / (1024 * 1024), 2),
+        "output_dir": output_dir,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure render pipeline throughput against stand-in servers.")
+    parser.add_argument("--backend", choices=["heygen", "musetalk"], default="heygen")
+    parser.add_argument("--url", nargs="+", default=["http://127.0.0.1:8001"], help="Stand-in server URL(s).")
+    parser.add_argument("--jobs", type=int, default=20, help="Number of renders to run.")
+    parser.add_argument("--concurrency", type=int, default=5, help="Renders driven at the same time.")
+    parser.add_argument("--capacity", type=int, default=1, help="Per-server capacity for the MuseTalk pool.")
+    args = parser.parse_args()
+
+    summary = run_load(args.backend, args.url, args.jobs, args.concurrency, args.capacity)
+    for key, value in summary.items():
+        print(f"{key}: {value}")
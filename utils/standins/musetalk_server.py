@@ -0,0 +1,82 @@
+import argparse
+import uvicorn
+import requests
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+from typing import Optional
+from utils.standins.render_simulator import RenderSimulator, ranged_response_args, add_common_arguments, SUCCESS, FAILED
+
+SPEAKERS = ["sample1.mp4", "sample5.mp4", "sample9.mp4"]
+
+
+class GenerateVideoRequest(BaseModel):
+    text: str
+    gender: str
+    video_path: str
+    callback_url: Optional[str] = None
+    callback_token: Optional[str] = None
+
+
+def notify_musetalk(job):
+    """POST a completion callback in the shape RenderWebhookServer expects"""
+    payload = {"job_id": job["id"], "status": job["status"]}
+    token = job["request"].get("callback_token")
+    headers = {"Authorization": f"Bearer {token}"} if token else None
+    requests.post(job["callback_url"], json=payload, headers=headers, proxies={'http': None, 'https': None},
+                  timeout=10)
+
+
+def create_app(simulator=None):
+    """
+    Build a FastAPI app implementing the MuseTalk API used by utils.Musetalk.
+    """
+    simulator = simulator or RenderSimulator(notify=notify_musetalk)
+    if simulator.notify is None:
+        simulator.notify = notify_musetalk
+    app = FastAPI(title="MuseTalk stand-in")
+    app.state.simulator = simulator
+
+    @app.get("/speakers")
+    def speakers():
+        return SPEAKERS
+
+    @app.post("/generate_video")
+    def generate_video(request: GenerateVideoRequest):
+        job_id = simulator.submit(request.dict(), callback_url=request.callback_url)
+        return {"job_id": job_id}
+
+    @app.get("/job-status/{job_id}")
+    def job_status(job_id: str):
+        job = simulator.status(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        body = {"job_id": job_id, "status": job["status"]}
+        if job["status"] == FAILED:
+            body["error"] = job["error"]
+        return body
+
+    @app.get("/download-video/{job_id}")
+    def download_video(job_id: str, range: Optional[str] = Header(default=None)):
+        job = simulator.status(job_id)
+        if job is None or job["status"] != SUCCESS:
+            raise HTTPException(status_code=404, detail="Video not available")
+        status_code, body, headers = ranged_response_args(simulator.payload(), range)
+        return Response(content=body, status_code=status_code, headers=headers)
+
+    @app.get("/stats")
+    def stats():
+        return simulator.stats
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local MuseTalk stand-in server.")
+    add_common_arguments(parser, default_port=7860)
+    args = parser.parse_args()
+    simulator = RenderSimulator(
+        latency=tuple(args.latency), failure_rate=args.failure_rate, concurrency=args.concurrency,
+        payload_bytes=int(args.payload_mb * 1024 * 1024), seed=args.seed,
+    )
+    uvicorn.run(create_app(simulator), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,164 @@
+import random
+import threading
+import time
+import uuid
+from collections import deque
+import requests
+
+QUEUED = "queued"
+PROCESSING = "processing"
+SUCCESS = "success"
+FAILED = "failed"
+
+
+def synthetic_mp4(size):
+    """
+    Build `size` bytes that start like an mp4 (an ftyp box) followed by an
+    mdat box of filler. Good enough for download and upload plumbing, not playable.
+    """
+    ftyp = b"\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2"
+    mdat_size = max(size - len(ftyp), 8)
+    header = mdat_size.to_bytes(4, "big") + b"mdat"
+    filler = bytes(range(256)) * (mdat_size // 256 + 1)
+    return (ftyp + header + filler)[:max(size, len(ftyp) + 8)]
+
+
+class RenderSimulator:
+    """
+    Fake render farm shared by the HeyGen and MuseTalk stand-in servers.
+
+    Jobs wait in a FIFO queue until one of `concurrency` render slots is
+    free, then take a random time within `latency` seconds and fail with
+    probability `failure_rate`. When a job finishes and has a callback URL,
+    `notify(job)` is called so the server can POST a provider-shaped callback.
+    """
+    def __init__(self, latency=(5.0, 10.0), failure_rate=0.0, concurrency=2, payload_bytes=1024 * 1024,
+                 notify=None, seed=None):
+        """
+        Args:
+            latency (tuple): (min, max) render seconds.
+            failure_rate (float): Probability that a render fails.
+            concurrency (int): Renders processed at the same time.
+            payload_bytes (int): Size of the synthetic mp4 served for each job.
+            notify (callable): Called with the job dict when a job with a callback URL finishes.
+            seed (int): Seed for reproducible latencies and failures.
+        """
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.concurrency = concurrency
+        self.payload_bytes = payload_bytes
+        self.notify = notify
+        self.jobs = {}
+        self._queue = deque()
+        self._running = set()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._payload = None
+        self.stats = {"submitted": 0, "succeeded": 0, "failed": 0, "status_checks": 0, "downloads": 0}
+        threading.Thread(target=self._run, name="render-simulator", daemon=True).start()
+
+    def submit(self, request, callback_url=None):
+        """Queue a job and return its ID"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self.jobs[job_id] = {
+                "id": job_id,
+                "status": QUEUED,
+                "request": request,
+                "callback_url": callback_url,
+                "created_at": time.time(),
+                "finish_at": None,
+                "error": None,
+            }
+            self._queue.append(job_id)
+            self.stats["submitted"] += 1
+        return job_id
+
+    def status(self, job_id):
+        """Return a copy of the job, or None if unknown"""
+        with self._lock:
+            self.stats["status_checks"] += 1
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def payload(self):
+        """The synthetic mp4 served for every finished job"""
+        if self._payload is None:
+            self._payload = synthetic_mp4(self.payload_bytes)
+        self.stats["downloads"] += 1
+        return self._payload
+
+    def _run(self):
+        while True:
+            finished = []
+            now = time.time()
+            with self._lock:
+                for job_id in list(self._running):
+                    job = self.jobs[job_id]
+                    if job["finish_at"] <= now:
+                        self._running.discard(job_id)
+                        if self._random.random() < self.failure_rate:
+                            job["status"] = FAILED
+                            job["error"] = "Simulated render failure"
+                            self.stats["failed"] += 1
+                        else:
+                            job["status"] = SUCCESS
+                            self.stats["succeeded"] += 1
+                        finished.append(dict(job))
+                while self._queue and len(self._running) < self.concurrency:
+                    job_id = self._queue.popleft()
+                    job = self.jobs[job_id]
+                    job["status"] = PROCESSING
+                    job["finish_at"] = now + self._random.uniform(*self.latency)
+                    self._running.add(job_id)
+            for job in finished:
+                if job["callback_url"] and self.notify:
+                    threading.Thread(target=self._notify, args=(job,), daemon=True).start()
+            time.sleep(0.1)
+
+    def _notify(self, job):
+        try:
+            self.notify(job)
+        except requests.exceptions.RequestException as e:
+            print(f"Callback for job {job['id']} failed: {str(e)}")
+
+
+def ranged_response_args(data, range_header):
+    """
+    Resolve an HTTP Range header against `data`.
+
+    Returns:
+        tuple: (status code, body bytes, extra headers)
+    """
+    headers = {"Accept-Ranges": "bytes", "Content-Type": "video/mp4"}
+    total = len(data)
+    if not range_header or not range_header.startswith("bytes="):
+        return 200, data, headers
+    start_text, _, end_text = range_header[len("bytes="):].partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else total - 1
+        else:
+            start = max(total - int(end_text), 0)
+            end = total - 1
+    except ValueError:
+        return 200, data, headers
+    if start >= total:
+        headers["Content-Range"] = f"bytes */{total}"
+        return 416, b"", headers
+    end = min(end, total - 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+    return 206, data[start:end + 1], headers
+
+
+def add_common_arguments(parser, default_port):
+    """Command line options shared by the stand-in servers"""
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument("--latency", type=float, nargs=2, default=[5.0, 10.0], metavar=("MIN", "MAX"),
+                        help="Render time range in seconds.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability that a render fails.")
+    parser.add_argument("--concurrency", type=int, default=2, help="Renders processed at the same time.")
+    parser.add_argument("--payload-mb", type=float, default=1.0, help="Size of the synthetic mp4 in MiB.")
+    parser.add_argument("--seed", type=int, default=None)
@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaUpload
+from utils.uploadToYoutube.uploadToYoutube import (
+    build_video_body, get_authenticated_service, probe_upload_session, run_resumable_upload,
+    MAX_UPLOAD_RETRIES,
+)
+
+DEFAULT_BUFFER_BYTES = 64 * 1024 * 1024
+# Resumable upload chunks must be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = 32 * 256 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class RingBuffer:
+    """
+    Bounded, thread-safe byte pipe between one producer and one consumer.
+
+    The writer blocks while the buffer is full and the reader blocks until
+    enough data has arrived or the writer closed the buffer, so memory use
+    stays at `capacity` regardless of the file size.
+    """
+    def __init__(self, capacity=DEFAULT_BUFFER_BYTES):
+        self.capacity = capacity
+        self._buffer = bytearray()
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            with self._condition:
+                while len(self._buffer) >= self.capacity and self._error is None:
+                    self._condition.wait()
+                if self._error is not None:
+                    raise self._error
+                room = self.capacity - len(self._buffer)
+                self._buffer += view[:room]
+                view = view[room:]
+                self._condition.notify_all()
+
+    def read(self, size):
+        """Return up to `size` bytes; fewer only once the writer has closed or the buffer is full"""
+        with self._condition:
+            wanted = min(size, self.capacity)
+            while len(self._buffer) < wanted and not self._closed and self._error is None:
+                self._condition.wait()
+            if self._error is not None:
+                raise self._error
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            self._condition.notify_all()
+            return data
+
+    def close(self):
+        """Signal end of stream"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def set_error(self, error):
+        """Abort both sides with `error`"""
+        with self._condition:
+            self._error = error
+            self._condition.notify_all()
+
+
+class StreamingMediaUpload(MediaUpload):
+    """
+    Resumable media body read from a RingBuffer instead of a file.
+
+    The total size is reported as unknown until the end of the stream is
+    in sight: `size()` reads up to two chunks ahead, so the request carrying
+    the last bytes already states the total and the server can finalize the
+    upload even when the file ends exactly on a chunk boundary. The bytes of
+    the current chunk are kept until the server confirms them, so a
+    partially accepted chunk can be re-sent, but the stream cannot rewind
+    further than that. An upload resumed in a later run starts the stream
+    at the server's confirmed `offset`.
+    """
+    def __init__(self, ring, mimetype="video/*", chunksize=UPLOAD_CHUNK_SIZE, offset=0):
+        super().__init__()
+        self._ring = ring
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self._window = bytearray()
+        self._window_start = offset
+        self._eof = False
+
+    def _fill(self, target):
+        """Read from the ring until the window holds `target` bytes or the stream ends"""
+        while len(self._window) < target and not self._eof:
+            data = self._ring.read(min(READ_CHUNK_SIZE, target - len(self._window)))
+            if not data:
+                self._eof = True
+            self._window += data
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        # The next chunk starts at most one chunk past the window start
+        self._fill(2 * self._chunksize + 1)
+        return self._window_start + len(self._window) if self._eof else None
+
+    def resumable(self):
+        return True
+
+    def has_stream(self):
+        return False
+
+    def getbytes(self, begin, length):
+        if begin < self._window_start:
+            raise ValueError(f"Cannot rewind stream to byte {begin}; oldest retained byte is {self._window_start}")
+        # Everything before `begin` has been acknowledged by the server
+        del self._window[:begin - self._window_start]
+        self._window_start = begin
+        self._fill(length)
+        return bytes(self._window[:length])
+
+    def to_json(self):
+        """
+        Serialize everything but the buffered bytes; a restored upload is fed
+        again from its source, starting at the first unconfirmed byte.
+        """
+        return self._to_json(strip=["_ring", "_window"])
+
+    @classmethod
+    def from_json(cls, s, ring=None):
+        data = json.loads(s)
+        return cls(ring or RingBuffer(), mimetype=data["_mimetype"], chunksize=data["_chunksize"],
+                   offset=data["_window_start"])
+
+
+def load_stream_state(state_path, source_url):
+    """
+    Return the saved upload session of a stream from `source_url`, or None if
+    there is none or it belongs to another source.
+    """
+    if not state_path or not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable stream state {state_path}: {str(e)}")
+        return None
+    if state.get("source_url") != source_url:
+        print(f"{state_path} belongs to another video; starting over")
+        clear_stream_state(state_path)
+        return None
+    return state
+
+
+def save_stream_state(state_path, resumable_uri, progress, source_url):
+    """Atomically record the upload session URI, confirmed offset and source URL"""
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({
+            "resumable_uri": resumable_uri,
+            "progress": progress,
+            "source_url": source_url,
+            "updated_at": time.time(),
+        }, f)
+    os.replace(tmp_path, state_path)
+
+
+def clear_stream_state(state_path):
+    if state_path and os.path.exists(state_path):
+        os.remove(state_path)
+
+
+def stream_download(url, ring, retain_path=None, session=None, chunk_size=READ_CHUNK_SIZE, timeout=60, offset=0):
+    """
+    Download `url` into `ring`, optionally keeping a local copy.
+
+    The local copy is written to `retain_path + ".part"` and renamed into
+    place only when the download completes. With `offset`, only the bytes
+    from there on are fed to the ring; they are fetched with a Range
+    request unless a local copy needs the whole file anyway.
+
+    Returns:
+        tuple: (bytes fed to the ring, sha256 hex digest of the bytes downloaded)
+    """
+    session = session or requests.Session()
+    hasher = hashlib.sha256()
+    received = 0
+    transferred = 0
+    headers = {"Range": f"bytes={offset}-"} if offset and not retain_path else None
+    local = open(retain_path + ".part", "wb", buffering=chunk_size) if retain_path else None
+    try:
+        with session.get(url, stream=True, timeout=timeout, headers=headers) as response:
+            response.raise_for_status()
+            # A server that ignores the Range header sends the whole file
+            skip = 0 if response.status_code == 206 else offset
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if not chunk:
+                    continue
+                hasher.update(chunk)
+                received += len(chunk)
+                if local:
+                    local.write(chunk)
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk = chunk[dropped:]
+                    skip -= dropped
+                if chunk:
+                    ring.write(chunk)
+                    transferred += len(chunk)
+        expected = response.headers.get("Content-Length")
+        if expected is not None and int(expected) != received:
+            raise IOError(f"Connection closed after {received} of {expected} bytes")
+        ring.close()
+    except Exception as e:
+        ring.set_error(e)
+        raise
+    finally:
+        if local:
+            local.close()
+    if retain_path:
+        os.replace(retain_path + ".part", retain_path)
+    return transferred, hasher.hexdigest()
+
+
+def stream_video_to_youtube(video_url, title, description, tags=None, privacy="public", retain_path=None,
+                            state_path=None, buffer_bytes=DEFAULT_BUFFER_BYTES, chunksize=UPLOAD_CHUNK_SIZE,
+                            youtube=None, max_retries=MAX_UPLOAD_RETRIES):
+    """
+    Upload a rendered video to YouTube while it is still downloading.
+
+    The download feeds a bounded in-memory ring buffer that the resumable
+    upload drains chunk by chunk, so nothing touches the disk unless
+    `retain_path` asks for a local copy. With `state_path`, the session URI,
+    confirmed offset and source URL are saved after every chunk; a later
+    call for the same URL asks YouTube how far the upload got and streams
+    the rest of the source from there.
+
+    Returns:
+        str: The YouTube video ID.
+    """
+    youtube = youtube or get_authenticated_service()
+    ring = RingBuffer(buffer_bytes)
+    media = StreamingMediaUpload(ring, chunksize=chunksize)
+    request = youtube.videos().insert(
+        part="snippet,status",
+        body=build_video_body(title, description, tags, privacy=privacy),
+        media_body=media,
+    )
+
+    offset = 0
+    state = load_stream_state(state_path, video_url)
+    if state:
+        try:
+            offset, response = probe_upload_session(request.http, state["resumable_uri"])
+        except HttpError as e:
+            if e.resp.status not in (404, 410):
+                raise
+            # Upload sessions expire after about a week
+            print("Saved upload session has expired; starting over")
+            clear_stream_state(state_path)
+        else:
+            if response is not None:
+                clear_stream_state(state_path)
+                print(f"Earlier streamed upload already finished as {response['id']}")
+                return response["id"]
+            print(f"Resuming streamed upload of {video_url} from byte {offset}")
+            request.resumable_uri = state["resumable_uri"]
+            request.resumable_progress = offset
+            media = StreamingMediaUpload(ring, chunksize=chunksize, offset=offset)
+            request.resumable = media
+
+    def save_progress():
+        if state_path and request.resumable_uri:
+            save_stream_state(state_path, request.resumable_uri, request.resumable_progress, video_url)
+
+    result = {}
+
+    def download():
+        try:
+            result["download"] = stream_download(video_url, ring, retain_path=retain_path, offset=offset)
+        except Exception as e:
+            result["error"] = e
+
+    downloader = threading.Thread(target=download, name="stream-download", daemon=True)
+    downloader.start()
+    try:
+        response = run_resumable_upload(request, max_retries=max_retries, on_progress=save_progress)
+    except Exception as e:
+        ring.set_error(e)
+        if isinstance(e, HttpError) and e.resp.status in (404, 410):
+            clear_stream_state(state_path)
+        raise
+    finally:
+        downloader.join()
+    if "error" in result:
+        raise result["error"]
+    clear_stream_state(state_path)
+    video_id = response["id"]
+    size, digest = result["download"]
+    print(f"Streamed {size} bytes from byte {offset} (downloaded sha256 {digest}) to YouTube video {video_id}")
+    return video_id
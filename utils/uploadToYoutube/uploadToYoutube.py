@@ -1,16 +1,48 @@
+import datetime
+import http.client
+import json
 import os
 import pickle
+import random
+import threading
+import time
 import google.auth.transport.requests
+import google_auth_httplib2
+import httplib2
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 
 # Step 1: Define scopes and file paths
 SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
 CLIENT_SECRET_FILE = "client_secret.json"
 CREDENTIALS_PICKLE_FILE = "token.pickle"
+# Refresh the access token this many seconds before it expires
+REFRESH_MARGIN = 300
+# Retry delay after a failed background refresh
+REFRESH_RETRY_DELAY = 60
+# Upload chunk size; resumable uploads need a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = int(os.getenv("YOUTUBE_UPLOAD_CHUNK_MB", "8")) * 1024 * 1024
+MAX_UPLOAD_RETRIES = int(os.getenv("YOUTUBE_UPLOAD_RETRIES", "10"))
+MAX_RETRY_DELAY = 64
+RETRIABLE_STATUS_CODES = {500, 502, 503, 504}
+RETRIABLE_EXCEPTIONS = (
+    httplib2.HttpLib2Error, IOError, http.client.NotConnected, http.client.IncompleteRead,
+    http.client.ImproperConnectionState, http.client.CannotSendRequest, http.client.CannotSendHeader,
+    http.client.ResponseNotReady, http.client.BadStatusLine,
+)
 
-def get_authenticated_service():
+_credentials = None
+_credentials_lock = threading.Lock()
+_refresh_timer = None
+_thread_local = threading.local()
+
+def _save_credentials(credentials):
+    with open(CREDENTIALS_PICKLE_FILE, "wb") as token:
+        pickle.dump(credentials, token)
+
+def _load_credentials():
     credentials = None
 
     # Step 2: Load credentials if they exist
@@ -26,16 +58,70 @@ def get_authenticated_service():
             flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_FILE, SCOPES)
             credentials = flow.run_local_server(port=0)
 
-        with open(CREDENTIALS_PICKLE_FILE, "wb") as token:
-            pickle.dump(credentials, token)
+        _save_credentials(credentials)
 
-    return build("youtube", "v3", credentials=credentials)
+    return credentials
 
-def upload_video(file_path, title, description, tags=None, category_id="22", privacy="public"):
-    youtube = get_authenticated_service()
+def _schedule_refresh(delay=None):
+    """Arm a daemon timer that refreshes the shared credentials shortly before they expire"""
+    global _refresh_timer
+    if _credentials is None or not _credentials.refresh_token:
+        return
+    if delay is None:
+        if _credentials.expiry is None:
+            return
+        # google-auth stores expiry as a naive UTC datetime
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        delay = max(0, (_credentials.expiry - now).total_seconds() - REFRESH_MARGIN)
+    if _refresh_timer is not None:
+        _refresh_timer.cancel()
+    _refresh_timer = threading.Timer(delay, _refresh_credentials)
+    _refresh_timer.daemon = True
+    _refresh_timer.start()
 
-    # Step 4: Define request body
-    body = {
+def _refresh_credentials():
+    with _credentials_lock:
+        try:
+            _credentials.refresh(google.auth.transport.requests.Request())
+            _save_credentials(_credentials)
+            print("Refreshed YouTube access token")
+            _schedule_refresh()
+        except Exception as e:
+            print(f"Background YouTube token refresh failed: {str(e)}")
+            _schedule_refresh(REFRESH_RETRY_DELAY)
+
+def get_credentials():
+    """
+    Return the process-wide YouTube credentials, loading them on first use.
+    They are refreshed in the background before they expire, so uploads
+    never wait on a token refresh.
+    """
+    global _credentials
+    with _credentials_lock:
+        if _credentials is None:
+            _credentials = _load_credentials()
+            _schedule_refresh()
+        return _credentials
+
+def get_authenticated_service():
+    """
+    Return a YouTube service for the calling thread.
+
+    The service is built once per thread from the discovery document bundled
+    with googleapiclient (no network fetch) and keeps its own authorized
+    HTTP transport, since httplib2 connections must not be shared between
+    threads. All threads share one set of credentials.
+    """
+    service = getattr(_thread_local, "service", None)
+    if service is None:
+        http = google_auth_httplib2.AuthorizedHttp(get_credentials(), http=httplib2.Http())
+        service = build("youtube", "v3", http=http, static_discovery=True, cache_discovery=False)
+        _thread_local.service = service
+    return service
+
+def build_video_body(title, description, tags=None, category_id="22", privacy="public"):
+    """Build the videos.insert request body; needs only the metadata, not the file"""
+    return {
         "snippet": {
             "title": title,
             "description": description,
@@ -47,24 +133,203 @@ def upload_video(file_path, title, description, tags=None, category_id="22", pri
         }
     }
 
-    # Step 5: Upload the video
-    media = MediaFileUpload(file_path, chunksize=-1, resumable=True, mimetype='video/*')
+def _upload_state_path(file_path):
+    return file_path + ".upload.json"
+
+def _file_fingerprint(file_path):
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+def load_upload_state(file_path):
+    """
+    Return the saved upload session of `file_path`, or None if there is none
+    or the file changed since it was saved.
+    """
+    state_path = _upload_state_path(file_path)
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable upload state {state_path}: {str(e)}")
+        return None
+    if state.get("file") != _file_fingerprint(file_path):
+        print(f"{file_path} changed since its upload started; starting over")
+        clear_upload_state(file_path)
+        return None
+    return state
+
+def save_upload_state(file_path, resumable_uri, progress):
+    """Atomically record the upload session URI and confirmed offset next to the file"""
+    state_path = _upload_state_path(file_path)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({
+            "resumable_uri": resumable_uri,
+            "progress": progress,
+            "file": _file_fingerprint(file_path),
+            "updated_at": time.time(),
+        }, f)
+    os.replace(tmp_path, state_path)
+
+def clear_upload_state(file_path):
+    if os.path.exists(_upload_state_path(file_path)):
+        os.remove(_upload_state_path(file_path))
+
+def _retry_delay(retry):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(MAX_RETRY_DELAY, 2 ** retry))
+
+def probe_upload_session(http, resumable_uri, total=None):
+    """
+    Ask the server how much of a resumable upload it holds, with an empty
+    PUT of `Content-Range: bytes */<total>` to the session URI.
+
+    Args:
+        http: Authorized HTTP object, e.g. the `http` of the insert request.
+        resumable_uri (str): Upload session URI.
+        total (int): File size, if known.
 
-    request = youtube.videos().insert(
-        part="snippet,status",
-        body=body,
-        media_body=media
-    )
+    Returns:
+        tuple: (confirmed offset, API response if the upload already finished else None).
+    """
+    headers = {"Content-Length": "0", "Content-Range": f"bytes */{total if total is not None else '*'}"}
+    resp, content = http.request(resumable_uri, method="PUT", headers=headers)
+    if resp.status in (200, 201):
+        return None, json.loads(content)
+    if resp.status != 308:
+        raise HttpError(resp, content, uri=resumable_uri)
+    # "Range: bytes=0-N" lists what arrived; no header means nothing did
+    confirmed = resp.get("range")
+    return (int(confirmed.rsplit("-", 1)[1]) + 1 if confirmed else 0), None
 
-    print("Uploading...")
+def query_upload_offset(request):
+    """
+    Make `request` continue from the offset the server confirmed.
+
+    Returns:
+        dict: The API response if the upload already finished, else None.
+    """
+    offset, response = probe_upload_session(request.http, request.resumable_uri, request.resumable.size())
+    if response is None:
+        request.resumable_progress = offset
+    return response
+
+def run_resumable_upload(request, file_path=None, max_retries=MAX_UPLOAD_RETRIES, on_progress=None, resume=False):
+    """
+    Send a resumable upload request chunk by chunk.
+
+    Retriable HTTP errors and network failures are retried with exponential
+    backoff; the retry asks the server how much it already has and continues
+    from there. With `file_path`, the session URI and confirmed offset are
+    saved next to the file after every chunk so another process can resume.
+    `on_progress()` is called after every chunk the server accepted, e.g. to
+    renew an upload queue lease. With `resume`, the request's session URI
+    comes from an earlier run and its offset is queried first.
+
+    Returns:
+        dict: The API response of the finished upload.
+    """
     response = None
+    retry = 0
+    resync = resume
     while response is None:
-        status, response = request.next_chunk()
-        if status:
-            print(f"Uploaded {int(status.progress() * 100)}%")
+        try:
+            if resync and request.resumable_uri:
+                response = query_upload_offset(request)
+                resync = False
+                if response is not None:
+                    break
+            status, response = request.next_chunk()
+        except HttpError as e:
+            if e.resp.status not in RETRIABLE_STATUS_CODES:
+                raise
+            error = f"Retriable HTTP error {e.resp.status}"
+        except RETRIABLE_EXCEPTIONS as e:
+            error = f"Retriable error: {str(e)}"
+        else:
+            retry = 0
+            if status:
+                print(f"Uploaded {int(status.progress() * 100)}%")
+            if file_path and response is None and request.resumable_uri:
+                save_upload_state(file_path, request.resumable_uri, request.resumable_progress)
+            if on_progress and response is None:
+                on_progress()
+            continue
+
+        retry += 1
+        if retry > max_retries:
+            raise Exception(f"Upload failed after {max_retries} retries: {error}")
+        delay = _retry_delay(retry)
+        print(f"{error}; retrying in {delay:.1f}s ({retry}/{max_retries})")
+        time.sleep(delay)
+        # Query the server for the confirmed offset before sending more bytes
+        resync = True
+    return response
+
+def upload_video(file_path, title, description, tags=None, category_id="22", privacy="public", youtube=None,
+                 media=None, chunksize=UPLOAD_CHUNK_SIZE, max_retries=MAX_UPLOAD_RETRIES, on_progress=None):
+    """
+    Upload a video to YouTube in resumable chunks.
+
+    An upload of `file_path` interrupted in an earlier run is resumed from
+    the offset the server confirmed, using the session saved in
+    `<file_path>.upload.json`.
+
+    Args:
+        file_path (str): Video file; ignored when `media` is given.
+        media (MediaUpload): Prepared media body, e.g. a stream, used instead of the file.
+        chunksize (int): Bytes per upload request, a multiple of 256 KiB.
+        max_retries (int): Consecutive retries allowed for one chunk.
+        on_progress (callable): Called without arguments after every uploaded chunk.
+
+    Returns:
+        str: The YouTube video ID.
+    """
+    if chunksize % (256 * 1024):
+        raise ValueError("chunksize must be a multiple of 256 KiB")
+    # An already authenticated service can be passed in so authentication
+    # happens while the video is still rendering
+    youtube = youtube or get_authenticated_service()
+
+    # Step 4: Define request body
+    body = build_video_body(title, description, tags, category_id, privacy)
+
+    # Step 5: Upload the video (a prepared media body, e.g. a stream, may be passed instead of a file)
+    state_file = file_path if media is None else None
+
+    def insert_request():
+        media_body = media or MediaFileUpload(file_path, chunksize=chunksize, resumable=True, mimetype='video/*')
+        return youtube.videos().insert(
+            part="snippet,status",
+            body=body,
+            media_body=media_body
+        )
+
+    request = insert_request()
+    state = load_upload_state(state_file) if state_file else None
+    if state:
+        print(f"Resuming upload of {file_path} from byte {state['progress']}")
+        request.resumable_uri = state["resumable_uri"]
+    else:
+        print("Uploading...")
+
+    try:
+        response = run_resumable_upload(request, state_file, max_retries, on_progress, resume=bool(state))
+    except HttpError as e:
+        if not state or e.resp.status not in (404, 410):
+            raise
+        # Upload sessions expire after about a week
+        print("Saved upload session has expired; starting over")
+        clear_upload_state(state_file)
+        response = run_resumable_upload(insert_request(), state_file, max_retries, on_progress)
+    if state_file:
+        clear_upload_state(state_file)
 
     print("Upload complete!")
     print("Video ID:", response["id"])
+    return response["id"]
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,486 @@
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+from zoneinfo import ZoneInfo
+from utils.uploadToYoutube.uploadToYoutube import upload_video, get_authenticated_service, load_upload_state
+from utils.job_store import get_default_job_store, UPLOADED as TOPIC_UPLOADED
+
+DEFAULT_QUEUE_PATH = os.getenv("UPLOAD_QUEUE_PATH", "cache/upload_queue.sqlite")
+# YouTube Data API quota resets at midnight Pacific time
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+DEFAULT_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+INSERT_COST = 1600
+DEFAULT_CHANNEL = os.getenv("YOUTUBE_CHANNEL", "default")
+MAX_ATTEMPTS = 5
+# An upload whose lease was not renewed for this long is assumed to be
+# orphaned; workers renew it after every uploaded chunk
+LEASE_SECONDS = 30 * 60
+
+QUEUED = "queued"
+UPLOADING = "uploading"
+UPLOADED = "uploaded"
+FAILED = "failed"
+
+
+def quota_day(timestamp=None):
+    """Pacific-time date (YYYY-MM-DD) that YouTube bills `timestamp` to"""
+    moment = datetime.datetime.fromtimestamp(timestamp if timestamp is not None else time.time(), QUOTA_TIMEZONE)
+    return moment.date().isoformat()
+
+
+def next_quota_reset(timestamp=None):
+    """Unix time of the next midnight Pacific time"""
+    moment = datetime.datetime.fromtimestamp(timestamp if timestamp is not None else time.time(), QUOTA_TIMEZONE)
+    midnight = datetime.datetime.combine(moment.date() + datetime.timedelta(days=1), datetime.time(0),
+                                         tzinfo=QUOTA_TIMEZONE)
+    return midnight.timestamp()
+
+
+def resumes_upload(file_path):
+    """True if an upload of `file_path` would continue a saved session instead of calling videos.insert again"""
+    return bool(file_path) and os.path.exists(file_path) and load_upload_state(file_path) is not None
+
+
+def is_quota_error(error):
+    """True for the 403 quotaExceeded/uploadLimitExceeded responses of the YouTube API"""
+    content = getattr(error, "content", b"") or b""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", "replace")
+    return "quotaExceeded" in content or "uploadLimitExceeded" in content
+
+
+class UploadQueue:
+    """
+    Persistent queue of pending YouTube uploads with per-channel quota accounting.
+
+    Jobs are claimed highest priority first, then oldest first. A claim
+    that will call videos.insert reserves INSERT_COST units of the channel's
+    quota for the current Pacific-time day; a claim that resumes the saved
+    upload session of an already charged job costs nothing. When the quota
+    is spent the channel's jobs are deferred to the next reset instead of
+    failing. Claims take a lease, renewed as chunks are uploaded, so an
+    upload orphaned by a crashed worker is picked up again (and resumed from
+    its saved upload session). Uploads made outside the queue are charged
+    to the same ledger with `record_insert`.
+    """
+    def __init__(self, path=DEFAULT_QUEUE_PATH, daily_quota=DEFAULT_DAILY_QUOTA, insert_cost=INSERT_COST,
+                 max_attempts=MAX_ATTEMPTS, lease_seconds=LEASE_SECONDS):
+        """
+        Args:
+            path (str): SQLite file holding the queue.
+            daily_quota (int or dict): Units per day, or a {channel: units} mapping.
+            insert_cost (int): Units charged per videos.insert.
+            max_attempts (int): Uploads tried before a job is marked failed.
+            lease_seconds (int): How long a claimed job belongs to its worker.
+        """
+        self.path = path
+        self.daily_quota = daily_quota
+        self.insert_cost = insert_cost
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode so claims can take an explicit write lock with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS uploads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_path TEXT NOT NULL,
+                title TEXT NOT NULL,
+                description TEXT NOT NULL,
+                tags TEXT NOT NULL,
+                category_id TEXT NOT NULL,
+                privacy TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                not_before REAL NOT NULL DEFAULT 0,
+                leased_until REAL,
+                video_id TEXT,
+                charged_day TEXT,
+                topic_id INTEGER,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(uploads)")}
+        if "charged_day" not in columns:
+            self._conn.execute("ALTER TABLE uploads ADD COLUMN charged_day TEXT")
+        if "topic_id" not in columns:
+            self._conn.execute("ALTER TABLE uploads ADD COLUMN topic_id INTEGER")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_uploads_ready ON uploads(status, priority DESC, created_at)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS quota_usage (
+                channel TEXT NOT NULL,
+                day TEXT NOT NULL,
+                units INTEGER NOT NULL,
+                PRIMARY KEY (channel, day)
+            )
+            """
+        )
+
+    def quota_limit(self, channel):
+        if isinstance(self.daily_quota, dict):
+            return self.daily_quota.get(channel, DEFAULT_DAILY_QUOTA)
+        return self.daily_quota
+
+    def quota_used(self, channel=DEFAULT_CHANNEL, day=None):
+        """Units charged to `channel` on the given Pacific-time day (today by default)"""
+        with self._lock:
+            return self._quota_used(channel, day or quota_day())
+
+    def _quota_used(self, channel, day):
+        row = self._conn.execute(
+            "SELECT units FROM quota_usage WHERE channel = ? AND day = ?", (channel, day)
+        ).fetchone()
+        return row["units"] if row else 0
+
+    def _charge(self, channel, day, units):
+        self._conn.execute(
+            """
+            INSERT INTO quota_usage (channel, day, units) VALUES (?, ?, ?)
+            ON CONFLICT(channel, day) DO UPDATE SET units = units + excluded.units
+            """,
+            (channel, day, units),
+        )
+
+    def enqueue(self, file_path, title, description, tags=None, category_id="22", privacy="public",
+                channel=DEFAULT_CHANNEL, priority=0, topic_id=None):
+        """
+        Add an upload to the queue. `topic_id` is the job store topic the
+        video was made from; it is marked uploaded once the upload succeeds.
+
+        Returns:
+            int: The job ID.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO uploads
+                    (file_path, title, description, tags, category_id, privacy, channel, priority,
+                     status, topic_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (file_path, title, description, json.dumps(tags or []), category_id, privacy, channel,
+                 priority, QUEUED, topic_id, now, now),
+            )
+            return cursor.lastrowid
+
+    def claim(self):
+        """
+        Atomically take the next upload whose channel still has quota today.
+
+        Returns:
+            dict: The claimed job, or None if nothing can be uploaded right now.
+        """
+        now = time.time()
+        day = quota_day(now)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                job = self._claim(now, day)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job
+
+    def _claim(self, now, day):
+        exhausted = set()
+        while True:
+            params = [QUEUED, now, UPLOADING, now]
+            skip = ""
+            if exhausted:
+                skip = f" AND channel NOT IN ({','.join('?' * len(exhausted))})"
+                params.extend(exhausted)
+            row = self._conn.execute(
+                f"""
+                SELECT * FROM uploads
+                WHERE ((status = ? AND not_before <= ?) OR (status = ? AND leased_until < ?)){skip}
+                ORDER BY priority DESC, created_at ASC LIMIT 1
+                """,
+                params,
+            ).fetchone()
+            if row is None:
+                return None
+            channel = row["channel"]
+            charged_day = row["charged_day"]
+            # Resuming a saved session sends no new videos.insert, so it is not billed again
+            if charged_day is None or not resumes_upload(row["file_path"]):
+                if self._quota_used(channel, day) + self.insert_cost > self.quota_limit(channel):
+                    self._defer_channel(channel, now)
+                    exhausted.add(channel)
+                    continue
+                self._charge(channel, day, self.insert_cost)
+                charged_day = day
+            self._conn.execute(
+                """
+                UPDATE uploads SET status = ?, attempts = attempts + 1, leased_until = ?, charged_day = ?,
+                    updated_at = ?
+                WHERE id = ?
+                """,
+                (UPLOADING, now + self.lease_seconds, charged_day, now, row["id"]),
+            )
+            job = dict(row)
+            job["tags"] = json.loads(job["tags"])
+            job["attempts"] += 1
+            job["charged_day"] = charged_day
+            return job
+
+    def _defer_channel(self, channel, now):
+        """Hold every waiting job of `channel` until the next quota reset"""
+        reset = next_quota_reset(now)
+        count = self._conn.execute(
+            "UPDATE uploads SET not_before = ?, updated_at = ? WHERE channel = ? AND status = ? AND not_before < ?",
+            (reset, now, channel, QUEUED, reset),
+        ).rowcount
+        if count:
+            print(f"Quota for channel '{channel}' is used up; deferred {count} upload(s) until "
+                  f"{datetime.datetime.fromtimestamp(reset, QUOTA_TIMEZONE):%Y-%m-%d %H:%M %Z}")
+
+    def renew(self, job_id):
+        """Extend the lease of an upload still in progress"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE uploads SET leased_until = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (now + self.lease_seconds, now, job_id, UPLOADING),
+            )
+
+    def record_insert(self, channel=DEFAULT_CHANNEL, file_path=None):
+        """
+        Charge an upload made outside the queue (e.g. inline by main.py) to
+        the channel's quota, so queued uploads see what is left. Resuming the
+        saved session of `file_path` is not charged again.
+
+        Returns:
+            bool: True if the upload was charged.
+        """
+        if resumes_upload(file_path):
+            return False
+        day = quota_day()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._charge(channel, day, self.insert_cost)
+                used = self._quota_used(channel, day)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if used > self.quota_limit(channel):
+            print(f"Quota for channel '{channel}' is over its daily limit ({used}/{self.quota_limit(channel)} units)")
+        return True
+
+    def complete(self, job_id, video_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE uploads SET status = ?, video_id = ?, leased_until = NULL, error = NULL, updated_at = ? "
+                "WHERE id = ?",
+                (UPLOADED, video_id, time.time(), job_id),
+            )
+
+    def fail(self, job_id, error):
+        """
+        Record a failed attempt. The job is retried with exponential backoff
+        until it has used up max_attempts.
+
+        Returns:
+            bool: True if the job will be retried.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM uploads WHERE id = ?", (job_id,)).fetchone()
+            retry = row is not None and row["attempts"] < self.max_attempts
+            self._conn.execute(
+                "UPDATE uploads SET status = ?, error = ?, not_before = ?, leased_until = NULL, updated_at = ? "
+                "WHERE id = ?",
+                (QUEUED if retry else FAILED, str(error), now + 60 * 2 ** (row["attempts"] if row else 0), now,
+                 job_id),
+            )
+            return retry
+
+    def defer_for_quota(self, job):
+        """
+        Put a job rejected by YouTube for quota back in the queue and mark
+        its channel's quota as spent for the day, without counting the attempt.
+        """
+        now = time.time()
+        day = quota_day(now)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                used = self._quota_used(job["channel"], day)
+                self._charge(job["channel"], day, max(0, self.quota_limit(job["channel"]) - used))
+                self._conn.execute(
+                    "UPDATE uploads SET status = ?, attempts = attempts - 1, leased_until = NULL, updated_at = ? "
+                    "WHERE id = ?",
+                    (QUEUED, now, job["id"]),
+                )
+                self._defer_channel(job["channel"], now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def stats(self):
+        """
+        Returns:
+            dict: Job counts per status, deferred jobs and today's quota use per channel.
+        """
+        now = time.time()
+        with self._lock:
+            counts = {row["status"]: row["count"] for row in self._conn.execute(
+                "SELECT status, COUNT(*) AS count FROM uploads GROUP BY status"
+            )}
+            deferred = self._conn.execute(
+                "SELECT COUNT(*) FROM uploads WHERE status = ? AND not_before > ?", (QUEUED, now)
+            ).fetchone()[0]
+            quota = {row["channel"]: row["units"] for row in self._conn.execute(
+                "SELECT channel, units FROM quota_usage WHERE day = ?", (quota_day(now),)
+            )}
+        return {"jobs": counts, "deferred": deferred, "quota_used_today": quota}
+
+
+def default_uploader(job, on_progress=None):
+    """Upload a claimed job with the calling thread's YouTube service"""
+    return upload_video(
+        file_path=job["file_path"],
+        title=job["title"],
+        description=job["description"],
+        tags=job["tags"],
+        category_id=job["category_id"],
+        privacy=job["privacy"],
+        youtube=get_authenticated_service(),
+        on_progress=on_progress,
+    )
+
+
+class UploadWorker:
+    """
+    Drains an UploadQueue with `concurrency` upload threads.
+
+    Each thread claims a job, uploads it and records the outcome; when
+    nothing is ready it sleeps `poll_interval` seconds. Quota rejections
+    defer the job to the next Pacific-time day. The job store topic a
+    video was made from is marked uploaded when its upload succeeds, or
+    failed when it fails for good.
+    """
+    def __init__(self, queue, concurrency=2, uploader=default_uploader, poll_interval=30, job_store=None):
+        """
+        Args:
+            queue (UploadQueue): Queue to drain.
+            concurrency (int): Uploads running at the same time.
+            uploader (callable): Uploads a job dict and returns the video ID. It is passed an
+                `on_progress` callable to call after every chunk, which renews the job's lease.
+            poll_interval (float): Seconds to wait when no job is ready.
+            job_store (JobStore): Store holding the topics; the default store when None.
+        """
+        self.queue = queue
+        self.concurrency = concurrency
+        self.uploader = uploader
+        self.poll_interval = poll_interval
+        self.job_store = job_store
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _finish_topic(self, job, video_id=None, error=None):
+        """Move the job's topic to uploaded, or to failed when the upload gave up"""
+        if not job.get("topic_id"):
+            return
+        job_store = self.job_store or get_default_job_store()
+        try:
+            if error is None:
+                job_store.advance(job["topic_id"], TOPIC_UPLOADED, release=True)
+            else:
+                job_store.fail(job["topic_id"], f"Upload failed: {error}", retry=False)
+        except Exception as e:
+            print(f"Could not update topic {job['topic_id']} of upload job {job['id']}: {str(e)}")
+
+    def start(self):
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f"upload-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, wait=True):
+        """Stop claiming new jobs; uploads in progress are finished when `wait`"""
+        self._stop.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def run_once(self):
+        """
+        Claim and upload a single job.
+
+        Returns:
+            bool: False if no job was ready.
+        """
+        job = self.queue.claim()
+        if job is None:
+            return False
+        print(f"Uploading job {job['id']} ({job['file_path']}), attempt {job['attempts']}")
+        try:
+            video_id = self.uploader(job, on_progress=lambda: self.queue.renew(job["id"]))
+        except Exception as e:
+            if is_quota_error(e):
+                self.queue.defer_for_quota(job)
+            elif self.queue.fail(job["id"], e):
+                print(f"Upload of job {job['id']} failed ({str(e)}); will retry")
+            else:
+                print(f"Upload of job {job['id']} failed permanently: {str(e)}")
+                self._finish_topic(job, error=e)
+            return True
+        self.queue.complete(job["id"], video_id)
+        self._finish_topic(job, video_id)
+        print(f"Job {job['id']} uploaded as {video_id}")
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.run_once():
+                    self._stop.wait(self.poll_interval)
+            except Exception as e:
+                print(f"Upload worker error: {str(e)}")
+                self._stop.wait(self.poll_interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the YouTube upload queue worker.")
+    parser.add_argument("--workers", type=int, default=2, help="Concurrent uploads.")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="Queue database path.")
+    parser.add_argument("--poll-interval", type=float, default=30)
+    parser.add_argument("--stats", action="store_true", help="Print queue statistics and exit.")
+    args = parser.parse_args()
+
+    upload_queue = UploadQueue(args.queue)
+    if args.stats:
+        print(json.dumps(upload_queue.stats(), indent=4))
+    else:
+        worker = UploadWorker(upload_queue, concurrency=args.workers, poll_interval=args.poll_interval).start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print("Stopping upload workers...")
+            worker.stop()
@@ -1,18 +1,101 @@
 from google import genai
 import dotenv
+import json
 import os
+from utils.llm_cache import resolve_cache
+
+MODEL = "gemini-2.0-flash"
+TITLE_MAX_CHARS = 60
+DESCRIPTION_MAX_CHARS = 150
+TAGS_MAX_CHARS = 500  # YouTube's limit on the combined length of all tags
+
+METADATA_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "description": {"type": "STRING"},
+        "tags": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["title", "description", "tags"],
+}
+
+
+def is_metadata_json(text):
+    """True if a structured metadata answer parses into an object with every required field"""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and all(field in data for field in METADATA_SCHEMA["required"])
+
+
+def clean_tags(raw_tags):
+    """Strip quotes and hashes from each tag as-is and drop empty and duplicate tags"""
+    tags = []
+    seen = set()
+    for raw_tag in raw_tags:
+        tag = raw_tag.strip().strip('"\'').lstrip("#").strip()
+        if tag and tag.lower() not in seen:
+            seen.add(tag.lower())
+            tags.append(tag)
+    return tags
+
+
+def parse_tags(text):
+    """
+    Split a model's tag answer into a clean list.
+    Accepts comma or newline separated tags, strips quotes and hashes and drops duplicates.
+    """
+    return clean_tags(text.replace("\n", ",").split(","))
+
+
+def clean_text(text):
+    """Strip whitespace and wrapping quotes from a single-line model answer"""
+    return text.strip().strip('"').strip()
+
+
+def truncate_text(text, limit):
+    """Cut text to at most `limit` characters, preferring a word boundary"""
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(" ", 1)[0].rstrip(" ,;:-")
+    return cut or text[:limit]
+
+
+def limit_tags(tags, limit=TAGS_MAX_CHARS):
+    """Keep tags in order while their combined length fits YouTube's limit"""
+    kept = []
+    total = 0
+    for tag in tags:
+        if total + len(tag) > limit:
+            break
+        kept.append(tag)
+        total += len(tag) + 1
+    return kept
 
 class VideoMetadata:
     """
     Class to generate video metadata including title and description.
     """
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, cache=None):
+        """
+        Args:
+            api_key (str): Google API key, read from GOOGLE_API_KEY when omitted.
+            cache (LLMCache): Response cache; None uses the shared default, False disables it.
+        """
         dotenv.load_dotenv()
         self.api_key = api_key or os.getenv('GOOGLE_API_KEY')
         if not self.api_key:
             raise ValueError("Google API key is required. Provide it as a parameter or set GOOGLE_API_KEY environment variable.")
         self.client = genai.Client(api_key=self.api_key)
+        self.cache = resolve_cache(cache)
 
+    def _generate(self, prompt, call_type, config=None, store_if=None):
+        """Send a prompt to Gemini, replaying byte-identical prompts from the cache"""
+        if self.cache is None:
+            kwargs = {"config": config} if config is not None else {}
+            return self.client.models.generate_content(model=MODEL, contents=prompt, **kwargs)
+        return self.cache.generate(self.client, MODEL, prompt, call_type, config, store_if=store_if)
 
     def generate_video_title(self, description):
 
@@ -32,9 +115,7 @@ class VideoMetadata:
 
         Do not provide any commentary - output only the title.
         """
-        response = self.client.models.generate_content(
-                model="gemini-2.0-flash", contents=PROMPT,
-            )
+        response = self._generate(PROMPT, "video_title")
         if response:
             print(f"video_title: {response.text}")
             return response.text
@@ -58,9 +139,7 @@ class VideoMetadata:
         Output: "Messi vs Ronaldo: The GOAT debate continues! Guinness World Records reveal Messi leads with 41 records, Ronaldo close behind with 40. Who's next?"
         Do not provide any commentary - output only the description.
         """
-        response = self.client.models.generate_content(
-                model="gemini-2.0-flash", contents=PROMPT,
-            )
+        response = self._generate(PROMPT, "video_description")
         if response:
             print(f"video_description: {response.text}")
             return response.text
@@ -84,17 +163,85 @@ class VideoMetadata:
         Output: "Messi, Ronaldo, GOAT, Guinness World Records, football, debate, Champions League, international play"
         Do not provide any commentary - output only the tags.
         """
-        response = self.client.models.generate_content(
-                model="gemini-2.0-flash", contents=PROMPT,
-            )
+        response = self._generate(PROMPT, "video_tags")
         if response:
             print(f"video_tags: {response.text}")
-            tags = response.text.split(", ")
+            tags = parse_tags(response.text)
             return tags
         else:
             print("Could not generate a video_tags for your query.")
             return "Could not generate a video_tags for your query."
 
+    def generate_all(self, script):
+        """
+        Generate title, description and tags for a script in a single request.
+
+        The model answers in JSON constrained by METADATA_SCHEMA. Any field
+        that is missing, malformed or not under its length limit is regenerated
+        with the matching per-field call, so the usual case is one round trip.
+
+        Args:
+            script (str): The video script.
+
+        Returns:
+            dict: {"title": str, "description": str, "tags": list of str}
+        """
+        PROMPT = f"""
+        You are a YouTube metadata generator.
+        Generate the title, description and tags for the following video script:
+        {script}
+        Rules:
+            - "title": a catchy title, less than {TITLE_MAX_CHARS} characters
+            - "description": a description, less than {DESCRIPTION_MAX_CHARS} characters
+            - "tags": a list of short keywords related to the script
+            - Remove unnecessary words (articles, pronouns, etc.)
+            - Respond ONLY with a JSON object with the keys "title", "description" and "tags"
+
+        Examples:
+        Input: "Is Messi or Ronaldo the GOAT? The debate rages on, but Guinness World Records has tallied the score! It's a neck-and-neck race with both football icons holding numerous records. From domestic leagues to the Champions League and international play, they dominate. But in the end, Messi edges out Ronaldo 41 Guinness World Records to 40! But with Ronaldo continuing to play, the game isn't over"
+        Output: {{"title": "Messi vs Ronaldo: The GOAT Debate Continues!", "description": "Messi vs Ronaldo: The GOAT debate continues! Guinness World Records reveal Messi leads with 41 records, Ronaldo close behind with 40. Who's next?", "tags": ["Messi", "Ronaldo", "GOAT", "Guinness World Records", "football", "debate", "Champions League"]}}
+        """
+        config = {
+            "response_mime_type": "application/json",
+            "response_schema": METADATA_SCHEMA,
+        }
+        data = {}
+        try:
+            response = self._generate(PROMPT, "video_metadata", config, store_if=is_metadata_json)
+            data = json.loads(response.text) if response and response.text else {}
+            if not isinstance(data, dict):
+                data = {}
+        except Exception as e:
+            print(f"Structured metadata generation failed: {str(e)}")
+
+        title = data.get("title")
+        if isinstance(title, str) and 0 < len(clean_text(title)) < TITLE_MAX_CHARS:
+            title = clean_text(title)
+        else:
+            print("Structured title invalid, falling back to generate_video_title.")
+            title = truncate_text(clean_text(self.generate_video_title(script)), TITLE_MAX_CHARS - 1)
+
+        description = data.get("description")
+        if isinstance(description, str) and 0 < len(clean_text(description)) < DESCRIPTION_MAX_CHARS:
+            description = clean_text(description)
+        else:
+            print("Structured description invalid, falling back to generate_video_description.")
+            description = truncate_text(clean_text(self.generate_video_description(script)), DESCRIPTION_MAX_CHARS - 1)
+
+        tags = data.get("tags")
+        if isinstance(tags, list) and tags and all(isinstance(tag, str) for tag in tags):
+            # Schema tags are already separate; a comma inside one is part of the tag
+            tags = clean_tags(tags)
+        else:
+            print("Structured tags invalid, falling back to generate_video_tags.")
+            tags = self.generate_video_tags(script)
+            if not isinstance(tags, list):
+                tags = []
+        tags = limit_tags(tags)
+
+        print(f"video_metadata: {title!r}, {description!r}, {tags}")
+        return {"title": title, "description": description, "tags": tags}
+
 
 def main():
     video_metadata = VideoMetadata()